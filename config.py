@@ -60,6 +60,85 @@ class Config:
     # Force Sub
     FORCE_SUB_MODE = "ANY" # ANY or ALL
 
+    # Event Log (Time-Series in PrivateDB)
+    EVENT_TTL_DAYS = int(os.getenv("EVENT_TTL_DAYS", "30"))
+    EVENT_BATCH_SIZE = 200
+    EVENT_FLUSH_INTERVAL = 5  # seconds
+    EVENT_QUEUE_SIZE = 5000
+    EVENT_PUT_TIMEOUT = 2  # seconds a producer waits when the queue is full
+
+    # Series Channel Refresh (debounced per channel)
+    SERIES_REFRESH_DEBOUNCE = 30  # seconds of quiet before a channel is refreshed
+    SERIES_REFRESH_MAX_WAIT = 120  # refresh at the latest after this many seconds
+    SERIES_REFRESH_WORKERS = 3
+
+    # Peer Cache Warmup (startup, background)
+    PEER_WARMUP_CONCURRENCY = 8
+    PEER_WARMUP_TIMEOUT = 10  # seconds per chat
+
+    # Startup Phases
+    STARTUP_CRITICAL_TIMEOUT = 60  # seconds (Telegram start / get_me)
+    STARTUP_PHASE_TIMEOUT = 180  # seconds per background phase
+
+    # Quest Task Pool (in-memory)
+    TASK_POOL_REFRESH = 30 * 60  # seconds
+    TASK_POOL_RECENT = 20  # recent questions remembered per user
+    TASK_POOL_MAX_USERS = 5000
+
+    # Conversations (wizard / quest input state)
+    CONVERSATION_TTL = 30 * 60  # seconds of inactivity before a flow expires
+    QUEST_SESSION_TTL = 2 * 60 * 60
+    CONVERSATION_MAX_USERS = 10000
+
+    # Push Request Reconciliation (local history <- MainDB status)
+    PUSH_RECONCILE_INTERVAL = 10 * 60  # seconds
+    PUSH_RECONCILE_BATCH = 100
+    PUSH_RECONCILE_MAX_BATCHES = 20  # per run
+
+    # System Stats Sampler (/info)
+    STATS_SAMPLE_INTERVAL = 5  # seconds
+    STATS_HISTORY = 120  # samples kept (10 min)
+    STATS_NET_EVERY = 3  # DB / Telegram ping every Nth sample
+    STATS_PING_TIMEOUT = 5  # seconds
+
+    # Event-Loop Watchdog
+    WATCHDOG_INTERVAL = 0.25  # seconds between heartbeats
+    WATCHDOG_STALL_THRESHOLD = 0.5  # seconds without heartbeat before the stack is captured
+    WATCHDOG_WINDOW = 2400  # lag samples kept for percentiles (10 min)
+    WATCHDOG_SLOW_CALLBACK = 0.1  # seconds, asyncio slow callback report
+    # asyncio debug mode is needed for slow callback reports but adds overhead to every task
+    WATCHDOG_ASYNCIO_DEBUG = os.getenv("WATCHDOG_ASYNCIO_DEBUG", "false").lower() == "true"
+
+    # Config Cache (db.get_config)
+    CONFIG_CACHE_TTL = 60  # seconds
+
+    # Premium
+    PREMIUM_CACHE_TTL = 120  # seconds (grants from other franchise bots show up within this)
+    PREMIUM_CACHE_SIZE = 10000
+    PREMIUM_SWEEP_INTERVAL = 10 * 60  # seconds
+    PREMIUM_GRANT_HISTORY = 50  # grant ids kept per user for idempotency
+
+    # Coupons
+    COUPON_CACHE_TTL = 5 * 60  # seconds, MainDB coupon definitions
+
+    # Leaderboards (precomputed top-N in UserDB)
+    LEADERBOARD_SIZE = 10
+    LEADERBOARD_RECOMPUTE = 15 * 60  # seconds, full rebuild
+    LEADERBOARD_CACHE_TTL = 60  # seconds, in-memory read cache
+
+    # Force-Sub Membership Cache (fed by chat member updates)
+    MEMBERSHIP_TTL = 6 * 3600  # seconds an entry is trusted (also the PrivateDB TTL)
+    MEMBERSHIP_CACHE_SIZE = 50000  # in-memory entries (LRU)
+    MEMBERSHIP_FLUSH_INTERVAL = 10  # seconds between PrivateDB writes
+    MEMBERSHIP_CHATS_REFRESH = 5 * 60  # seconds, force-sub chat list
+
+    # Admin Export (/export, streamed to a gzip temp file)
+    EXPORT_CHUNK_SIZE = 1000  # documents per cursor batch / file write
+
+    # User Notifications (queued, paced sends)
+    NOTIFY_QUEUE_SIZE = 2000
+    NOTIFY_INTERVAL = 0.05  # seconds between two sends
+
     # Bot Username (will be set on startup)
     BOT_USERNAME = ""
 
@@ -1,11 +1,73 @@
 import time
 import asyncio
+from collections import OrderedDict
+from datetime import datetime, timedelta, timezone
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import UpdateOne, ReturnDocument
+from pymongo.errors import CollectionInvalid, BulkWriteError, OperationFailure, DuplicateKeyError
 from config import Config
 from log import get_logger
+from utils.event_log import event_log
+from utils.ranks import (
+    REQUEST_RANKS, FILESHARE_RANKS, get_rank_info, get_badges, rank_switch,
+    date_badges_expr, EARLY_ADOPTER_LIMIT
+)
 
 logger = get_logger(__name__)
 
+# Leaderboard name -> users field
+LEADERBOARD_FIELDS = {"referrals": "referral_count", "xp": "xp_fileshare"}
+
+# get_config cache sentinels
+CONFIG_MISSING = object()
+CONFIG_UNAVAILABLE = object()
+
+# Bump to re-run migrate_user_profiles on all users
+PROFILE_VERSION = 1
+PROFILE_FIELDS = {
+    "_id": 0, "user_id": 1, "first_name": 1, "is_premium": 1, "premium_expiry": 1,
+    "xp_fileshare": 1, "xp_backfilled": 1, "referral_count": 1,
+    # Legacy users (before the counter) count their stored requests, as add_request does
+    "total_requests": {"$ifNull": ["$total_requests", {"$size": {"$ifNull": ["$requests", []]}}]},
+    "badges": 1, "joined_at": 1, "updated_at": 1, "profile_v": 1
+}
+
+# Referral XP backfill (legacy users: referral_count * 100, once). Pipeline $set stage
+# for every write that changes referral_count or XP before the user is migrated.
+XP_BACKFILL_STAGE = {"$set": {
+    "xp_fileshare": {"$cond": [
+        {"$eq": [{"$ifNull": ["$xp_backfilled", False]}, True]},
+        {"$ifNull": ["$xp_fileshare", 0]},
+        {"$add": [{"$ifNull": ["$xp_fileshare", 0]}, {"$multiply": [{"$ifNull": ["$referral_count", 0]}, 100]}]}
+    ]},
+    "xp_backfilled": True
+}}
+
+# Streamed exports (/export): {kind: (collection attribute, projection, sort field)}
+EXPORT_SOURCES = {
+    "bundles": ("bundles_col_private", {
+        "_id": 0, "code": 1, "title": 1, "tmdb_id": 1, "media_type": 1, "season": 1, "episode_val": 1,
+        "range": 1, "source_channel": 1, "views": 1, "created_at": 1,
+        "files": {"$size": {"$ifNull": ["$file_ids", []]}}
+    }, "_id"),
+    "groups": ("groups_col_private", {
+        "_id": 0, "code": 1, "title": 1, "tmdb_id": 1, "media_type": 1, "season": 1, "episode_val": 1,
+        "created_at": 1, "bundles": {"$size": {"$ifNull": ["$bundles", []]}}
+    }, "_id"),
+    "push": ("push_requests_col", {
+        "_id": 0, "code": 1, "title": 1, "tmdb_id": 1, "status": 1, "reason": 1, "user_id": 1,
+        "request_date": 1, "reconciled_at": 1, "main_request_id": {"$toString": "$main_request_id"}
+    }, "_id"),
+    "logs": ("events_col", {
+        "_id": 0, "ts": 1, "kind": "$meta.kind", "action": "$meta.action", "user_id": 1, "details": 1
+    }, "ts"),
+    "users": ("users_col", {
+        "_id": 0, "user_id": 1, "first_name": 1, "join_no": 1, "joined_at": 1, "origin_bot_id": 1,
+        "referrer_id": 1, "referral_count": 1, "xp_fileshare": 1, "xp_request": 1, "rank_fileshare": 1,
+        "rank_request": 1, "total_requests": 1, "is_premium": 1, "premium_expiry": 1, "badges": 1
+    }, "_id")
+}
+
 class Database:
     def __init__(self):
         self.client_main = None
@@ -32,16 +94,24 @@ class Database:
         self.push_requests_col = None
         self.cache_channels_col = None
         self.cache_groups_col = None
+        self.peers_col = None
+        self.cache_tasks_col = None
+        self.memberships_col = None
 
         # Shared/Other
         self.tasks_col = None
         self.coupons_col = None
-        self.logs_col = None
+        self.events_col = None
         self.force_shares_col = None
         self.delete_queue_col = None
 
         # UserDB Collections (Shared Read-Write)
         self.users_col = None
+        self.leaderboards_col = None
+        self.counters_col = None
+        self.coupon_redemptions_col = None
+        self.coupon_counters_col = None
+        self.referrals_col = None
 
         # RequestDB Collection
         self.requests_col = None
@@ -49,6 +119,23 @@ class Database:
         # MainDB Push Write (Direct via MainDB Role)
         self.push_requests_col_main = None
 
+        # Series markup invalidation: {tmdb_id: version}, bumped on group/bundle changes
+        self.series_versions = {}
+
+        # get_config cache: {key: (expires_at, value)}
+        self.config_cache = {}
+
+        # Coupon definition cache: {code: (expires_at, doc or None)}
+        self.coupon_cache = {}
+        # Legacy users.redeemed_coupons copied into the ledger (set once the marker is seen)
+        self.coupon_ledger_migrated = False
+
+        # Premium expiry cache: {user_id: (fetched_at, expiry)} (LRU)
+        self.premium_cache = OrderedDict()
+
+        # Leaderboard entry floors: {board: min value to enter}, skips offers that cannot place
+        self.leaderboard_floors = {}
+
     def connect(self):
         try:
             # 1. MainDB Connection (Global Content & Limited Write)
@@ -104,16 +191,24 @@ class Database:
             self.push_requests_col = self.db_private.push_requests
             self.cache_channels_col = self.db_private.cache_channels
             self.cache_groups_col = self.db_private.cache_groups
+            self.peers_col = self.db_private.peers
+            self.cache_tasks_col = self.db_private.cache_tasks
+            self.memberships_col = self.db_private.memberships
 
             # Other Global (Assume Read-Only Main for now, or Local?)
             self.tasks_col = self.db_main.tasks
             self.coupons_col = self.db_main.coupons
             self.force_shares_col = self.db_main.force_shares
 
-            self.logs_col = self.db_private.logs
+            self.events_col = self.db_private.events
             self.delete_queue_col = self.db_private.delete_queue
 
             self.users_col = self.db_user.users
+            self.leaderboards_col = self.db_user.leaderboards
+            self.counters_col = self.db_user.counters
+            self.coupon_redemptions_col = self.db_user.coupon_redemptions
+            self.coupon_counters_col = self.db_user.coupon_counters
+            self.referrals_col = self.db_user.referrals
 
             logger.info("Connected to MongoDB (MainDB, UserDB, PrivateDB)")
 
@@ -138,6 +233,35 @@ class Database:
             logger.error(f"Failed to connect to MongoDB: {e}")
             raise e
 
+    async def ensure_indexes(self):
+        """Creates indexes used by hot queries (idempotent, best effort)."""
+        try:
+            await self.bundles_col_private.create_index("code")
+            await self.groups_col_private.create_index("tmdb_id")
+            await self.peers_col.create_index("chat_id", unique=True)
+            await self.push_requests_col.create_index([("status", 1), ("_id", 1)])
+            await self.memberships_col.create_index([("chat_id", 1), ("user_id", 1)], unique=True)
+            await self.memberships_col.create_index("at", expireAfterSeconds=Config.MEMBERSHIP_TTL)
+        except Exception as e:
+            logger.warning(f"Index creation failed: {e}")
+
+        # MainDB push dedupe (catches concurrent pushes; the limited role may lack createIndex)
+        try:
+            await self.push_requests_col_main.create_index([("tmdb_id", 1), ("title", 1)], unique=True)
+        except Exception as e:
+            logger.warning(f"Push request unique index unavailable: {e}")
+
+        # UserDB leaderboard sorts / rank counts
+        try:
+            for field in LEADERBOARD_FIELDS.values():
+                await self.users_col.create_index([(field, -1)])
+            await self.users_col.create_index("joined_at")
+            await self.users_col.create_index([("is_premium", 1), ("premium_expiry", 1)])
+            await self.coupon_redemptions_col.create_index([("code", 1), ("user_id", 1)], unique=True)
+            await self.referrals_col.create_index("referee_id", unique=True)
+        except Exception as e:
+            logger.warning(f"UserDB index creation failed: {e}")
+
     async def perform_cache_cleanup(self):
         """Removes 'synced' items from Local PrivateDB collections to fix UI pollution."""
         try:
@@ -174,33 +298,117 @@ class Database:
             return await fallback_coro()
         return fallback_val
 
-    # --- Audit Logs ---
+    # --- Peer Cache (resolved Telegram peers, survives session loss) ---
+    async def get_cached_peers(self):
+        return await self.peers_col.find({}, {"_id": 0}).to_list(length=None)
+
+    async def save_peers(self, peers):
+        """peers: list of dicts with chat_id, access_hash, type, username (one bulk upsert)."""
+        if not peers: return
+        now = time.time()
+        ops = [
+            UpdateOne({"chat_id": p["chat_id"]}, {"$set": {**p, "updated_at": now}}, upsert=True)
+            for p in peers
+        ]
+        await self.peers_col.bulk_write(ops, ordered=False)
+
+    # --- Force-Sub Memberships (cache behind utils/membership.py) ---
+    async def get_membership(self, chat_id, user_id):
+        return await self.memberships_col.find_one(
+            {"chat_id": chat_id, "user_id": user_id}, {"_id": 0, "member": 1, "at": 1}
+        )
+
+    async def save_memberships(self, entries):
+        """entries: {(chat_id, user_id): (member, at)} (one bulk upsert)."""
+        if not entries: return
+        ops = [
+            UpdateOne(
+                {"chat_id": chat_id, "user_id": user_id},
+                {"$set": {"member": member, "at": datetime.fromtimestamp(at, timezone.utc)}},
+                upsert=True
+            )
+            for (chat_id, user_id), (member, at) in entries.items()
+        ]
+        await self.memberships_col.bulk_write(ops, ordered=False)
+
+    # --- Exports ---
+    def export_cursor(self, kind):
+        """Projected cursor over one EXPORT_SOURCES kind, fetched in EXPORT_CHUNK_SIZE batches."""
+        col, projection, sort = EXPORT_SOURCES[kind]
+        return getattr(self, col).find({}, projection).sort(sort, 1).batch_size(Config.EXPORT_CHUNK_SIZE)
+
+    # --- Audit Logs & Events ---
     async def add_log(self, action, user_id, details):
-        await self.logs_col.insert_one({
-            "action": action,
-            "user_id": user_id,
-            "details": details,
-            "ts": time.time()
-        })
+        # Admin actions go through the buffered event pipeline (no direct insert)
+        await event_log.emit(action, user_id, kind="admin", text=details)
+
+    async def ensure_event_collection(self):
+        """Creates the time-series 'events' collection with TTL (idempotent)."""
+        ttl = Config.EVENT_TTL_DAYS * 24 * 3600
+        try:
+            await self.db_private.create_collection(
+                "events",
+                timeseries={"timeField": "ts", "metaField": "meta", "granularity": "minutes"},
+                expireAfterSeconds=ttl
+            )
+            logger.info("Created time-series collection 'events'.")
+        except CollectionInvalid:
+            pass # Already exists
+        except Exception as e:
+            # Server without time-series support -> plain collection with TTL index
+            logger.warning(f"Time-series collection unavailable ({e}). Using TTL index fallback.")
+            try:
+                await self.events_col.create_index("ts", expireAfterSeconds=ttl)
+            except Exception as e2:
+                logger.warning(f"Event TTL index failed: {e2}")
+
+    async def get_event_counts(self, since_hours=24, kind=None):
+        """Returns {action: count} for the window. One aggregation, served from time buckets."""
+        since = datetime.now(timezone.utc) - timedelta(hours=since_hours)
+        match = {"ts": {"$gte": since}}
+        if kind:
+            match["meta.kind"] = kind
+        pipeline = [
+            {"$match": match},
+            {"$group": {"_id": "$meta.action", "count": {"$sum": 1}}}
+        ]
+        results = await self.events_col.aggregate(pipeline).to_list(length=200)
+        return {r["_id"]: r["count"] for r in results}
 
     # --- Configs ---
     async def get_config(self, key, default=None):
+        # Short TTL cache (local writes update it directly, MainDB changes show up within the TTL)
+        hit = self.config_cache.get(key)
+        if hit and hit[0] > time.monotonic():
+            return default if hit[1] is CONFIG_MISSING else hit[1]
+
         # Check Private (Local Override) first
         doc = await self.configs_col_private.find_one({"key": key})
-        if doc: return doc["value"]
+        if doc:
+            return self._cache_config(key, doc["value"])
 
         # Fallback to Main (Global) with retry
         async def main_query():
             doc = await self.configs_col_main.find_one({"key": key})
-            return doc["value"] if doc else default
+            return doc["value"] if doc else CONFIG_MISSING
+
+        value = await self._safe_main_query(main_query, fallback_val=CONFIG_UNAVAILABLE)
+        if value is CONFIG_UNAVAILABLE:
+            return default # not cached, retried on the next call
+
+        self._cache_config(key, value)
+        return default if value is CONFIG_MISSING else value
 
-        return await self._safe_main_query(main_query, fallback_val=default)
+    def _cache_config(self, key, value):
+        self.config_cache[key] = (time.monotonic() + Config.CONFIG_CACHE_TTL, value)
+        return value
 
     async def update_config(self, key, value):
         # Always write to Private (Local Override)
         await self.configs_col_private.update_one(
             {"key": key}, {"$set": {"value": value}}, upsert=True
         )
+        self._cache_config(key, value)
 
     # --- Channels ---
     async def add_channel(self, chat_id, title, username, channel_type="storage", invite_link=None):
@@ -308,6 +516,51 @@ class Database:
         cursor = self.channels_col_private.find({"type": "series", "tmdb_id": str(tmdb_id)})
         return await cursor.to_list(length=10)
 
+    def bump_series_version(self, tmdb_id):
+        if not tmdb_id: return
+        key = str(tmdb_id)
+        self.series_versions[key] = self.series_versions.get(key, 0) + 1
+
+    def get_series_version(self, tmdb_id):
+        return self.series_versions.get(str(tmdb_id), 0)
+
+    async def get_series_groups(self, tmdb_id):
+        """
+        Local groups of a TMDb ID with the union of their bundles' qualities.
+        Single round trip ($lookup into PrivateDB bundles).
+        """
+        pipeline = [
+            {"$match": {"tmdb_id": str(tmdb_id)}},
+            {"$lookup": {
+                "from": self.bundles_col_private.name,
+                "localField": "bundles",
+                "foreignField": "code",
+                "pipeline": [{"$project": {"_id": 0, "qualities": 1, "title": 1}}],
+                "as": "bundle_docs"
+            }},
+            {"$project": {
+                "_id": 0,
+                "code": 1,
+                "title": 1,
+                "season": 1,
+                "episode_val": 1,
+                "qualities": {"$reduce": {
+                    "input": "$bundle_docs",
+                    "initialValue": [],
+                    "in": {"$setUnion": ["$$value", {"$ifNull": ["$$this.qualities", []]}]}
+                }},
+                # Legacy bundles without a qualities field (quality parsed from title)
+                "legacy_titles": {"$map": {
+                    "input": {"$filter": {
+                        "input": "$bundle_docs",
+                        "cond": {"$eq": [{"$size": {"$ifNull": ["$$this.qualities", []]}}, 0]}
+                    }},
+                    "in": "$$this.title"
+                }}
+            }}
+        ]
+        return await self.groups_col_private.aggregate(pipeline).to_list(length=100)
+
     async def update_series_channel_messages(self, chat_id, buttons_msg_id, instruction_msg_id=None):
         update = {"buttons_msg_id": buttons_msg_id}
         if instruction_msg_id:
@@ -331,6 +584,7 @@ class Database:
         }
         doc.update(kwargs)
         await self.bundles_col_private.insert_one(doc)
+        self.bump_series_version(doc.get("tmdb_id"))
 
     async def get_bundle(self, code):
         # Try Private First
@@ -368,20 +622,186 @@ class Database:
             pass
 
     async def update_bundle_title(self, code, new_title):
-        res = await self.bundles_col_private.update_one({"code": code}, {"$set": {"title": new_title}})
-        if res.matched_count == 0:
+        doc = await self.bundles_col_private.find_one_and_update(
+            {"code": code}, {"$set": {"title": new_title}}, projection={"tmdb_id": 1}
+        )
+        if not doc:
              logger.warning(f"Attempted to update Global Bundle {code}. Read-only – use PrivateDB for local.")
              return False
+        # Legacy bundles without `qualities` derive their quality from the title
+        self.bump_series_version(doc.get("tmdb_id"))
         return True
 
     async def delete_bundle(self, code):
-        res = await self.bundles_col_private.delete_one({"code": code})
-        if res.deleted_count == 0:
+        doc = await self.bundles_col_private.find_one_and_delete({"code": code}, projection={"tmdb_id": 1})
+        if not doc:
              # Check if exists in main?
              logger.warning(f"Attempted to delete Global Bundle {code}. Read-only – use PrivateDB for local.")
              return False
+        self.bump_series_version(doc.get("tmdb_id"))
         return True
 
+    # --- Push Requests (Franchisee -> MainDB) ---
+    async def submit_push_requests(self, codes, user_id, bot_username, bot_id):
+        """
+        Pushes local bundles to MainDB in one batch.
+        Returns one result per code: {"code", "title", "status": sent|duplicate|not_found|error, "error"}
+        """
+        codes = list(dict.fromkeys(codes))
+        results = {c: {"code": c, "title": None, "status": "not_found", "error": None} for c in codes}
+
+        bundles = await self.bundles_col_private.find({"code": {"$in": codes}}).to_list(length=len(codes))
+
+        # Same lookup as get_bundle: codes not found locally are resolved in MainDB (one batch)
+        found = {b["code"] for b in bundles}
+        missing = [c for c in codes if c not in found]
+        if missing:
+            async def main_query():
+                return await self.bundles_col_main.find({"code": {"$in": missing}}).to_list(length=len(missing))
+            bundles += await self._safe_main_query(main_query, fallback_val=[])
+
+        order = {c: i for i, c in enumerate(codes)}
+        bundles.sort(key=lambda b: order[b["code"]])
+
+        def key_of(b):
+            return (b.get("tmdb_id"), b.get("title", "Untitled"))
+
+        # Duplicates: one $or per collection (approved bundles + requests of any status)
+        dup_keys = set()
+        or_query = [{"tmdb_id": t, "title": ti} for t, ti in {key_of(b) for b in bundles}]
+        if or_query:
+            for col in (self.bundles_col_main, self.push_requests_col_main):
+                async for d in col.find({"$or": or_query}, {"tmdb_id": 1, "title": 1}):
+                    dup_keys.add((d.get("tmdb_id"), d.get("title")))
+
+        docs, doc_codes = [], []
+        for b in bundles:
+            k = key_of(b)
+            res = results[b["code"]]
+            res["title"] = k[1]
+            if k in dup_keys:
+                res["status"] = "duplicate"
+                continue
+            dup_keys.add(k) # same title twice in this batch
+
+            files = b.get("file_ids", [])
+            docs.append({
+                "title": k[1],
+                "tmdb_id": k[0],
+                "file_ids_summary": {
+                    "count": len(files),
+                    "total_size": sum(f.get("file_size", 0) for f in files)
+                },
+                "qualities": b.get("qualities", []),
+                "season": b.get("season"),
+                "episode_count_total": b.get("episode_count_total"),
+                "nehmer_id": user_id, # Current Admin User
+                "franchisee_id": Config.FRANCHISEE_ID,
+                "status": "pending",
+                "timestamp": datetime.utcnow(),
+                "private_bundle_ids": [b["code"]], # Single bundle
+                "origin_bundle_codes": [b["code"]], # Array of strings for redirect
+                "origin_bot_username": bot_username,
+                "origin_bot_id": bot_id
+            })
+            doc_codes.append(b["code"])
+
+        if not docs:
+            return list(results.values())
+
+        # insert_many assigns _id client-side, so ids are known even on partial failure
+        failed = {}
+        try:
+            await self.push_requests_col_main.insert_many(docs, ordered=False)
+        except BulkWriteError as e:
+            for err in e.details.get("writeErrors", []):
+                failed[err["index"]] = err
+        except Exception as e:
+            logger.error(f"Push batch insert failed: {e}")
+            for i in range(len(docs)):
+                failed[i] = {"code": None, "errmsg": str(e)}
+
+        local_docs = []
+        now_str = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+        for i, doc in enumerate(docs):
+            res = results[doc_codes[i]]
+            err = failed.get(i)
+            if err:
+                if err.get("code") == 11000:
+                    res["status"] = "duplicate" # lost a race against another push
+                else:
+                    res["status"] = "error"
+                    res["error"] = err.get("errmsg")
+                continue
+
+            res["status"] = "sent"
+            local_docs.append({
+                "code": doc_codes[i],
+                "title": doc["title"],
+                "tmdb_id": doc["tmdb_id"],
+                "status": "pending",
+                "request_date": now_str,
+                "user_id": user_id,
+                "main_request_id": doc["_id"]
+            })
+
+        # Local History (PrivateDB)
+        if local_docs:
+            try:
+                await self.push_requests_col.insert_many(local_docs, ordered=False)
+            except Exception as e:
+                logger.error(f"Failed to log {len(local_docs)} pushes locally: {e}")
+
+        logger.info(f"Push batch: {len(local_docs)} sent, {len(codes) - len(local_docs)} not sent.")
+        return list(results.values())
+
+    async def get_push_status_counts(self):
+        """Local push history grouped by status: {status: count}."""
+        pipeline = [{"$group": {"_id": "$status", "count": {"$sum": 1}}}]
+        results = await self.push_requests_col.aggregate(pipeline).to_list(length=20)
+        return {r["_id"]: r["count"] for r in results}
+
+    async def get_pending_push_batch(self, after_id=None, limit=100):
+        """Pending local pushes in _id order, starting after the checkpoint."""
+        query = {"status": "pending", "main_request_id": {"$exists": True}}
+        if after_id is not None:
+            query["_id"] = {"$gt": after_id}
+        cursor = self.push_requests_col.find(
+            query, {"code": 1, "title": 1, "tmdb_id": 1, "user_id": 1, "main_request_id": 1}
+        ).sort("_id", 1).limit(limit)
+        return await cursor.to_list(length=limit)
+
+    async def get_main_push_statuses(self, request_ids):
+        """{main_request_id: doc} for one batch (single $in on MainDB)."""
+        async def main_query():
+            cursor = self.push_requests_col_main.find({"_id": {"$in": request_ids}})
+            return await cursor.to_list(length=len(request_ids))
+        docs = await self._safe_main_query(main_query, fallback_val=None)
+        if docs is None: return None
+        return {d["_id"]: d for d in docs}
+
+    async def find_main_bundle_keys(self, keys):
+        """Which (tmdb_id, title) pairs exist as approved global bundles (single $or)."""
+        if not keys: return set()
+        cursor = self.bundles_col_main.find(
+            {"$or": [{"tmdb_id": t, "title": ti} for t, ti in keys]},
+            {"tmdb_id": 1, "title": 1}
+        )
+        return {(d.get("tmdb_id"), d.get("title")) async for d in cursor}
+
+    async def apply_push_updates(self, updates):
+        """updates: list of (local _id, fields) -> one bulk write."""
+        if not updates: return
+        ops = [UpdateOne({"_id": _id}, {"$set": fields}) for _id, fields in updates]
+        await self.push_requests_col.bulk_write(ops, ordered=False)
+
+    async def get_cache_value(self, key, default=None):
+        doc = await self.local_cache_col.find_one({"key": key})
+        return doc["value"] if doc else default
+
+    async def set_cache_value(self, key, value):
+        await self.local_cache_col.update_one({"key": key}, {"$set": {"value": value}}, upsert=True)
+
     # --- Requests (Request Bot) ---
     async def mark_request_done(self, tmdb_id, media_type):
         if not tmdb_id: return
@@ -410,17 +830,15 @@ class Database:
         return False
         # If we wanted local tasks, we'd use tasks_col_private (not implemented yet).
 
-    async def get_random_tasks(self, limit=3):
-        async def main_query():
-            pipeline = [{"$sample": {"size": limit}}]
-            cursor = self.tasks_col.aggregate(pipeline)
-            return await cursor.to_list(length=limit)
-        return await self._safe_main_query(main_query, fallback_val=[])
-
     async def get_all_tasks(self):
+        # Quests sample from utils.task_pool (in memory), not from here
         async def main_query():
             return await self.tasks_col.find({}).to_list(length=1000)
-        return await self._safe_main_query(main_query, fallback_val=[])
+
+        async def cache_fallback():
+            return await self.cache_tasks_col.find({}).to_list(length=1000)
+
+        return await self._safe_main_query(main_query, fallback_coro=cache_fallback)
 
     async def delete_task(self, question):
         logger.warning("Attempted to delete task from MainDB. Read-only.")
@@ -464,109 +882,182 @@ class Database:
 
     async def add_request(self, user_id):
         now = time.time()
-        # Increment total_requests for Request Rank
+        # Increment total_requests and recompute the Request Rank in the same write
         await self.users_col.update_one(
             {"user_id": user_id},
-            {"$push": {"requests": now}, "$inc": {"total_requests": 1}},
+            [
+                {"$set": {
+                    "requests": {"$concatArrays": [{"$ifNull": ["$requests", []]}, [now]]},
+                    # Legacy users without a counter start from their (pruned) history
+                    "total_requests": {"$add": [
+                        {"$ifNull": ["$total_requests", {"$size": {"$ifNull": ["$requests", []]}}]}, 1
+                    ]}
+                }},
+                {"$set": {
+                    "xp_request": "$total_requests",
+                    "rank_request": rank_switch("$total_requests", REQUEST_RANKS)
+                }}
+            ],
             upsert=True
         )
 
     # --- Profile & Ranks ---
     async def add_xp(self, user_id, amount):
         if amount <= 0: return
-        await self.users_col.update_one(
+        # XP and Fileshare Rank in one write
+        doc = await self.users_col.find_one_and_update(
             {"user_id": user_id},
-            {"$inc": {"xp_fileshare": amount}}
+            [
+                {"$set": {"xp_fileshare": {"$add": [{"$ifNull": ["$xp_fileshare", 0]}, amount]}}},
+                {"$set": {"rank_fileshare": rank_switch("$xp_fileshare", FILESHARE_RANKS)}}
+            ],
+            projection={"xp_fileshare": 1},
+            return_document=ReturnDocument.AFTER
         )
+        if doc:
+            await self.offer_leaderboard("xp", user_id, doc.get("xp_fileshare", 0))
 
-    async def ensure_full_user_profile(self, user_id):
-        user = await self.users_col.find_one({"user_id": user_id})
-        if not user:
-            await self.ensure_user(user_id)
-            user = await self.users_col.find_one({"user_id": user_id})
-
-        updates = {}
-
-        # 1. Backfill XP from Referrals
-        # Check explicit flag to avoid race condition with add_xp
-        if not user.get("xp_backfilled", False):
-            referral_count = user.get("referral_count", 0)
-            backfill_amount = referral_count * 100
-
-            current_xp = user.get("xp_fileshare", 0)
-            xp_fileshare = current_xp + backfill_amount
-
-            updates["xp_fileshare"] = xp_fileshare
-            updates["xp_backfilled"] = True
-            user["xp_fileshare"] = xp_fileshare
-        else:
-            xp_fileshare = user.get("xp_fileshare", 0)
-
-        # 2. Get Total Requests
-        if "total_requests" not in user:
-            # Best effort initialization from pruned history
-            reqs = user.get("requests", [])
-            total_requests = len(reqs)
-            updates["total_requests"] = total_requests
-            user["total_requests"] = total_requests
-        else:
-            total_requests = user.get("total_requests", 0)
-
-        # 3. Calculate Ranks
-        from utils.ranks import REQUEST_RANKS, FILESHARE_RANKS, get_rank_info, get_badges
+    async def get_user_profile(self, user_id):
+        """
+        Single projected read for /profile (no writes).
+        Users not yet migrated get the same values computed on the fly.
+        """
+        user = await self.users_col.find_one({"user_id": user_id}, PROFILE_FIELDS) or {"user_id": user_id}
 
-        req_info = get_rank_info(total_requests, REQUEST_RANKS)
-        fs_info = get_rank_info(xp_fileshare, FILESHARE_RANKS)
+        if user.get("profile_v") != PROFILE_VERSION:
+            if not user.get("xp_backfilled", False):
+                user["xp_fileshare"] = user.get("xp_fileshare", 0) + user.get("referral_count", 0) * 100
+            if "badges" not in user:
+                user["badges"] = get_badges(user.get("joined_at"))
+        user.setdefault("total_requests", 0)
 
-        updates["rank_request"] = req_info["current_rank"]
-        updates["rank_fileshare"] = fs_info["current_rank"]
-        updates["xp_request"] = total_requests # Prompt compliance
+        req_info = get_rank_info(user["total_requests"], REQUEST_RANKS)
+        fs_info = get_rank_info(user.get("xp_fileshare", 0), FILESHARE_RANKS)
+        return user, req_info, fs_info
 
-        # 4. Badges (Run once if missing)
-        if "badges" not in user:
-            joined_at = user.get("joined_at", time.time())
-            # Determine Early Adopter (Heavy query, do only if needed)
-            # Find how many users joined before this one
+    async def next_join_ordinal(self):
+        """Atomic 1-based join counter in UserDB (seeded from the user count on first use)."""
+        inc = lambda: self.counters_col.find_one_and_update(
+            {"_id": "user_join"}, {"$inc": {"seq": 1}}, return_document=ReturnDocument.AFTER
+        )
+        doc = await inc()
+        if not doc:
+            # The new user is already inserted, so the count includes them
+            seed = max(await self.users_col.estimated_document_count() - 1, 0)
             try:
-                count_older = await self.users_col.count_documents({"joined_at": {"$lt": joined_at}})
-                user_index = count_older + 1
-            except Exception:
-                user_index = 999999
-
-            badges = get_badges(joined_at, user_index)
-            updates["badges"] = badges
-            user["badges"] = badges
+                await self.counters_col.insert_one({"_id": "user_join", "seq": seed})
+            except DuplicateKeyError:
+                pass # another bot seeded it first
+            doc = await inc()
+        return doc["seq"]
+
+    # --- One-Time Migrations (UserDB markers, shared by all franchise bots) ---
+    async def migration_done(self, name):
+        return await self.counters_col.find_one({"_id": f"migration:{name}"}) is not None
+
+    async def mark_migration_done(self, name):
+        await self.counters_col.update_one(
+            {"_id": f"migration:{name}"}, {"$set": {"done_at": time.time()}}, upsert=True
+        )
 
-        # Apply Updates
-        if updates:
-            await self.users_col.update_one({"user_id": user_id}, {"$set": updates})
-            # Merge updates into user object for return
-            user.update(updates)
+    async def migrate_user_profiles(self):
+        """
+        One-time migration of legacy users (formerly done on their first /profile):
+        referral XP backfill, request counter, ranks and badges. Both steps are
+        idempotent; the marker is set only after both succeeded, so an interrupted
+        run is simply repeated on the next start.
+        """
+        marker = f"user_profiles_v{PROFILE_VERSION}"
+        if await self.migration_done(marker):
+            return 0
+
+        res = await self.users_col.update_many(
+            {"profile_v": {"$ne": PROFILE_VERSION}},
+            [
+                XP_BACKFILL_STAGE,
+                {"$set": {
+                    "total_requests": {"$ifNull": ["$total_requests", {"$size": {"$ifNull": ["$requests", []]}}]},
+                    "badges": {"$ifNull": ["$badges", {"$cond": [
+                        {"$gt": ["$joined_at", None]}, date_badges_expr("$joined_at"), []
+                    ]}]}
+                }},
+                {"$set": {
+                    "xp_request": "$total_requests",
+                    "rank_request": rank_switch("$total_requests", REQUEST_RANKS),
+                    "rank_fileshare": rank_switch("$xp_fileshare", FILESHARE_RANKS),
+                    "profile_v": PROFILE_VERSION
+                }}
+            ]
+        )
+        # Early Adopter: first users by join date (indexed sort, replaces the per-view count)
+        cursor = self.users_col.find(
+            {"joined_at": {"$exists": True}}, {"_id": 0, "user_id": 1}
+        ).sort("joined_at", 1).limit(EARLY_ADOPTER_LIMIT)
+        first_ids = [u["user_id"] async for u in cursor]
+        if first_ids:
+            await self.users_col.update_many(
+                {"user_id": {"$in": first_ids}},
+                {"$addToSet": {"badges": "Early Adopter"}}
+            )
 
-        return user, req_info, fs_info
+        await self.mark_migration_done(marker)
+        logger.info(f"Profile migration: {res.modified_count} users updated.")
+        return res.modified_count
 
     # --- Premium ---
-    async def add_premium_user(self, user_id, duration_days):
-        await self.extend_premium_user(user_id, duration_days)
+    async def add_premium_user(self, user_id, duration_days, grant_id=None):
+        return await self.extend_premium_user(user_id, duration_days, grant_id)
 
     async def remove_premium_user(self, user_id):
         await self.users_col.update_one(
             {"user_id": user_id},
             {"$set": {"is_premium": False, "premium_expiry": 0}}
         )
+        self._cache_premium(user_id, 0)
+
+    def _cache_premium(self, user_id, expiry):
+        self.premium_cache[user_id] = (time.monotonic(), expiry)
+        self.premium_cache.move_to_end(user_id)
+        while len(self.premium_cache) > Config.PREMIUM_CACHE_SIZE:
+            self.premium_cache.popitem(last=False)
+        return expiry
+
+    async def get_premium_expiry(self, user_id):
+        """Premium expiry timestamp (0 = never / revoked), from a short-lived cache."""
+        hit = self.premium_cache.get(user_id)
+        if hit and time.monotonic() - hit[0] < Config.PREMIUM_CACHE_TTL:
+            return hit[1]
+
+        user = await self.users_col.find_one(
+            {"user_id": user_id}, {"_id": 0, "is_premium": 1, "premium_expiry": 1}
+        )
+        expiry = user.get("premium_expiry", 0) if user and user.get("is_premium") else 0
+        return self._cache_premium(user_id, expiry)
 
     async def is_premium_user(self, user_id):
-        user = await self.users_col.find_one({"user_id": user_id})
-        if not user or not user.get("is_premium"):
-            return False
-        expiry = user.get("premium_expiry", 0)
-        if expiry < time.time():
-            return False
-        return True
+        # Cached expiry stays valid as time passes, only grants from other bots lag by the TTL
+        return await self.get_premium_expiry(user_id) > time.time()
 
     async def get_premium_users(self):
-         cursor = self.users_col.find({"is_premium": True})
-         return await cursor.to_list(length=1000)
+        """Active premium users only (indexed range on premium_expiry)."""
+        cursor = self.users_col.find(
+            {"is_premium": True, "premium_expiry": {"$gt": time.time()}},
+            {"_id": 0, "user_id": 1, "premium_expiry": 1}
+        ).sort("premium_expiry", 1)
+        return await cursor.to_list(length=1000)
+
+    async def count_active_premium(self):
+        return await self.users_col.count_documents(
+            {"is_premium": True, "premium_expiry": {"$gt": time.time()}}
+        )
+
+    async def sweep_expired_premium(self):
+        """Flips expired premium users in bulk. Returns the number of users updated."""
+        res = await self.users_col.update_many(
+            {"is_premium": True, "premium_expiry": {"$lte": time.time()}},
+            {"$set": {"is_premium": False}}
+        )
+        return res.modified_count
 
     async def is_user_banned(self, user_id):
         """Check if a user is globally banned."""
@@ -586,22 +1077,75 @@ class Database:
         )
         return True
 
-    async def increment_referral(self, referrer_id):
-        await self.users_col.update_one(
-            {"user_id": referrer_id},
-            {"$inc": {"referral_count": 1}},
-            upsert=True
-        )
-        return await self.get_referral_count(referrer_id)
+    async def record_referral(self, referee_id, referrer_id, bot_id, target, reward_hours, cross_bonus_hours):
+        """
+        Counts one referral. Idempotent: the referrals ledger is unique on referee_id.
+        Counter, XP (+100), Fileshare Rank and premium rewards (target reached /
+        cross-franchise referrer) are applied in ONE pipeline write on the referrer.
+        Returns None if the referee was already counted, else a result dict.
+        """
+        try:
+            await self.referrals_col.insert_one({
+                "referee_id": referee_id, "referrer_id": referrer_id, "bot_id": bot_id, "ts": time.time()
+            })
+        except DuplicateKeyError:
+            return None
+
+        now = time.time()
+        count = {"$add": [{"$ifNull": ["$referral_count", 0]}, 1]}
+        # Referrer joined through another bot of the network
+        cross = {"$and": [{"$gt": ["$origin_bot_id", None]}, {"$ne": ["$origin_bot_id", bot_id]}]}
+        target_hit = {"$eq": [{"$mod": [count, target]}, 0]} if target > 0 else False
+        try:
+            doc = await self.users_col.find_one_and_update(
+                {"user_id": referrer_id},
+                [
+                    # Backfill first, so the referral below is not counted again by the migration / profile view
+                    XP_BACKFILL_STAGE,
+                    {"$set": {"_ref_bonus": {"$add": [
+                        {"$cond": [cross, cross_bonus_hours * 3600, 0]},
+                        {"$cond": [target_hit, reward_hours * 3600, 0]}
+                    ]}}},
+                    {"$set": {
+                        "referral_count": count,
+                        "xp_fileshare": {"$add": [{"$ifNull": ["$xp_fileshare", 0]}, 100]},
+                        "premium_expiry": {"$cond": [
+                            {"$gt": ["$_ref_bonus", 0]},
+                            {"$add": [{"$max": [{"$ifNull": ["$premium_expiry", 0]}, now]}, "$_ref_bonus"]},
+                            "$premium_expiry"
+                        ]},
+                        "is_premium": {"$cond": [{"$gt": ["$_ref_bonus", 0]}, True, "$is_premium"]}
+                    }},
+                    {"$set": {"rank_fileshare": rank_switch("$xp_fileshare", FILESHARE_RANKS)}},
+                    {"$unset": "_ref_bonus"}
+                ],
+                projection={"referral_count": 1, "xp_fileshare": 1, "premium_expiry": 1, "origin_bot_id": 1},
+                upsert=True,
+                return_document=ReturnDocument.AFTER
+            )
+        except Exception:
+            # Not applied: release the referee so a retry can count it
+            await self.referrals_col.delete_one({"referee_id": referee_id})
+            raise
+
+        new_count = doc.get("referral_count", 0)
+        origin = doc.get("origin_bot_id")
+        result = {
+            "count": new_count,
+            "target_reached": target > 0 and new_count % target == 0,
+            "cross_bonus": origin is not None and origin != bot_id
+        }
+        if result["target_reached"] or result["cross_bonus"]:
+            self._cache_premium(referrer_id, doc.get("premium_expiry", 0))
+
+        await self.offer_leaderboard("referrals", referrer_id, new_count)
+        await self.offer_leaderboard("xp", referrer_id, doc.get("xp_fileshare", 0))
+        return result
 
     async def get_referral_count(self, user_id):
         user = await self.users_col.find_one({"user_id": user_id})
         return user.get("referral_count", 0) if user else 0
 
-    async def get_user_origin(self, user_id):
-        user = await self.users_col.find_one({"user_id": user_id})
-        return user.get("origin_bot_id") if user else None
-
     # --- Auto-Delete ---
     async def add_to_delete_queue(self, chat_id, message_ids, delete_at):
         await self.delete_queue_col.insert_one({
@@ -619,6 +1163,12 @@ class Database:
         await self.delete_queue_col.delete_many({"_id": {"$in": id_list}})
 
     # --- Stats ---
+    async def ping_main(self):
+        """MainDB round trip in ms."""
+        t0 = time.perf_counter()
+        await self.db_main.command("ping")
+        return (time.perf_counter() - t0) * 1000
+
     async def get_active_users_24h(self):
         count = await self.users_col.count_documents({"requests": {"$exists": True, "$not": {"$size": 0}}})
         return count
@@ -630,9 +1180,93 @@ class Database:
         cutoff = time.time() - (days * 24 * 3600)
         return await self.users_col.count_documents({"joined_at": {"$gte": cutoff}})
 
-    async def get_top_referrers(self, limit=10):
-        cursor = self.users_col.find().sort("referral_count", -1).limit(limit)
-        return await cursor.to_list(length=limit)
+
+    # --- Leaderboards (UserDB, shared by all franchise bots) ---
+    async def recompute_leaderboard(self, board):
+        """Full rebuild of one top-N document from the indexed users field."""
+        field = LEADERBOARD_FIELDS[board]
+        size = Config.LEADERBOARD_SIZE
+        cursor = self.users_col.find(
+            {field: {"$gt": 0}}, {"_id": 0, "user_id": 1, field: 1}
+        ).sort(field, -1).limit(size)
+        entries = [{"user_id": u["user_id"], "value": u.get(field, 0)} async for u in cursor]
+
+        doc = {
+            "entries": entries,
+            # Value to beat once the board is full (0 = any positive value enters)
+            "min_value": entries[-1]["value"] if len(entries) >= size else 0,
+            "updated_at": time.time()
+        }
+        await self.leaderboards_col.update_one({"_id": board}, {"$set": doc}, upsert=True)
+        self.leaderboard_floors[board] = doc["min_value"]
+        doc["_id"] = board
+        return doc
+
+    async def offer_leaderboard(self, board, user_id, value):
+        """
+        Incremental update after a user's value grew. Only writes if the value
+        beats the current Nth entry; the board is re-sorted and trimmed atomically.
+        """
+        floor = self.leaderboard_floors.get(board)
+        if floor is not None and value <= floor:
+            return # common case: nowhere near the top
+
+        size = Config.LEADERBOARD_SIZE
+        others = {"$filter": {
+            "input": {"$ifNull": ["$entries", []]},
+            "cond": {"$ne": ["$$this.user_id", user_id]}
+        }}
+        try:
+            doc = await self.leaderboards_col.find_one_and_update(
+                {"_id": board, "min_value": {"$lt": value}},
+                [
+                    {"$set": {"entries": {"$slice": [
+                        {"$sortArray": {
+                            "input": {"$concatArrays": [others, [{"user_id": user_id, "value": value}]]},
+                            "sortBy": {"value": -1}
+                        }},
+                        size
+                    ]}}},
+                    {"$set": {
+                        "min_value": {"$cond": [
+                            {"$gte": [{"$size": "$entries"}, size]}, {"$min": "$entries.value"}, 0
+                        ]},
+                        "updated_at": time.time()
+                    }}
+                ],
+                projection={"min_value": 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if doc:
+                self.leaderboard_floors[board] = doc["min_value"]
+            elif floor is None:
+                # Board missing (or floor unknown in this process): rebuild once
+                await self.recompute_leaderboard(board)
+            else:
+                # Did not place, so the real floor is at least this value
+                self.leaderboard_floors[board] = value
+        except OperationFailure as e:
+            # $sortArray needs MongoDB 5.2+
+            logger.warning(f"Incremental leaderboard update failed ({e}), rebuilding.")
+            await self.recompute_leaderboard(board)
+        except Exception as e:
+            logger.warning(f"Leaderboard offer failed: {e}")
+
+    async def get_leaderboard(self, board):
+        doc = await self.leaderboards_col.find_one({"_id": board})
+        if not doc:
+            doc = await self.recompute_leaderboard(board)
+        return doc
+
+    async def get_user_rank(self, board, user_id):
+        """Returns (rank or None, value). Rank = indexed count of users strictly ahead + 1."""
+        field = LEADERBOARD_FIELDS[board]
+        user = await self.users_col.find_one({"user_id": user_id}, {"_id": 0, field: 1})
+        value = (user or {}).get(field, 0)
+        if value <= 0:
+            return None, 0
+        ahead = await self.users_col.count_documents({field: {"$gt": value}})
+        return ahead + 1, value
 
     # --- Coupons ---
     async def create_coupon(self, code, reward_hours, usage_limit=1):
@@ -643,43 +1277,107 @@ class Database:
         return False
 
     async def get_coupon(self, code):
+        """Coupon definition from MainDB, cached (definitions rarely change)."""
+        hit = self.coupon_cache.get(code)
+        if hit and hit[0] > time.monotonic():
+            return hit[1]
+
         async def main_query():
             return await self.coupons_col.find_one({"code": code})
-        return await self._safe_main_query(main_query, fallback_val=None)
+        coupon = await self._safe_main_query(main_query, fallback_val=CONFIG_UNAVAILABLE)
+        if coupon is CONFIG_UNAVAILABLE:
+            return None # not cached, retried on the next call
+
+        # Unknown codes are cached shorter (e.g. typos right before the coupon goes live)
+        ttl = Config.COUPON_CACHE_TTL if coupon else Config.COUPON_CACHE_TTL / 10
+        self.coupon_cache[code] = (time.monotonic() + ttl, coupon)
+        return coupon
+
+    async def _claim_coupon_slot(self, code, limit, seed):
+        """Atomic usage counter in UserDB, shared by all franchise bots. True if a slot was taken."""
+        claim = lambda: self.coupon_counters_col.find_one_and_update(
+            {"_id": code, "used": {"$lt": limit}}, {"$inc": {"used": 1}}
+        )
+        if await claim():
+            return True
 
-    async def redeem_coupon(self, code, user_id):
-        # UserDB Write (OK)
-        user = await self.users_col.find_one({"user_id": user_id, "redeemed_coupons": code})
-        if user:
-            return False, "already_used"
+        # Counter missing (first redemption) or full
+        if seed >= limit:
+            return False
+        try:
+            await self.coupon_counters_col.insert_one({"_id": code, "used": seed + 1})
+            return True
+        except DuplicateKeyError:
+            # Created concurrently by another redemption: one more try
+            return bool(await claim())
 
-        # Read Coupon (MainDB Safe)
+    async def redeem_coupon(self, code, user_id):
         coupon = await self.get_coupon(code)
         if not coupon:
             return False, "invalid"
 
-        if coupon["used_count"] >= coupon["usage_limit"]:
-            return False, "limit_reached"
+        # Until the one-time ledger migration is done, legacy redemptions are only on the user doc
+        legacy = not await self._coupon_ledger_ready()
+        if legacy and await self.users_col.find_one({"user_id": user_id, "redeemed_coupons": code}, {"_id": 1}):
+            return False, "already_used"
 
-        # Update Coupon Used Count (MainDB Write) -> Fail
-        # This is tricky. If coupons are Global, Franchisee cannot update usage count in MainDB.
-        # Solution: "Shared read/write UserDB... coupons for global Premium".
-        # Maybe coupons collection should be in UserDB? Or MainDB?
-        # If MainDB is STRICT read-only, we cannot increment usage.
-        # We try to update, but catch any error and proceed (since user validation passed).
+        # 1. Ledger entry (unique code + user_id): one redemption per user
         try:
-             await self.coupons_col.update_one({"code": code}, {"$inc": {"used_count": 1}})
-        except Exception as e:
-             logger.warning(f"Could not increment coupon usage in MainDB (Read-Only): {e}. Proceeding with reward.")
+            await self.coupon_redemptions_col.insert_one({"code": code, "user_id": user_id, "ts": time.time()})
+        except DuplicateKeyError:
+            return False, "already_used"
 
-        await self.users_col.update_one(
-            {"user_id": user_id},
-            {"$push": {"redeemed_coupons": code}},
-            upsert=True
-        )
-        await self.add_premium_user(user_id, coupon["reward_hours"] / 24.0)
+        # 2. Usage slot (enforces usage_limit across all bots)
+        seed = coupon.get("used_count", 0)
+        unclaim = lambda: self.coupon_redemptions_col.delete_one({"code": code, "user_id": user_id})
+        try:
+            if not await self.coupon_counters_col.find_one({"_id": code}, {"_id": 1}):
+                # Counter starts from legacy usage (MainDB count / migrated ledger entries, ts 0)
+                if legacy:
+                    legacy_used = await self.users_col.count_documents({"redeemed_coupons": code})
+                else:
+                    legacy_used = await self.coupon_redemptions_col.count_documents({"code": code, "ts": 0})
+                seed = max(seed, legacy_used)
+            claimed = await self._claim_coupon_slot(code, coupon["usage_limit"], seed)
+        except Exception:
+            await unclaim() # compensate, the user can retry
+            raise
+
+        if not claimed:
+            await unclaim()
+            return False, "limit_reached"
+
+        await self.add_premium_user(user_id, coupon["reward_hours"] / 24.0, grant_id=f"coupon:{code}")
         return True, "success"
 
+    async def _coupon_ledger_ready(self):
+        if not self.coupon_ledger_migrated:
+            self.coupon_ledger_migrated = await self.migration_done("coupon_ledger")
+        return self.coupon_ledger_migrated
+
+    async def migrate_coupon_ledger(self):
+        """
+        One-time copy of legacy users.redeemed_coupons into the ledger ($merge on
+        code + user_id). The field is no longer written, so later starts skip it.
+        """
+        if await self._coupon_ledger_ready():
+            return
+        # $merge needs the unique index, which may not exist yet on first start
+        await self.coupon_redemptions_col.create_index([("code", 1), ("user_id", 1)], unique=True)
+        await self.users_col.aggregate([
+            {"$match": {"redeemed_coupons.0": {"$exists": True}}},
+            {"$unwind": "$redeemed_coupons"},
+            {"$project": {"_id": 0, "code": "$redeemed_coupons", "user_id": 1, "ts": {"$literal": 0}}},
+            {"$merge": {
+                "into": self.coupon_redemptions_col.name,
+                "on": ["code", "user_id"],
+                "whenMatched": "keepExisting",
+                "whenNotMatched": "insert"
+            }}
+        ]).to_list(length=None)
+        await self.mark_migration_done("coupon_ledger")
+        self.coupon_ledger_migrated = True
+
     async def delete_coupon(self, code):
         logger.warning("Attempted to delete coupon from MainDB. Read-only.")
         return False
@@ -687,85 +1385,149 @@ class Database:
     async def get_all_coupons(self):
         async def main_query():
             return await self.coupons_col.find({}).to_list(length=100)
-        return await self._safe_main_query(main_query, fallback_val=[])
+        coupons = await self._safe_main_query(main_query, fallback_val=[])
 
-    # --- Daily Bonus ---
-    async def get_daily_status(self, user_id):
-        user = await self.users_col.find_one({"user_id": user_id})
-        last_daily = user.get("last_daily", 0) if user else 0
-        now = time.time()
-        if now - last_daily > 24 * 3600:
-            return True
-        return False
+        # Usage lives in the UserDB counters
+        if coupons:
+            try:
+                counters = await self.coupon_counters_col.find(
+                    {"_id": {"$in": [c["code"] for c in coupons]}}
+                ).to_list(length=None)
+                used = {c["_id"]: c["used"] for c in counters}
+                for c in coupons:
+                    c["used_count"] = max(c.get("used_count", 0), used.get(c["code"], 0))
+            except Exception as e:
+                logger.warning(f"Coupon counters unavailable: {e}")
+        return coupons
 
+    # --- Daily Bonus ---
     async def claim_daily_bonus(self, user_id, reward_hours=1):
+        """
+        Claim + premium extension in one conditional pipeline write (race-free, one round trip).
+        Returns (True, new_expiry) or (False, seconds until the next claim).
+        """
         now = time.time()
-        await self.users_col.update_one(
+        cooldown = 24 * 3600
+        claim = "$_daily_claim"
+        before = await self.users_col.find_one_and_update(
             {"user_id": user_id},
-            {"$set": {"last_daily": now}},
-            upsert=True
+            [
+                {"$set": {"_daily_claim": {"$lte": [{"$ifNull": ["$last_daily", 0]}, now - cooldown]}}},
+                {"$set": {
+                    "last_daily": {"$cond": [claim, now, "$last_daily"]},
+                    "premium_expiry": {"$cond": [
+                        claim,
+                        {"$add": [{"$max": [{"$ifNull": ["$premium_expiry", 0]}, now]}, reward_hours * 3600]},
+                        "$premium_expiry"
+                    ]},
+                    "is_premium": {"$cond": [claim, True, "$is_premium"]}
+                }},
+                {"$unset": "_daily_claim"}
+            ],
+            projection={"last_daily": 1, "premium_expiry": 1},
+            upsert=True,
+            return_document=ReturnDocument.BEFORE
         )
-        await self.extend_premium_user(user_id, reward_hours / 24.0)
-        return True
 
-    async def extend_premium_user(self, user_id, duration_days):
-        user = await self.users_col.find_one({"user_id": user_id})
-        current_expiry = user.get("premium_expiry", 0) if user else 0
-        now = time.time()
+        before = before or {}
+        last_daily = before.get("last_daily", 0)
+        if last_daily > now - cooldown:
+            return False, last_daily + cooldown - now
 
-        if current_expiry > now:
-            new_expiry = current_expiry + (duration_days * 24 * 3600)
-        else:
-            new_expiry = now + (duration_days * 24 * 3600)
+        new_expiry = max(before.get("premium_expiry", 0), now) + reward_hours * 3600
+        return True, self._cache_premium(user_id, new_expiry)
 
-        await self.users_col.update_one(
-            {"user_id": user_id},
-            {"$set": {"premium_expiry": new_expiry, "is_premium": True}},
-            upsert=True
+    async def extend_premium_user(self, user_id, duration_days, grant_id=None):
+        """
+        Atomic grant: premium_expiry = max(premium_expiry, now) + duration, computed on the server.
+        grant_id makes the grant idempotent (kept in a bounded premium_grants list).
+        Returns the new expiry, or None if this grant_id was already applied.
+        """
+        now = time.time()
+        fields = {
+            "premium_expiry": {"$add": [
+                {"$max": [{"$ifNull": ["$premium_expiry", 0]}, now]},
+                duration_days * 24 * 3600
+            ]},
+            "is_premium": True
+        }
+        query = {"user_id": user_id}
+        if grant_id:
+            query["premium_grants"] = {"$ne": grant_id}
+            fields["premium_grants"] = {"$slice": [
+                {"$concatArrays": [{"$ifNull": ["$premium_grants", []]}, [{"$literal": grant_id}]]},
+                -Config.PREMIUM_GRANT_HISTORY
+            ]}
+
+        grant = lambda q, upsert: self.users_col.find_one_and_update(
+            q, [{"$set": fields}],
+            projection={"premium_expiry": 1},
+            upsert=upsert,
+            return_document=ReturnDocument.AFTER
         )
 
+        # No upsert with a grant filter (a miss would insert a second user doc)
+        doc = await grant(query, upsert=not grant_id)
+        if not doc:
+            if await self.users_col.find_one({"user_id": user_id}, {"_id": 1}):
+                return None # already applied
+            doc = await grant({"user_id": user_id}, upsert=True)
+
+        return self._cache_premium(user_id, doc["premium_expiry"])
+
     # --- User History & Origin ---
     async def ensure_user(self, user_id, origin_bot_id=None):
-        update = {"$set": {"updated_at": time.time()}}
+        now = time.time()
+        update = {"$set": {"updated_at": now}}
         if origin_bot_id:
-             update["$setOnInsert"] = {"origin_bot_id": origin_bot_id, "joined_at": time.time()}
+             update["$setOnInsert"] = {"origin_bot_id": origin_bot_id, "joined_at": now}
 
-        await self.users_col.update_one({"user_id": user_id}, update, upsert=True)
+        res = await self.users_col.update_one({"user_id": user_id}, update, upsert=True)
+        if res.upserted_id is None:
+            return
 
-    async def add_user_history(self, user_id, code, title, limit=3):
-        now = time.time()
-        slice_val = -abs(limit)
+        # New user: join ordinal and badges are fixed once, here
+        join_no = await self.next_join_ordinal()
         await self.users_col.update_one(
             {"user_id": user_id},
-            {"$push": {"history": {
-                "$each": [{"code": code, "title": title, "ts": now}],
-                "$slice": slice_val
-            }}},
-            upsert=True
+            {"$set": {
+                "join_no": join_no,
+                "badges": get_badges(now, join_no),
+                "xp_backfilled": True,
+                "profile_v": PROFILE_VERSION
+            }}
         )
 
-    async def prune_user_history(self, user_id):
-        user = await self.users_col.find_one({"user_id": user_id})
-        if not user or not user.get("history"): return
-
-        retention_hours = await self.get_config("history_retention_hours", 3)
+    def _history_window(self, retention_hours):
+        """$filter expression keeping history entries newer than the retention window."""
         cutoff = time.time() - (retention_hours * 60 * 60)
+        return {"$filter": {
+            "input": {"$ifNull": ["$history", []]},
+            "cond": {"$gt": ["$$this.ts", cutoff]}
+        }}
 
-        new_history = [h for h in user["history"] if h["ts"] > cutoff]
-
-        if len(new_history) != len(user["history"]):
-             await self.users_col.update_one(
-                {"user_id": user_id},
-                {"$set": {"history": new_history}}
-             )
+    async def add_user_history(self, user_id, code, title, limit=3):
+        # Expired entries are dropped in the same write (retention config is cached)
+        retention_hours = await self.get_config("history_retention_hours", 3)
+        entry = {"code": code, "title": title, "ts": time.time()}
+        await self.users_col.update_one(
+            {"user_id": user_id},
+            [{"$set": {"history": {"$slice": [
+                # $literal: titles are user data and may start with "$"
+                {"$concatArrays": [self._history_window(retention_hours), [{"$literal": entry}]]},
+                -abs(limit)
+            ]}}}],
+            upsert=True
+        )
 
     async def get_user_history(self, user_id):
-        await self.prune_user_history(user_id)
-
-        user = await self.users_col.find_one({"user_id": user_id})
-        if not user: return []
-        hist = user.get("history", [])
-        return list(reversed(hist))
+        """Newest first, filtered by retention on the server (one round trip)."""
+        retention_hours = await self.get_config("history_retention_hours", 3)
+        user = await self.users_col.find_one(
+            {"user_id": user_id},
+            {"_id": 0, "history": {"$reverseArray": self._history_window(retention_hours)}}
+        )
+        return user.get("history", []) if user else []
 
     # --- Groups ---
     async def create_group(self, code, title, tmdb_id, media_type, season, bundles=None, episode_val=None):
@@ -780,6 +1542,7 @@ class Database:
             "created_at": time.time()
         }
         await self.groups_col_private.insert_one(doc)
+        self.bump_series_version(doc["tmdb_id"])
         return doc
 
     async def get_group(self, code):
@@ -830,40 +1593,47 @@ class Database:
 
     async def add_bundle_to_group(self, group_code, bundle_code):
         # Only Private groups
-        res = await self.groups_col_private.update_one(
+        doc = await self.groups_col_private.find_one_and_update(
             {"code": group_code},
-            {"$addToSet": {"bundles": bundle_code}}
+            {"$addToSet": {"bundles": bundle_code}},
+            projection={"tmdb_id": 1}
         )
-        if res.matched_count == 0:
+        if not doc:
              logger.warning(f"Attempted to update Global Group {group_code}. Read-only.")
              return False
+        self.bump_series_version(doc.get("tmdb_id"))
         return True
 
     async def remove_bundle_from_group(self, group_code, bundle_code):
-        res = await self.groups_col_private.update_one(
+        doc = await self.groups_col_private.find_one_and_update(
             {"code": group_code},
-            {"$pull": {"bundles": bundle_code}}
+            {"$pull": {"bundles": bundle_code}},
+            projection={"tmdb_id": 1}
         )
-        if res.matched_count == 0:
+        if not doc:
              logger.warning(f"Attempted to update Global Group {group_code}. Read-only.")
              return False
+        self.bump_series_version(doc.get("tmdb_id"))
         return True
 
     async def update_group_title(self, group_code, new_title):
-        res = await self.groups_col_private.update_one(
+        doc = await self.groups_col_private.find_one_and_update(
             {"code": group_code},
-            {"$set": {"title": new_title}}
+            {"$set": {"title": new_title}},
+            projection={"tmdb_id": 1}
         )
-        if res.matched_count == 0:
+        if not doc:
              logger.warning(f"Attempted to update Global Group {group_code}. Read-only.")
              return False
+        self.bump_series_version(doc.get("tmdb_id"))
         return True
 
     async def delete_group(self, group_code):
-        res = await self.groups_col_private.delete_one({"code": group_code})
-        if res.deleted_count == 0:
+        doc = await self.groups_col_private.find_one_and_delete({"code": group_code}, projection={"tmdb_id": 1})
+        if not doc:
              logger.warning(f"Attempted to delete Global Group {group_code}. Read-only.")
              return False
+        self.bump_series_version(doc.get("tmdb_id"))
         return True
 
     async def get_all_groups(self):
@@ -6,6 +6,18 @@ from config import Config
 from db import db
 from log import get_logger
 from utils.sync_manager import sync_from_main
+from utils.event_log import event_log
+from utils.peer_cache import warmup_peer_cache
+from utils.startup import startup
+from utils.task_pool import task_pool
+from utils.push_reconciler import push_reconcile_loop
+from utils.plugin_loader import plugin_loader
+from utils.system_stats import system_stats
+from utils.watchdog import watchdog
+from utils.leaderboard import leaderboard
+from utils.notifier import notifier
+from utils.identity import bot_identity
+from utils.membership import membership
 
 logger = get_logger(__name__)
 
@@ -72,16 +84,17 @@ async def handle_self_destruct(reason, app=None):
     sys.exit(f"SELF DESTRUCT: {reason}")
 
 async def sync_loop():
+    # First sync runs as a startup phase
     logger.info("Starting Sync Loop (30 min interval)...")
     while True:
-        await sync_from_main()
         await asyncio.sleep(1800) # 30 mins
+        await sync_from_main()
 
 async def seed_tasks():
     # Check if tasks exist
     try:
-        tasks = await db.get_all_tasks()
-        if not tasks:
+        # Loads the in-memory task pool as a side effect
+        if not await task_pool.refresh():
             logger.info("Seeding default tasks...")
             defaults = [
                 {"q": "What is 5 + 3?", "a": "8", "t": "text"},
@@ -122,17 +135,27 @@ async def auto_delete_loop(app):
             logger.error(f"Auto-Delete Loop Error: {e}")
             await asyncio.sleep(60)
 
+async def premium_sweep_loop():
+    # Expired premium users are flipped in bulk (is_premium stays meaningful for queries)
+    while True:
+        try:
+            swept = await db.sweep_expired_premium()
+            if swept:
+                logger.info(f"Premium sweep: {swept} expired users.")
+        except Exception as e:
+            logger.warning(f"Premium sweep failed: {e}")
+        await asyncio.sleep(Config.PREMIUM_SWEEP_INTERVAL)
+
+async def start_event_pipeline():
+    # Collection must exist as time-series before the first flush; events queue up meanwhile
+    await db.ensure_event_collection()
+    event_log.mark_ready()
+
 async def main():
     # Set Start Time
     Config.START_TIME = time.time()
-
-    # Connect to Database
-    db.connect()
-
-    # Run Cleanup (Fix pollution from previous syncs)
-    await db.perform_cache_cleanup()
-
-    await seed_tasks()
+    # Loop lag / stall watchdog (covers startup too)
+    watchdog.start()
 
     # Validate Franchise Info
     if not Config.FRANCHISEE_ID or not Config.FRANCHISEE_PASSWORD:
@@ -142,20 +165,36 @@ async def main():
         logger.info(f"✅ Franchisee ID: {Config.FRANCHISEE_ID}")
         logger.info("✅ Franchisee Password: [CONFIGURED]")
 
-    # Initialize Bot
-    plugins = dict(root="plugins")
+    # --- Critical Phases (must succeed before serving) ---
+    await startup.run("db_connect", db.connect, critical=True)
+    # Flusher runs independently of the event_pipeline phase (waits for it, bounded)
+    event_log.start(db.events_col)
+
+    # Initialize Bot (plugins registered by the loader, rarely used admin modules load on first use)
     app = Client(
         "file_share_bot",
         api_id=Config.API_ID,
         api_hash=Config.API_HASH,
-        bot_token=Config.BOT_TOKEN,
-        plugins=plugins
+        bot_token=Config.BOT_TOKEN
     )
 
-    await app.start()
-
-    me = await app.get_me()
-    Config.BOT_USERNAME = me.username
+    await startup.run("plugins", lambda: plugin_loader.load_eager(app), critical=True)
+    await startup.run("telegram_start", app.start, timeout=Config.STARTUP_CRITICAL_TIMEOUT, critical=True)
+    me = await startup.run("get_me", app.get_me, timeout=Config.STARTUP_CRITICAL_TIMEOUT, critical=True)
+    bot_identity.set(me)
+
+    # --- Background Phases (concurrent, bounded, never block updates) ---
+    timeout = Config.STARTUP_PHASE_TIMEOUT
+    startup.background("indexes", db.ensure_indexes, timeout)
+    startup.background("event_pipeline", start_event_pipeline, timeout)
+    startup.background("cache_cleanup", db.perform_cache_cleanup, timeout)
+    startup.background("seed_tasks", seed_tasks, timeout)
+    startup.background("profile_migration", db.migrate_user_profiles, timeout)
+    startup.background("coupon_migration", db.migrate_coupon_ledger, timeout)
+    startup.background("first_sync", sync_from_main, timeout)
+    # Warmup Peer Cache (bounded, persisted in PrivateDB)
+    startup.background("peer_warmup", lambda: warmup_peer_cache(app), timeout)
+    asyncio.create_task(startup.wait_background())
 
     # Startup Logs
     logger.info("========================================")
@@ -176,30 +215,16 @@ async def main():
     asyncio.create_task(check_security_and_connectivity(app))
     asyncio.create_task(auto_delete_loop(app))
     asyncio.create_task(sync_loop())
-
-    # Warmup Peer Cache
-    logger.info("Warming up peer cache...")
-
-    try:
-        channels = await db.get_approved_channels()
-        fs_channels = await db.get_force_sub_channels()
-        all_chats = channels + fs_channels
-
-        unique_chats = {c["chat_id"]: c for c in all_chats}
-
-        for chat_id, data in unique_chats.items():
-            try:
-                username = data.get("username")
-                if username:
-                    await app.get_chat(username)
-                else:
-                    await app.get_chat(chat_id)
-            except Exception as e:
-                logger.warning(f"Failed to cache peer {chat_id}: {e}")
-    except Exception as e:
-        logger.warning(f"Peer cache warmup partial fail: {e}")
+    asyncio.create_task(push_reconcile_loop(app))
+    asyncio.create_task(premium_sweep_loop())
+    task_pool.start()
+    system_stats.start(app)
+    leaderboard.start()
+    notifier.start(app)
+    membership.start()
 
     await idle()
+    await event_log.close()
     await app.stop()
 
 if __name__ == "__main__":
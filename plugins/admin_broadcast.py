@@ -3,17 +3,19 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton,
 from config import Config
 from db import db
 from log import get_logger
+from utils.callback_router import router
+from utils.states import conversations
 import asyncio
 import time
 
 logger = get_logger(__name__)
 
 # State: {user_id: {"step": str, "data": dict}}
-broadcast_states = {}
+broadcast_states = conversations.view("broadcast")
 
 # --- Menu ---
 
-@Client.on_callback_query(filters.regex(r"^admin_broadcast_menu$"))
+@router.on("admin_broadcast_menu")
 async def admin_broadcast_menu(client, callback):
     text = "**📢 Broadcast System**\n\nCreate a new broadcast to all users."
     markup = InlineKeyboardMarkup([
@@ -24,7 +26,7 @@ async def admin_broadcast_menu(client, callback):
 
 # --- Wizard ---
 
-@Client.on_callback_query(filters.regex(r"^start_broadcast$"))
+@router.on("start_broadcast")
 async def start_broadcast(client, callback):
     broadcast_states[callback.from_user.id] = {"step": "wait_message", "data": {}}
     await callback.message.delete()
@@ -35,7 +37,7 @@ async def start_broadcast(client, callback):
         "(Text, Photo, Video, Sticker supported)."
     )
 
-@Client.on_message(filters.user(Config.ADMIN_ID) & (filters.text | filters.photo | filters.video | filters.sticker) & ~filters.command(["admin", "cancel"]), group=3)
+@conversations.on_input("broadcast", media=True)
 async def broadcast_input(client, message):
     user_id = message.from_user.id
     if user_id not in broadcast_states: return
@@ -62,7 +64,8 @@ async def broadcast_input(client, message):
 
         await message.reply(text, reply_markup=markup, quote=True)
 
-@Client.on_callback_query(filters.regex(r"^toggle_(pin|silent)$"))
+@router.on("toggle_pin")
+@router.on("toggle_silent")
 async def toggle_bc_option(client, callback):
     user_id = callback.from_user.id
     if user_id not in broadcast_states: return
@@ -87,14 +90,14 @@ async def toggle_bc_option(client, callback):
 
     await callback.edit_message_reply_markup(reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^cancel_broadcast$"))
+@router.on("cancel_broadcast")
 async def cancel_bc(client, callback):
     if callback.from_user.id in broadcast_states:
         del broadcast_states[callback.from_user.id]
     await callback.message.delete()
     await client.send_message(callback.from_user.id, "❌ Broadcast cancelled.")
 
-@Client.on_callback_query(filters.regex(r"^send_broadcast$"))
+@router.on("send_broadcast")
 async def send_broadcast(client, callback):
     user_id = callback.from_user.id
     if user_id not in broadcast_states: return
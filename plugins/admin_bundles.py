@@ -5,15 +5,17 @@ from db import db
 from utils.helpers import generate_random_code, get_file_id
 from utils.tmdb import search_tmdb, get_tmdb_details
 from log import get_logger
+from utils.callback_router import router
+from utils.states import conversations
+from utils.identity import bot_identity
 import asyncio
 import time
-from datetime import datetime
 
 logger = get_logger(__name__)
 
 # State management for wizard
 # {user_id: {"step": str, "data": dict}}
-admin_states = {}
+admin_states = conversations.view("bundle_wizard")
 
 # --- Helper to cancel ---
 async def cancel_process(client, user_id, message=None):
@@ -40,9 +42,9 @@ async def create_link_start(client: Client, message: Message):
 async def on_forward_received(client: Client, message: Message):
     user_id = message.from_user.id
 
-    # Auto-trigger single file mode if not in state
+    # Auto-trigger single file mode if not in state (and no other wizard expects this forward)
     if user_id not in admin_states:
-        if message.forward_from_chat:
+        if message.forward_from_chat and not conversations.get(user_id):
             # Single file forward trigger
             admin_states[user_id] = {
                 "step": "select_media_type", # Jump straight to type selection
@@ -111,7 +113,7 @@ async def on_forward_received(client: Client, message: Message):
 
 # --- Wizard Callbacks ---
 
-@Client.on_callback_query(filters.regex(r"^type_"))
+@router.on("type_")
 async def on_media_type_select(client, callback):
     user_id = callback.from_user.id
     if user_id not in admin_states:
@@ -128,13 +130,10 @@ async def on_media_type_select(client, callback):
         "Please send the **Title** to search on TMDb (e.g. 'The Rookie')."
     )
 
-from pyrogram import ContinuePropagation
-
-@Client.on_message(filters.user(list(Config.ADMIN_IDS)) & filters.text & ~filters.command(["cancel", "create_link", "admin", "start"]), group=1)
+@conversations.on_input("bundle_wizard")
 async def on_text_input(client, message):
     user_id = message.from_user.id
-    if user_id not in admin_states:
-        raise ContinuePropagation
+    if user_id not in admin_states: return
 
     state = admin_states[user_id]
     step = state["step"]
@@ -257,7 +256,7 @@ async def on_text_input(client, message):
         # Clear state or stay? Stay allows repeated search.
         # But we should probably provide a back button in message.
 
-@Client.on_callback_query(filters.regex(r"^tmdb_"))
+@router.on("tmdb_")
 async def on_tmdb_select(client, callback):
     user_id = callback.from_user.id
     if user_id not in admin_states:
@@ -311,7 +310,7 @@ async def show_quality_menu(message_or_callback, selected):
     else:
         await message_or_callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^qual_"))
+@router.on("qual_")
 async def on_quality_toggle(client, callback):
     user_id = callback.from_user.id
     if user_id not in admin_states: return
@@ -334,7 +333,7 @@ async def on_quality_toggle(client, callback):
     admin_states[user_id]["data"]["qualities"] = current_selected
     await show_quality_menu(callback, current_selected)
 
-@Client.on_callback_query(filters.regex(r"^eps_"))
+@router.on("eps_")
 async def on_eps_select(client, callback):
     user_id = callback.from_user.id
     mode = callback.data.split("_")[1]
@@ -535,13 +534,13 @@ async def finalize_bundle(client, user_id, message_obj):
         logger.error(f"Bundle Error: {e}")
         await status_msg.edit(f"❌ Error: {e}")
 
-@Client.on_callback_query(filters.regex(r"^cancel_wizard$"))
+@router.on("cancel_wizard")
 async def cancel_wiz(client, callback):
     await cancel_process(client, callback.from_user.id, callback.message)
 
 # --- Full Push Request Flow (FSM) ---
 
-@Client.on_callback_query(filters.regex(r"^req_push_menu$"))
+@router.on("req_push_menu")
 async def req_push_menu(client, callback):
     """Entry point for Request Push Menu"""
     text = "**📡 Request Push Menu**\n\nManage your bundle pushes to the CEO network."
@@ -552,7 +551,7 @@ async def req_push_menu(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^push_wiz_start$"))
+@router.on("push_wiz_start")
 async def push_wiz_start(client, callback):
     user_id = callback.from_user.id
     # Initialize state
@@ -623,7 +622,7 @@ async def show_push_bundle_list(client, callback_query):
     except Exception:
         pass # Message not modified
 
-@Client.on_callback_query(filters.regex(r"^push_toggle\|"))
+@router.on("push_toggle|")
 async def on_push_toggle(client, callback):
     user_id = callback.from_user.id
     state = admin_states.get(user_id)
@@ -637,7 +636,7 @@ async def on_push_toggle(client, callback):
 
     await show_push_bundle_list(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^push_page_"))
+@router.on("push_page_")
 async def on_push_page(client, callback):
     user_id = callback.from_user.id
     state = admin_states.get(user_id)
@@ -651,7 +650,7 @@ async def on_push_page(client, callback):
 
     await show_push_bundle_list(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^push_preview$"))
+@router.on("push_preview")
 async def on_push_preview(client, callback):
     user_id = callback.from_user.id
     state = admin_states.get(user_id)
@@ -692,12 +691,12 @@ async def on_push_preview(client, callback):
 
     await callback.edit_message_text(preview_text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^push_back_edit$"))
+@router.on("push_back_edit")
 async def on_push_back(client, callback):
     # Just show list again, state is preserved
     await show_push_bundle_list(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^push_confirm$"))
+@router.on("push_confirm")
 async def on_push_confirm(client, callback):
     user_id = callback.from_user.id
     state = admin_states.get(user_id)
@@ -714,82 +713,20 @@ async def on_push_confirm(client, callback):
         return
 
     # Identify self for origin data
-    me = await client.get_me()
-
-    inserted_count = 0
-    skipped_count = 0
-    errors = []
+    me = await bot_identity.get(client)
 
     try:
-        # Iterate individually as per requirement (no grouping)
-        for code in selected_codes:
-            # Fetch local bundle
-            b = await db.get_bundle(code)
-            if not b:
-                logger.warning(f"Push skipped: Bundle {code} not found.")
-                continue
-
-            title = b.get("title", "Untitled")
-            tmdb_id = b.get("tmdb_id")
-
-            # Duplicate Check: Check against BOTH Bundles (Approved) and PushRequests (Pending/Approved/Rejected)
-            # Query by tmdb_id + title
-
-            # 1. Check Approved Global Bundles
-            duplicate_approved = await db.bundles_col_main.find_one({"tmdb_id": tmdb_id, "title": title})
-
-            # 2. Check Push Requests (Any Status)
-            duplicate_request = await db.push_requests_col_main.find_one({"tmdb_id": tmdb_id, "title": title})
-
-            if duplicate_approved or duplicate_request:
-                skipped_count += 1
-                logger.info(f"Skipped duplicate push for {title} (TMDb: {tmdb_id}). Already exists/pending.")
-                continue
-
-            # Prepare Request Document
-            total_files = len(b.get("file_ids", []))
-            total_size = sum(f.get("file_size", 0) for f in b.get("file_ids", []))
-
-            doc = {
-                "title": title,
-                "tmdb_id": tmdb_id,
-                "file_ids_summary": {
-                    "count": total_files,
-                    "total_size": total_size
-                },
-                "qualities": b.get("qualities", []),
-                "season": b.get("season"),
-                "episode_count_total": b.get("episode_count_total"),
-                "nehmer_id": user_id, # Current Admin User
-                "franchisee_id": Config.FRANCHISEE_ID, # New Franchise ID
-                "status": "pending",
-                "timestamp": datetime.utcnow(),
-                "private_bundle_ids": [code], # Single bundle
-                "origin_bundle_codes": [code], # Array of strings for redirect
-                "origin_bot_username": me.username,
-                "origin_bot_id": me.id
-            }
-
-            try:
-                res = await db.push_requests_col_main.insert_one(doc)
-                inserted_id = res.inserted_id
-                inserted_count += 1
-                logger.info(f"Push inserted to MainDB.push_requests: {inserted_id}")
-
-                # Log to PrivateDB Local History
-                await db.push_requests_col.insert_one({
-                    "code": code,
-                    "title": title,
-                    "tmdb_id": tmdb_id,
-                    "status": "pending",
-                    "request_date": datetime.now().strftime("%Y-%m-%d %H:%M:%S"),
-                    "user_id": user_id,
-                    "main_request_id": inserted_id
-                })
-
-            except Exception as e:
-                logger.error(f"Failed to insert push request for {title}: {e}")
-                errors.append(title)
+        # One batch: bulk fetch, one duplicate query per collection, insert_many
+        results = await db.submit_push_requests(selected_codes, user_id, me.username, me.id)
+
+        inserted_count = sum(1 for r in results if r["status"] == "sent")
+        skipped_count = sum(1 for r in results if r["status"] == "duplicate")
+        errors = [r["title"] or r["code"] for r in results if r["status"] == "error"]
+        for r in results:
+            if r["status"] == "not_found":
+                logger.warning(f"Push skipped: Bundle {r['code']} not found.")
+            elif r["status"] == "duplicate":
+                logger.info(f"Skipped duplicate push for {r['title']}. Already exists/pending.")
 
         await db.add_log("push_request", user_id, f"Push requested: {inserted_count} sent, {skipped_count} skipped.")
 
@@ -812,10 +749,10 @@ async def on_push_confirm(client, callback):
 
 # --- Push Status ---
 
-@Client.on_callback_query(filters.regex(r"^push_status_menu$"))
+@router.on("push_status_menu")
 async def push_status_menu(client, callback):
-    # Overview
-    pending_count = await db.push_requests_col.count_documents({"status": "pending"})
+    # Overview (local history, kept in sync by utils/push_reconciler)
+    counts = await db.get_push_status_counts()
 
     # Estimate approved from MainDB (count of bundles marked 'shared' or just total?)
     # Prompt says: "Approved Bundles" from MainDB shared read-only.
@@ -824,7 +761,9 @@ async def push_status_menu(client, callback):
 
     text = (
         "**Push Status Overview**\n\n"
-        f"Pending Pushes: `{pending_count}`\n"
+        f"Pending Pushes: `{counts.get('pending', 0)}`\n"
+        f"Approved Pushes: `{counts.get('approved', 0)}`\n"
+        f"Rejected Pushes: `{counts.get('rejected', 0)}`\n"
         f"Approved Global: `{approved_count}`\n\n"
         "**Growth Tips:**\n"
         "Push 5+ bundles for faster approval!"
@@ -838,7 +777,8 @@ async def push_status_menu(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^(view_pending_push|view_approved_push)$"))
+@router.on("view_pending_push")
+@router.on("view_approved_push")
 async def view_push_lists(client, callback):
     mode = callback.data
     user_id = callback.from_user.id
@@ -852,7 +792,7 @@ async def view_push_lists(client, callback):
     }
     await render_push_list(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^push_list_page_"))
+@router.on("push_list_page_")
 async def on_push_list_page(client, callback):
     user_id = callback.from_user.id
     state = admin_states.get(user_id)
@@ -907,7 +847,7 @@ async def render_push_list(client, callback):
 
     await callback.edit_message_text(text, reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^search_push_bundles$"))
+@router.on("search_push_bundles")
 async def search_push_bundles(client, callback):
     user_id = callback.from_user.id
     # Set state handled by on_text_input
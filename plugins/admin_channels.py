@@ -4,22 +4,21 @@ from pyrogram.enums import ChatMemberStatus
 from config import Config
 from db import db
 from log import get_logger
+from utils.callback_router import router
 from utils.states import pending_series_setups
+from utils.identity import is_self_member
+from utils.membership import membership, force_sub_chat, is_member_status
 
 logger = get_logger(__name__)
 
 # --- Event: Bot added to channel ---
-@Client.on_chat_member_updated()
+@Client.on_chat_member_updated(is_self_member)
 async def on_bot_promoted(client: Client, chat_member: ChatMemberUpdated):
-    # Check if the update is about the bot itself
-    me = await client.get_me()
-
+    # Only updates about the bot itself reach here (is_self_member filter)
     new_member = chat_member.new_chat_member
-    if not new_member or not new_member.user or new_member.user.id != me.id:
-        return
 
     # Check if promoted to Admin
-    if chat_member.new_chat_member.status == ChatMemberStatus.ADMINISTRATOR:
+    if new_member and new_member.status == ChatMemberStatus.ADMINISTRATOR:
         chat = chat_member.chat
 
         # Check for Pending Series Setup
@@ -66,8 +65,18 @@ async def on_bot_promoted(client: Client, chat_member: ChatMemberUpdated):
             except Exception as e:
                 logger.error(f"Failed to notify admin {admin_id}: {e}")
 
+# --- Event: Member joined/left a force-sub channel ---
+# Own group, so updates about the bot itself still reach on_bot_promoted
+@Client.on_chat_member_updated(force_sub_chat, group=1)
+async def on_force_sub_member(client: Client, chat_member: ChatMemberUpdated):
+    member = chat_member.new_chat_member or chat_member.old_chat_member
+    if not member or not member.user: return
+    membership.record(chat_member.chat.id, member.user.id, is_member_status(chat_member.new_chat_member))
+
 # --- Callback: Accept/Reject Channel ---
-@Client.on_callback_query(filters.regex(r"^chan_(ask_type|reject|set_type)\|"))
+@router.on("chan_ask_type|")
+@router.on("chan_reject|")
+@router.on("chan_set_type|")
 async def handle_channel_decision(client: Client, callback: CallbackQuery):
     if callback.from_user.id not in Config.ADMIN_IDS:
         await callback.answer("You are not authorized.", show_alert=True)
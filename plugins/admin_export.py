@@ -0,0 +1,116 @@
+import os
+import csv
+import gzip
+import json
+import time
+import asyncio
+import tempfile
+from datetime import datetime
+from pyrogram import Client, filters
+from pyrogram.types import Message
+from config import Config
+from db import db, EXPORT_SOURCES
+from log import get_logger
+
+logger = get_logger(__name__)
+
+USAGE = (
+    "**📦 Export**\n\n"
+    "`/export <bundles|groups|push|logs|users> [csv]`\n\n"
+    "Gzip-compressed JSONL (default) or CSV. `users` is CEO only."
+)
+
+# One export at a time (they read whole collections)
+export_lock = asyncio.Lock()
+
+def _json_default(value):
+    return value.isoformat() if isinstance(value, datetime) else str(value)
+
+def _cell(value):
+    if value is None:
+        return ""
+    if isinstance(value, datetime):
+        return value.isoformat()
+    if isinstance(value, (list, dict)):
+        return json.dumps(value, default=_json_default, ensure_ascii=False)
+    return value
+
+def _write_chunk(fh, writer, docs):
+    # Runs in a worker thread: serialization + gzip compression stay off the event loop
+    if writer:
+        writer.writerows([{k: _cell(v) for k, v in d.items()} for d in docs])
+    else:
+        fh.writelines(json.dumps(d, default=_json_default, ensure_ascii=False) + "\n" for d in docs)
+
+async def write_export(kind, path, fmt):
+    """
+    Streams one export source into a gzip file. Only one chunk of
+    EXPORT_CHUNK_SIZE documents is held in memory at a time.
+    Returns the number of rows written.
+    """
+    columns = [k for k in EXPORT_SOURCES[kind][1] if k != "_id"]
+    fh = await asyncio.to_thread(gzip.open, path, "wt", encoding="utf-8", newline="")
+    try:
+        writer = None
+        if fmt == "csv":
+            writer = csv.DictWriter(fh, fieldnames=columns, extrasaction="ignore")
+            await asyncio.to_thread(writer.writeheader)
+
+        rows, chunk = 0, []
+        async for doc in db.export_cursor(kind):
+            chunk.append(doc)
+            if len(chunk) >= Config.EXPORT_CHUNK_SIZE:
+                await asyncio.to_thread(_write_chunk, fh, writer, chunk)
+                rows += len(chunk)
+                chunk = []
+        if chunk:
+            await asyncio.to_thread(_write_chunk, fh, writer, chunk)
+            rows += len(chunk)
+        return rows
+    finally:
+        await asyncio.to_thread(fh.close)
+
+@Client.on_message(filters.command("export") & filters.user(list(Config.ADMIN_IDS)))
+async def export_command(client: Client, message: Message):
+    args = message.command[1:]
+    kind = args[0].lower() if args else None
+    fmt = "csv" if len(args) > 1 and args[1].lower() == "csv" else "jsonl"
+
+    if kind not in EXPORT_SOURCES:
+        await message.reply(USAGE)
+        return
+    if kind == "users" and message.from_user.id != Config.CEO_ID:
+        await message.reply("❌ User exports are restricted to the CEO.")
+        return
+    if export_lock.locked():
+        await message.reply("⏳ Another export is running. Try again when it is done.")
+        return
+
+    async with export_lock:
+        status = await message.reply(f"⏳ Exporting **{kind}**...")
+        file_name = f"{kind}_{datetime.now().strftime('%Y%m%d_%H%M%S')}.{fmt}.gz"
+        fd, path = tempfile.mkstemp(suffix=f".{fmt}.gz")
+        os.close(fd)
+
+        try:
+            t0 = time.perf_counter()
+            rows = await write_export(kind, path, fmt)
+            elapsed = time.perf_counter() - t0
+            size_mb = os.path.getsize(path) / 1024 / 1024
+
+            await client.send_document(
+                message.chat.id,
+                path,
+                file_name=file_name,
+                caption=f"📦 **{kind}**: `{rows}` rows, {size_mb:.1f} MB ({elapsed:.1f}s)"
+            )
+            await status.delete()
+            await db.add_log("export", message.from_user.id, f"Exported {kind} ({rows} rows, {fmt})")
+        except Exception as e:
+            logger.error(f"Export {kind} failed: {e}")
+            await status.edit_text(f"❌ Export failed: `{e}`")
+        finally:
+            try:
+                os.remove(path)
+            except OSError:
+                pass
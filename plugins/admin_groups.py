@@ -1,29 +1,29 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
-from pyrogram import ContinuePropagation
 from config import Config
 from db import db
 from utils.helpers import generate_random_code
 from utils.tmdb import get_tmdb_details
 from log import get_logger
-from plugins.admin_series import refresh_series_channel
+from utils.callback_router import router
+from utils.states import conversations
 
 logger = get_logger(__name__)
 
 async def trigger_series_update(client, tmdb_id, text="New content added! ✔️"):
+    # Debounced: bulk changes end up as one refresh per channel
     if not tmdb_id: return
     channels = await db.get_series_channel_by_tmdb(tmdb_id)
+    if not channels: return
+    from plugins.admin_series import series_refresher
     for ch in channels:
-        try:
-            await refresh_series_channel(client, ch["chat_id"], update_text=text)
-        except Exception as e:
-            logger.error(f"Failed to refresh series channel {ch['chat_id']}: {e}")
+        series_refresher.schedule(client, ch["chat_id"], text)
 
 # State for group wizard
 # {user_id: {"state": "...", "data": ...}}
-group_states = {}
+group_states = conversations.view("group_wizard")
 
-@Client.on_callback_query(filters.regex(r"^admin_grouped_bundles$"))
+@router.on("admin_grouped_bundles")
 async def admin_grouped_bundles(client, callback):
     text = "**📦 Grouped Bundles**\n\nManage your content groups here."
     markup = InlineKeyboardMarkup([
@@ -33,7 +33,7 @@ async def admin_grouped_bundles(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^list_groups$"))
+@router.on("list_groups")
 async def list_groups(client, callback):
     # Franchisee: List ONLY PrivateDB groups
     groups = await db.groups_col_private.find({}).to_list(length=1000)
@@ -64,7 +64,7 @@ async def list_groups(client, callback):
     markup.append([InlineKeyboardButton("🔙 Back", callback_data="admin_grouped_bundles")])
     await callback.edit_message_text("**📋 Select a Group:**", reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^view_group\|"))
+@router.on("view_group|")
 async def view_group(client, callback):
     code = callback.data.split("|")[1]
     group = await db.get_group(code)
@@ -95,7 +95,7 @@ async def view_group(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^manage_group_bundles\|"))
+@router.on("manage_group_bundles|")
 async def manage_group_bundles(client, callback):
     code = callback.data.split("|")[1]
     group = await db.get_group(code)
@@ -130,7 +130,7 @@ async def manage_group_bundles(client, callback):
     markup.append([InlineKeyboardButton("🔙 Back", callback_data=f"view_group|{code}")])
     await callback.edit_message_text(f"**📂 Bundles in {group.get('title')}**", reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^rem_bund_from_grp\|"))
+@router.on("rem_bund_from_grp|")
 async def remove_bundle_from_group(client, callback):
     _, g_code, b_code = callback.data.split("|")
     group = await db.get_group(g_code)
@@ -145,7 +145,7 @@ async def remove_bundle_from_group(client, callback):
         await callback.answer("❌ Read-only: Cannot edit Global Group.", show_alert=True)
     await manage_group_bundles(client, callback) # Refresh
 
-@Client.on_callback_query(filters.regex(r"^del_group_confirm\|"))
+@router.on("del_group_confirm|")
 async def del_group_confirm(client, callback):
     code = callback.data.split("|")[1]
     group = await db.get_group(code)
@@ -161,7 +161,7 @@ async def del_group_confirm(client, callback):
         await callback.answer("❌ Read-only: Cannot delete Global Group.", show_alert=True)
     await list_groups(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^rename_group\|"))
+@router.on("rename_group|")
 async def rename_group_start(client, callback):
     code = callback.data.split("|")[1]
     group_states[callback.from_user.id] = {"state": "wait_group_rename", "code": code}
@@ -173,7 +173,7 @@ async def rename_group_start(client, callback):
 
 # --- Add Group Wizard (Scan Mode) ---
 
-@Client.on_callback_query(filters.regex(r"^add_group_start$"))
+@router.on("add_group_start")
 async def add_group_start(client, callback):
     await callback.edit_message_text("⏳ **Scanning Bundles...**\nThis may take a moment.")
 
@@ -306,7 +306,7 @@ async def add_group_start(client, callback):
         reply_markup=InlineKeyboardMarkup(markup)
     )
 
-@Client.on_callback_query(filters.regex(r"^cg\|"))
+@router.on("cg|")
 async def create_group_click(client, callback):
     try:
         parts = callback.data.split("|")
@@ -400,11 +400,10 @@ async def create_group_click(client, callback):
         logger.error(f"Group create error: {e}")
         await callback.edit_message_text(f"❌ Error: {e}")
 
-@Client.on_message(filters.user(list(Config.ADMIN_IDS)) & filters.text & ~filters.command(["admin", "cancel"]), group=3)
+@conversations.on_input("group_wizard")
 async def group_input_handler(client, message):
     user_id = message.from_user.id
-    if user_id not in group_states:
-        raise ContinuePropagation
+    if user_id not in group_states: return
 
     state = group_states[user_id]
     s_key = state.get("state")
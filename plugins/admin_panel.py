@@ -3,13 +3,14 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton,
 from config import Config
 from db import db
 from log import get_logger
-from pyrogram import ContinuePropagation
+from utils.callback_router import router
+from utils.states import conversations
 from datetime import datetime
 
 logger = get_logger(__name__)
 
 # Shared state for admin inputs
-panel_states = {}
+panel_states = conversations.view("panel")
 
 # --- Main Admin Panel ---
 
@@ -49,11 +50,11 @@ async def show_main_menu(message_or_callback):
     else:
         await message_or_callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^admin_main$"))
+@router.on("admin_main")
 async def back_to_main(client, callback):
     await show_main_menu(callback)
 
-@Client.on_callback_query(filters.regex(r"^admin_close$"))
+@router.on("admin_close")
 async def close_panel(client, callback):
     await callback.message.delete()
 
@@ -61,7 +62,7 @@ async def close_panel(client, callback):
 
 # --- Franchise Dashboard ---
 
-@Client.on_callback_query(filters.regex(r"^admin_franchise_dash$"))
+@router.on("admin_franchise_dash")
 async def show_franchise_dash(client, callback):
     # Franchise Stats
     total_users = await db.get_total_users() # Shared
@@ -93,7 +94,7 @@ async def show_franchise_dash(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^admin_stats$"))
+@router.on("admin_stats")
 async def show_stats(client, callback):
     bundles = await db.get_all_bundles()
     total_views = sum(b.get("views", 0) for b in bundles)
@@ -105,7 +106,14 @@ async def show_stats(client, callback):
     new_users_24h = await db.get_new_users_count(1)
     new_users_week = await db.get_new_users_count(7)
 
-    prem_users = await db.users_col.count_documents({"is_premium": True})
+    prem_users = await db.count_active_premium()
+
+    # Activity (Event Log, 24h)
+    try:
+        events = await db.get_event_counts(since_hours=24, kind="user")
+    except Exception as e:
+        logger.warning(f"Event stats unavailable: {e}")
+        events = {}
 
     pop_text = ""
     for p in popular:
@@ -119,6 +127,12 @@ async def show_stats(client, callback):
         f"• New (24h): `{new_users_24h}`\n"
         f"• New (Week): `{new_users_week}`\n\n"
         f"💎 **Premium:** `{prem_users}` active\n\n"
+        f"📈 **Activity (24h):**\n"
+        f"• Deliveries: `{events.get('deliver', 0)}`\n"
+        f"• Quests Started: `{events.get('quest_start', 0)}`\n"
+        f"• Quest Steps: `{events.get('quest_step', 0)}`\n"
+        f"• Referrals: `{events.get('referral', 0)}`\n"
+        f"• Coupon Attempts: `{events.get('coupon_redeem', 0)}`\n\n"
         f"📦 **Content:**\n"
         f"• Bundles: `{len(bundles)}`\n"
         f"• Total Views: `{total_views}`\n\n"
@@ -130,7 +144,7 @@ async def show_stats(client, callback):
 
 # --- Channels Menu (Storage, Force Subs, Share) ---
 
-@Client.on_callback_query(filters.regex(r"^admin_channels_menu$"))
+@router.on("admin_channels_menu")
 async def admin_channels_menu(client, callback):
     text = "**📢 Channel Management**"
     markup = InlineKeyboardMarkup([
@@ -144,7 +158,7 @@ async def admin_channels_menu(client, callback):
 
 # --- Settings Menu ---
 
-@Client.on_callback_query(filters.regex(r"^admin_settings_menu$"))
+@router.on("admin_settings_menu")
 async def admin_settings_menu(client, callback):
     text = "**⚙️ Settings**"
     markup = InlineKeyboardMarkup([
@@ -155,7 +169,7 @@ async def admin_settings_menu(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^admin_settings_groups$"))
+@router.on("admin_settings_groups")
 async def admin_settings_groups(client, callback):
     enabled = await db.get_config("grouped_bundles_enabled", True)
     redirect = await db.get_config("single_bundle_redirect", True)
@@ -174,7 +188,7 @@ async def admin_settings_groups(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^toggle_grp_"))
+@router.on("toggle_grp_")
 async def toggle_group_settings(client, callback):
     mode = callback.data.split("_")[2]
     if mode == "enabled":
@@ -186,7 +200,7 @@ async def toggle_group_settings(client, callback):
 
     await admin_settings_groups(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^admin_settings_general$"))
+@router.on("admin_settings_general")
 async def admin_settings_general(client, callback):
     fs_enabled = await db.get_config("force_sub_enabled", False)
     tasks_enabled = await db.get_config("tasks_enabled", False)
@@ -206,7 +220,9 @@ async def admin_settings_general(client, callback):
     ])
     await callback.edit_message_text("**🛠️ General Config**\nToggle features:", reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^toggle_(fs|task|share)_panel$"))
+@router.on("toggle_fs_panel")
+@router.on("toggle_task_panel")
+@router.on("toggle_share_panel")
 async def toggle_setting_panel(client, callback):
     setting = callback.data.split("_")[1]
     if setting == "fs":
@@ -220,7 +236,7 @@ async def toggle_setting_panel(client, callback):
         await db.update_config("force_share_enabled", not curr)
     await admin_settings_general(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^admin_settings_leech$"))
+@router.on("admin_settings_leech")
 async def admin_settings_leech(client, callback):
     curr = await db.get_config("auto_delete_time", 0)
     text = f"**🛡️ Anti-Leech (Auto-Delete)**\n\nCurrent: `{curr} minutes` (0 = Disabled)"
@@ -230,7 +246,7 @@ async def admin_settings_leech(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^set_autodel_time$"))
+@router.on("set_autodel_time")
 async def set_autodel_time(client, callback):
     panel_states[callback.from_user.id] = "wait_autodel_input"
     await callback.message.delete()
@@ -238,7 +254,7 @@ async def set_autodel_time(client, callback):
 
 # --- Monetization ---
 
-@Client.on_callback_query(filters.regex(r"^admin_monetization$"))
+@router.on("admin_monetization")
 async def admin_monetization(client, callback):
     text = "**💰 Monetization**"
     markup = InlineKeyboardMarkup([
@@ -247,7 +263,7 @@ async def admin_monetization(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^admin_premium_users$"))
+@router.on("admin_premium_users")
 async def admin_premium_users(client, callback):
     text = "**🌟 Premium Users Management**"
     markup = InlineKeyboardMarkup([
@@ -258,19 +274,19 @@ async def admin_premium_users(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^add_prem_user$"))
+@router.on("add_prem_user")
 async def add_prem_user(client, callback):
     panel_states[callback.from_user.id] = "wait_prem_add_id"
     await callback.message.delete()
     await client.send_message(callback.from_user.id, "**➕ Add Premium User**\n\nSend User ID:")
 
-@Client.on_callback_query(filters.regex(r"^rem_prem_user$"))
+@router.on("rem_prem_user")
 async def rem_prem_user(client, callback):
     panel_states[callback.from_user.id] = "wait_prem_rem_id"
     await callback.message.delete()
     await client.send_message(callback.from_user.id, "**➖ Remove Premium User**\n\nSend User ID:")
 
-@Client.on_callback_query(filters.regex(r"^list_prem_users$"))
+@router.on("list_prem_users")
 async def list_prem_users(client, callback):
     users = await db.get_premium_users()
     if not users:
@@ -292,7 +308,7 @@ async def list_prem_users(client, callback):
 
 # --- Community Growth ---
 
-@Client.on_callback_query(filters.regex(r"^admin_growth$"))
+@router.on("admin_growth")
 async def admin_growth(client, callback):
     text = "**🚀 Community Growth & Engagement**"
     markup = InlineKeyboardMarkup([
@@ -306,7 +322,7 @@ async def admin_growth(client, callback):
 
 # --- Coupons ---
 
-@Client.on_callback_query(filters.regex(r"^admin_coupons$"))
+@router.on("admin_coupons")
 async def admin_coupons(client, callback):
     coupons = await db.get_all_coupons()
     text = f"**🎟️ Coupons**\n\nActive Codes: {len(coupons)}"
@@ -327,13 +343,13 @@ async def admin_coupons(client, callback):
 
     await callback.edit_message_text(text, reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^create_coupon_start$"))
+@router.on("create_coupon_start")
 async def create_coupon_start(client, callback):
     panel_states[callback.from_user.id] = "wait_coupon_code"
     await callback.message.delete()
     await client.send_message(callback.from_user.id, "**🎟️ Create Coupon**\n\nEnter the **Code** (e.g. `SUMMER24`):")
 
-@Client.on_callback_query(filters.regex(r"^del_coupon_start$"))
+@router.on("del_coupon_start")
 async def del_coupon_start(client, callback):
     panel_states[callback.from_user.id] = "wait_coupon_del"
     await callback.message.delete()
@@ -341,7 +357,7 @@ async def del_coupon_start(client, callback):
 
 # --- Daily Bonus ---
 
-@Client.on_callback_query(filters.regex(r"^admin_daily_bonus$"))
+@router.on("admin_daily_bonus")
 async def admin_daily_bonus(client, callback):
     enabled = await db.get_config("daily_bonus_enabled", False)
     reward = await db.get_config("daily_bonus_reward", 1)
@@ -361,19 +377,19 @@ async def admin_daily_bonus(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^toggle_daily_bonus$"))
+@router.on("toggle_daily_bonus")
 async def toggle_daily_bonus(client, callback):
     curr = await db.get_config("daily_bonus_enabled", False)
     await db.update_config("daily_bonus_enabled", not curr)
     await admin_daily_bonus(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^set_daily_reward$"))
+@router.on("set_daily_reward")
 async def set_daily_reward(client, callback):
     panel_states[callback.from_user.id] = "wait_daily_reward"
     await callback.message.delete()
     await client.send_message(callback.from_user.id, "**Set Daily Reward**\n\nEnter hours:")
 
-@Client.on_callback_query(filters.regex(r"^admin_referral_settings$"))
+@router.on("admin_referral_settings")
 async def admin_referral_settings(client, callback):
     target = await db.get_config("referral_target", 10)
     hours = await db.get_config("referral_reward_hours", 24)
@@ -390,13 +406,13 @@ async def admin_referral_settings(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^set_ref_target$"))
+@router.on("set_ref_target")
 async def set_ref_target(client, callback):
     panel_states[callback.from_user.id] = "wait_ref_target"
     await callback.message.delete()
     await client.send_message(callback.from_user.id, "**Set Referral Target**\n\nHow many invites for reward?")
 
-@Client.on_callback_query(filters.regex(r"^set_ref_reward$"))
+@router.on("set_ref_reward")
 async def set_ref_reward(client, callback):
     panel_states[callback.from_user.id] = "wait_ref_reward"
     await callback.message.delete()
@@ -405,7 +421,7 @@ async def set_ref_reward(client, callback):
 
 # --- Force Share Channels ---
 
-@Client.on_callback_query(filters.regex(r"^admin_share_channels$"))
+@router.on("admin_share_channels")
 async def show_share_channels(client, callback):
     channels = await db.get_share_channels()
 
@@ -424,7 +440,7 @@ async def show_share_channels(client, callback):
 
     await callback.edit_message_text("**📢 Force-Share Channels**\nClick to manage:", reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^add_share_start$"))
+@router.on("add_share_start")
 async def add_share_start(client, callback):
     panel_states[callback.from_user.id] = "wait_share_link"
     await callback.message.delete()
@@ -435,7 +451,7 @@ async def add_share_start(client, callback):
         "(e.g. `https://t.me/mychannel`)"
     )
 
-@Client.on_callback_query(filters.regex(r"^view_share\|"))
+@router.on("view_share|")
 async def view_share_channel(client, callback):
     link = callback.data.split("|")[1]
     markup = InlineKeyboardMarkup([
@@ -444,7 +460,7 @@ async def view_share_channel(client, callback):
     ])
     await callback.edit_message_text(f"**Share Channel**\n\nLink: `{link}`", reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^del_share\|"))
+@router.on("del_share|")
 async def delete_share_channel(client, callback):
     link = callback.data.split("|")[1]
     success = await db.remove_share_channel(link)
@@ -456,7 +472,7 @@ async def delete_share_channel(client, callback):
 
 # --- Channels (Storage) ---
 
-@Client.on_callback_query(filters.regex(r"^admin_channels$"))
+@router.on("admin_channels")
 async def show_channels(client, callback):
     # Franchisee: Show ONLY PrivateDB channels
     channels = await db.channels_col_private.find({"approved": True, "$or": [{"type": "storage"}, {"type": {"$exists": False}}]}).to_list(length=100)
@@ -476,7 +492,7 @@ async def show_channels(client, callback):
 
 # --- Force Subs ---
 
-@Client.on_callback_query(filters.regex(r"^admin_force_subs$"))
+@router.on("admin_force_subs")
 async def show_force_subs(client, callback):
     # Split Global (MainDB) and Local (PrivateDB)
     main_fs = await db.channels_col_main.find({"approved": True, "type": "force_sub"}).to_list(length=100)
@@ -509,16 +525,15 @@ async def show_force_subs(client, callback):
 
     await callback.edit_message_text("**🔒 Force Sub Channels**\nClick to manage:", reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^view_global_fs\|"))
+@router.on("view_global_fs|")
 async def view_global_fs(client, callback):
     chat_id = callback.data.split("|")[1]
     await callback.answer("Read-only – managed by CEO.", show_alert=True)
 
 # --- Franchise Channels (Removed for Franchisee) ---
 
-@Client.on_callback_query(filters.regex(r"^view_ch\|"))
-async def view_channel(client, callback):
-    chat_id = int(callback.data.split("|")[1])
+@router.on("view_ch|", int)
+async def view_channel(client, callback, chat_id):
     # Need to fetch details? We have ID.
     markup = InlineKeyboardMarkup([
         [InlineKeyboardButton("🗑 Remove Channel", callback_data=f"del_ch|{chat_id}")],
@@ -526,15 +541,14 @@ async def view_channel(client, callback):
     ])
     await callback.edit_message_text(f"**Channel Details**\nID: `{chat_id}`", reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^del_ch\|"))
-async def delete_channel(client, callback):
-    chat_id = int(callback.data.split("|")[1])
+@router.on("del_ch|", int)
+async def delete_channel(client, callback, chat_id):
     await db.remove_channel(chat_id)
     await callback.answer("Channel removed!", show_alert=True)
     # Go back to main menu is safest as we don't know if it was FS or Storage easily here without querying
     await show_main_menu(callback)
 
-@Client.on_callback_query(filters.regex(r"^panel_add_fs_manual$"))
+@router.on("panel_add_fs_manual")
 async def panel_add_fs_manual(client, callback):
     panel_states[callback.from_user.id] = "wait_fs_input"
     await callback.message.delete()
@@ -548,7 +562,7 @@ async def panel_add_fs_manual(client, callback):
 
 # --- Bundles ---
 
-@Client.on_callback_query(filters.regex(r"^admin_bundles$"))
+@router.on("admin_bundles")
 async def show_bundles(client, callback):
     bundles = await db.get_all_bundles()
     text = f"**📦 Bundles**\n\nTotal Created: {len(bundles)}\n\nManage your bundles below."
@@ -559,7 +573,7 @@ async def show_bundles(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^panel_manage_bundles$"))
+@router.on("panel_manage_bundles")
 async def manage_bundles_menu(client, callback):
     bundles = await db.get_all_bundles()
     if not bundles:
@@ -579,7 +593,7 @@ async def manage_bundles_menu(client, callback):
 
     await callback.edit_message_text("**Select Bundle to Manage:**", reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^manage_bund\|"))
+@router.on("manage_bund|")
 async def manage_single_bundle(client, callback):
     code = callback.data.split("|")[1]
     bundle = await db.get_bundle(code)
@@ -600,12 +614,12 @@ async def manage_single_bundle(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^req_push\|"))
+@router.on("req_push|")
 async def request_push_bundle(client, callback):
     # Deprecated in favor of Bulk Menu
     await callback.answer("Please use the 'Request Push Menu' in Dashboard.", show_alert=True)
 
-@Client.on_callback_query(filters.regex(r"^del_bund_confirm\|"))
+@router.on("del_bund_confirm|")
 async def del_bund_confirm(client, callback):
     code = callback.data.split("|")[1]
     success = await db.delete_bundle(code)
@@ -615,7 +629,7 @@ async def del_bund_confirm(client, callback):
         await callback.answer("❌ Failed: Global Bundle is Read-Only!", show_alert=True)
     await manage_bundles_menu(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^rename_bund\|"))
+@router.on("rename_bund|")
 async def rename_bund_start(client, callback):
     code = callback.data.split("|")[1]
     panel_states[callback.from_user.id] = {"state": "wait_bundle_rename", "code": code}
@@ -625,7 +639,7 @@ async def rename_bund_start(client, callback):
         f"**✏️ Rename Bundle**\n\nCode: `{code}`\n\nEnter new title (or /cancel):"
     )
 
-@Client.on_callback_query(filters.regex(r"^start_create_link$"))
+@router.on("start_create_link")
 async def start_create_link_panel(client, callback):
     from plugins.admin_bundles import admin_states
     admin_states[callback.from_user.id] = {"step": "wait_start_msg", "data": {}}
@@ -638,7 +652,7 @@ async def start_create_link_panel(client, callback):
 
 # --- Tasks ---
 
-@Client.on_callback_query(filters.regex(r"^admin_tasks$"))
+@router.on("admin_tasks")
 async def show_tasks(client, callback):
     tasks = await db.get_all_tasks()
     text = f"**📝 Tasks**\n\nTotal Tasks: {len(tasks)}"
@@ -651,7 +665,7 @@ async def show_tasks(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^panel_list_tasks$"))
+@router.on("panel_list_tasks")
 async def panel_list_tasks(client, callback):
     tasks = await db.get_all_tasks()
     if not tasks:
@@ -672,7 +686,7 @@ async def panel_list_tasks(client, callback):
         await client.send_message(callback.from_user.id, text)
         await show_main_menu(client.send_message(callback.from_user.id, "Menu:"))
 
-@Client.on_callback_query(filters.regex(r"^panel_add_task$"))
+@router.on("panel_add_task")
 async def panel_add_task(client, callback):
     panel_states[callback.from_user.id] = "wait_task_input"
     await callback.message.delete()
@@ -686,7 +700,7 @@ async def panel_add_task(client, callback):
         "Send /cancel to cancel."
     )
 
-@Client.on_callback_query(filters.regex(r"^panel_bulk_add_task$"))
+@router.on("panel_bulk_add_task")
 async def panel_bulk_add_task(client, callback):
     panel_states[callback.from_user.id] = "wait_bulk_task_input"
     await callback.message.delete()
@@ -703,11 +717,10 @@ async def panel_bulk_add_task(client, callback):
 
 # --- Input Handlers ---
 
-@Client.on_message(filters.user(list(Config.ADMIN_IDS)) & filters.text & ~filters.command(["admin", "cancel", "start", "create_link"]), group=1)
+@conversations.on_input("panel")
 async def handle_panel_input(client, message):
     user_id = message.from_user.id
-    if user_id not in panel_states:
-        raise ContinuePropagation
+    if user_id not in panel_states: return
 
     raw_state = panel_states[user_id]
     state_key = raw_state if isinstance(raw_state, str) else raw_state.get("state")
@@ -969,12 +982,3 @@ async def handle_panel_input(client, message):
         await message.reply(msg)
         del panel_states[user_id]
         await show_main_menu(message)
-
-@Client.on_message(filters.command("cancel") & filters.user(list(Config.ADMIN_IDS)), group=1)
-async def cancel_panel(client, message):
-    user_id = message.from_user.id
-    if user_id in panel_states:
-        del panel_states[user_id]
-        await message.reply("❌ Panel action cancelled.")
-    else:
-        raise ContinuePropagation
@@ -1,20 +1,24 @@
 from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from pyrogram.enums import ParseMode
+from pyrogram.errors import MessageNotModified, FloodWait
 import asyncio
 import html
 import re
+import time
+import weakref
 from config import Config
 from db import db
 from log import get_logger
+from utils.callback_router import router
 from utils.tmdb import search_tmdb, get_tmdb_details
-from utils.states import pending_series_setups, series_wizard_states
+from utils.states import pending_series_setups, series_wizard_states, conversations
 
 logger = get_logger(__name__)
 
 # --- Menu ---
 
-@Client.on_callback_query(filters.regex(r"^admin_series_menu$"))
+@router.on("admin_series_menu")
 async def admin_series_menu(client, callback):
     text = "**📺 Series Channels Management**\n\nManage local series channels here."
     markup = InlineKeyboardMarkup([
@@ -26,7 +30,7 @@ async def admin_series_menu(client, callback):
 
 # --- List Channels ---
 
-@Client.on_callback_query(filters.regex(r"^list_series_channels$"))
+@router.on("list_series_channels")
 async def list_series_channels(client, callback):
     channels = await db.get_series_channels()
     if not channels:
@@ -49,7 +53,7 @@ async def list_series_channels(client, callback):
     markup.append([InlineKeyboardButton("🔙 Back", callback_data="admin_series_menu")])
     await callback.edit_message_text("**📺 Local Series Channels:**", reply_markup=InlineKeyboardMarkup(markup))
 
-@Client.on_callback_query(filters.regex(r"^view_series_ch\|"))
+@router.on("view_series_ch|")
 async def view_series_channel(client, callback):
     chat_id = int(callback.data.split("|")[1])
     channel = await db.channels_col_private.find_one({"chat_id": chat_id, "type": "series"})
@@ -78,16 +82,14 @@ async def view_series_channel(client, callback):
     ])
     await callback.edit_message_text(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^del_series_ch\|"))
-async def delete_series_channel_handler(client, callback):
-    chat_id = int(callback.data.split("|")[1])
+@router.on("del_series_ch|", int)
+async def delete_series_channel_handler(client, callback, chat_id):
     await db.remove_channel(chat_id)
     await callback.answer("Channel deleted from DB (Files remain).", show_alert=True)
     await list_series_channels(client, callback)
 
-@Client.on_callback_query(filters.regex(r"^refresh_series_ch\|"))
-async def refresh_series_channel_handler(client, callback):
-    chat_id = int(callback.data.split("|")[1])
+@router.on("refresh_series_ch|", int)
+async def refresh_series_channel_handler(client, callback, chat_id):
     await callback.answer("Refreshing...", show_alert=False)
     await refresh_series_channel(client, chat_id, update_text="🔄 Channel Refreshed!")
     try: await callback.message.delete()
@@ -96,7 +98,7 @@ async def refresh_series_channel_handler(client, callback):
 
 # --- Add Wizard ---
 
-@Client.on_callback_query(filters.regex(r"^add_series_start$"))
+@router.on("add_series_start")
 async def add_series_start(client, callback):
     series_wizard_states[callback.from_user.id] = {"state": "wait_series_search", "data": {}}
     await callback.message.delete()
@@ -107,7 +109,7 @@ async def add_series_start(client, callback):
         "Send the series name:"
     )
 
-@Client.on_message(filters.user(list(Config.ADMIN_IDS)) & filters.text & ~filters.command(["admin", "cancel"]), group=1)
+@conversations.on_input("series_wizard")
 async def series_wizard_input(client, message):
     user_id = message.from_user.id
     if user_id not in series_wizard_states:
@@ -175,9 +177,8 @@ async def series_wizard_input(client, message):
         )
         return
 
-@Client.on_callback_query(filters.regex(r"^sel_ser\|"))
-async def select_series_callback(client, callback):
-    tmdb_id = int(callback.data.split("|")[1])
+@router.on("sel_ser|", int)
+async def select_series_callback(client, callback, tmdb_id):
     user_id = callback.from_user.id
 
     if user_id in series_wizard_states:
@@ -193,8 +194,22 @@ async def select_series_callback(client, callback):
 
 # --- Helper: Build Markup ---
 
+# Rendered markup per TMDb ID: {tmdb_id: (version, InlineKeyboardMarkup)}
+# Invalidated by db.bump_series_version() on every group/bundle change.
+series_markup_cache = {}
+
+# Resolution order for button labels (subset of the bundle quality options)
+SERIES_QUALITY_ORDER = ["360p", "480p", "720p", "1080p", "2160p (4K)"]
+LEGACY_QUALITY_REGEX = re.compile(r"(480p|720p|1080p|2160p|4k)", re.IGNORECASE)
+
 async def build_series_markup(tmdb_id):
-    groups = await db.groups_col_private.find({"tmdb_id": str(tmdb_id)}).to_list(length=100)
+    key = str(tmdb_id)
+    version = db.get_series_version(key)
+    cached = series_markup_cache.get(key)
+    if cached and cached[0] == version:
+        return cached[1]
+
+    groups = await db.get_series_groups(key)
 
     def sort_key(g):
         s = g.get("season")
@@ -203,23 +218,19 @@ async def build_series_markup(tmdb_id):
     sorted_groups = sorted(groups, key=sort_key)
 
     buttons = []
-    q_regex = re.compile(r"(480p|720p|1080p|2160p|4k)", re.IGNORECASE)
 
     for grp in sorted_groups:
         season = grp.get("season")
         ep_label = grp.get("episode_val")
-        b_codes = grp.get("bundles", [])
-        qualities_set = set()
-
-        if b_codes:
-            bundles_cursor = db.bundles_col_private.find({"code": {"$in": b_codes}})
-            async for b in bundles_cursor:
-                title = b.get("title", "")
-                found = q_regex.findall(title)
-                for q in found:
-                    qualities_set.add(q.lower())
-
-        q_str = " & ".join(sorted(list(qualities_set)))
+        qualities = set(grp.get("qualities") or [])
+
+        quals = [q for q in SERIES_QUALITY_ORDER if q in qualities]
+        for title in grp.get("legacy_titles") or []:
+            for q in LEGACY_QUALITY_REGEX.findall(title or ""):
+                q = q.lower()
+                if q not in quals: quals.append(q)
+
+        q_str = " & ".join(quals)
         if not q_str: q_str = "HD"
 
         if season:
@@ -236,7 +247,9 @@ async def build_series_markup(tmdb_id):
     if not buttons:
         buttons.append([InlineKeyboardButton("Coming Soon...", callback_data="noop")])
 
-    return InlineKeyboardMarkup(buttons)
+    markup = InlineKeyboardMarkup(buttons)
+    series_markup_cache[key] = (version, markup)
+    return markup
 
 # --- Setup Logic (Triggered by Event) ---
 
@@ -340,27 +353,130 @@ async def refresh_series_channel(client, chat_id, update_text=None):
 
     markup = await build_series_markup(tmdb_id)
 
-    # Delete Old
-    try: await client.delete_messages(chat_id, [old_btn_msg_id, old_instr_msg_id])
-    except: pass
+    # Edit buttons in place (1 API call) – fall back to delete + resend if the message is gone
+    edited = False
+    if old_btn_msg_id:
+        try:
+            await client.edit_message_reply_markup(chat_id, old_btn_msg_id, reply_markup=markup)
+            edited = True
+        except MessageNotModified:
+            edited = True
+        except FloodWait:
+            raise
+        except Exception as e:
+            logger.warning(f"Series buttons edit failed in {chat_id}, re-sending: {e}")
+
+    if not edited:
+        # Delete Old
+        try: await client.delete_messages(chat_id, [old_btn_msg_id, old_instr_msg_id])
+        except: pass
 
-    # Send New
-    msg2 = await client.send_message(
-        chat_id,
-        "⬇️ **Select Season & Quality:**",
-        reply_markup=markup
-    )
+        # Send New
+        msg2 = await client.send_message(
+            chat_id,
+            "⬇️ **Select Season & Quality:**",
+            reply_markup=markup
+        )
 
-    msg3 = await client.send_message(
-        chat_id,
-        "👆 **Click any season button above and start the bot to get files!**"
-    )
+        msg3 = await client.send_message(
+            chat_id,
+            "👆 **Click any season button above and start the bot to get files!**"
+        )
 
-    await db.update_series_channel_messages(chat_id, msg2.id, msg3.id)
+        await db.update_series_channel_messages(chat_id, msg2.id, msg3.id)
 
     if update_text:
         await notify_series_update(client, chat_id, update_text)
 
+class SeriesRefreshScheduler:
+    """
+    Debounced refresh of series channels (used for bulk changes).
+
+    schedule() only records the chat. A chat is refreshed once it has been quiet
+    for SERIES_REFRESH_DEBOUNCE seconds (at the latest after SERIES_REFRESH_MAX_WAIT),
+    with all update texts collected meanwhile sent as one notification.
+    Refreshes run through a fixed pool of workers.
+    """
+
+    def __init__(self):
+        # {chat_id: {"texts": [...], "first": ts, "last": ts}}
+        self.pending = {}
+        self.timers = {}
+        # Per-channel refresh lock, dropped once no worker holds it
+        self.locks = weakref.WeakValueDictionary()
+        self.queue = None
+        self.workers = []
+        self.client = None
+
+    def schedule(self, client, chat_id, text=None):
+        self.client = client
+        self._ensure_workers()
+
+        now = time.monotonic()
+        entry = self.pending.get(chat_id)
+        if not entry:
+            entry = self.pending[chat_id] = {"texts": [], "first": now, "last": now}
+        entry["last"] = now
+        if text and text not in entry["texts"]:
+            entry["texts"].append(text)
+
+        if chat_id not in self.timers:
+            self.timers[chat_id] = asyncio.create_task(self._wait_quiet(chat_id))
+
+    def _ensure_workers(self):
+        if self.queue is None:
+            self.queue = asyncio.Queue()
+        if not self.workers:
+            self.workers = [
+                asyncio.create_task(self._worker())
+                for _ in range(Config.SERIES_REFRESH_WORKERS)
+            ]
+
+    async def _wait_quiet(self, chat_id):
+        try:
+            while True:
+                entry = self.pending[chat_id]
+                due = min(entry["last"] + Config.SERIES_REFRESH_DEBOUNCE,
+                          entry["first"] + Config.SERIES_REFRESH_MAX_WAIT)
+                delay = due - time.monotonic()
+                if delay <= 0: break
+                await asyncio.sleep(delay)
+
+            # Hand over; changes arriving from now on start a new window
+            entry = self.pending.pop(chat_id)
+            await self.queue.put((chat_id, entry["texts"]))
+        finally:
+            self.timers.pop(chat_id, None)
+
+    async def _worker(self):
+        while True:
+            chat_id, texts = await self.queue.get()
+            try:
+                async with self.locks.setdefault(chat_id, asyncio.Lock()):
+                    await self._refresh(chat_id, texts)
+            except Exception as e:
+                logger.error(f"Failed to refresh series channel {chat_id}: {e}")
+            finally:
+                self.queue.task_done()
+
+    async def _refresh(self, chat_id, texts):
+        update_text = coalesce_update_texts(texts)
+        try:
+            await refresh_series_channel(self.client, chat_id, update_text=update_text)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+            await refresh_series_channel(self.client, chat_id, update_text=update_text)
+
+def coalesce_update_texts(texts, limit=10):
+    if not texts: return None
+    if len(texts) == 1: return texts[0]
+    lines = [f"• {t}" for t in texts[:limit]]
+    if len(texts) > limit:
+        lines.append(f"…and {len(texts) - limit} more")
+    return "**Channel updated:**\n" + "\n".join(lines)
+
+series_refresher = SeriesRefreshScheduler()
+
 async def notify_series_update(client, chat_id, text="New content added! ✔️"):
     try:
         msg = await client.send_message(chat_id, text)
@@ -5,6 +5,12 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton,
 from config import Config
 from db import db
 from log import get_logger
+from utils.callback_router import router
+from utils.event_log import event_log
+from utils.leaderboard import leaderboard
+from utils.referrals import process_referral
+from utils.identity import bot_identity
+from utils.membership import membership
 
 logger = get_logger(__name__)
 
@@ -53,31 +59,51 @@ async def show_referral_menu(client, chat_id, user_id, message_to_edit=None):
     else:
         await client.send_message(chat_id, text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^ref_refresh$"))
+@router.on("ref_refresh")
 async def ref_refresh(client, callback):
     await show_referral_menu(client, callback.message.chat.id, callback.from_user.id, callback.message)
 
-@Client.on_callback_query(filters.regex(r"^ref_top_10$"))
-async def ref_top_10(client, callback):
-    # Fetch top 10
-    top_users = await db.get_top_referrers(10)
+LEADERBOARD_VIEWS = {
+    "referrals": ("🏆 Top 10 Referrers", "Invites"),
+    "xp": ("⭐ Top 10 XP", "XP")
+}
+
+async def build_leaderboard_text(board, user_id):
+    title, unit = LEADERBOARD_VIEWS[board]
+    top_users = await leaderboard.top(board)
 
-    text = "**🏆 Top 10 Referrers**\n\n"
+    text = f"**{title}**\n\n"
     if not top_users:
         text += "No data yet."
     else:
         for idx, u in enumerate(top_users, 1):
-            name = u.get("first_name", "User")
-            # We might not have names stored if we only store user_id in basic docs.
-            # If so, show ID hidden or partial.
-            # Ideally store name on start.
+            # Names are not stored for all users, show a masked ID
             uid = str(u.get("user_id"))
             hid_id = f"{uid[:3]}***{uid[-2:]}"
-            count = u.get("referral_count", 0)
             medal = "🥇" if idx == 1 else "🥈" if idx == 2 else "🥉" if idx == 3 else f"{idx}."
-            text += f"{medal} **{hid_id}** — {count} Invites\n"
+            text += f"{medal} **{hid_id}** — {u.get('value', 0)} {unit}\n"
+
+    rank, value = await leaderboard.rank(board, user_id)
+    if rank:
+        text += f"\n📍 Your Rank: **#{rank}** ({value} {unit})"
+    return text
 
-    markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="ref_refresh")]])
+@router.on("ref_top_10")
+async def ref_top_10(client, callback):
+    text = await build_leaderboard_text("referrals", callback.from_user.id)
+    markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton("⭐ Top XP", callback_data="ref_top_xp")],
+        [InlineKeyboardButton("🔙 Back", callback_data="ref_refresh")]
+    ])
+    await callback.edit_message_text(text, reply_markup=markup)
+
+@router.on("ref_top_xp")
+async def ref_top_xp(client, callback):
+    text = await build_leaderboard_text("xp", callback.from_user.id)
+    markup = InlineKeyboardMarkup([
+        [InlineKeyboardButton("🏆 Top Referrers", callback_data="ref_top_10")],
+        [InlineKeyboardButton("🔙 Back", callback_data="ref_refresh")]
+    ])
     await callback.edit_message_text(text, reply_markup=markup)
 
 # --- /daily - Daily Bonus ---
@@ -90,17 +116,14 @@ async def daily_command(client, message):
         return
 
     user_id = message.from_user.id
-    ready = await db.get_daily_status(user_id)
+    reward = await db.get_config("daily_bonus_reward", 1) # Hours
+    claimed, value = await db.claim_daily_bonus(user_id, reward)
 
-    if ready:
-        reward = await db.get_config("daily_bonus_reward", 1) # Hours
-        await db.claim_daily_bonus(user_id, reward)
+    if claimed:
         await message.reply(f"✅ **Daily Bonus Claimed!**\n\nYou received **{reward} hours** of Premium access! 🎉\nCome back tomorrow!")
     else:
-        # Calculate time left?
-        # Requires fetching last_daily timestamp.
-        # Simpler:
-        await message.reply("⏳ **Cooldown!** You have already claimed your bonus today.\nCome back later.")
+        hours, minutes = divmod(max(int(value) // 60, 1), 60)
+        await message.reply(f"⏳ **Cooldown!** You have already claimed your bonus today.\nCome back in **{hours}h {minutes}m**.")
 
 # --- /redeem - Coupons ---
 
@@ -115,6 +138,7 @@ async def redeem_command(client, message):
     user_id = message.from_user.id
 
     success, reason = await db.redeem_coupon(code, user_id)
+    await event_log.emit("coupon_redeem", user_id, code=code, result=reason)
 
     if success:
         await message.reply("✅ **Coupon Redeemed!**\nPremium access added to your account.")
@@ -129,49 +153,15 @@ async def redeem_command(client, message):
 # Quest logic is in plugins/user_start.py and plugins/quest.py
 # This file handles shared features like Referrals, Coupons, Daily Bonus.
 
-async def process_referral_reward(client, referrer_id):
-    # Increment count
-    new_count = await db.increment_referral(referrer_id)
-
-    # XP Reward: Referral
-    await db.add_xp(referrer_id, 100)
-
-    # Check Target
-    target = await db.get_config("referral_target", 10)
-
-    # Notify Referrer (Optional, maybe not every single one?)
-    # "👤 New User Joined! (1/10)"
-    try:
-        await client.send_message(referrer_id, f"👤 **New User Joined!**\n\nProgress: `{new_count}/{target}`")
-    except: pass
-
-    if new_count >= target:
-        # Check if already rewarded for this cycle?
-        # Ideally we reset count or allow multiple cycles.
-        # Simple Logic: Every multiple of target? Or just once?
-        # User implies "Invite 10 -> Reward". Resetting count is cleaner or tracking cycles.
-        # Let's assume One-Time or Cumulative.
-        # If Cumulative: if new_count % target == 0
-        if new_count % target == 0:
-            reward_hours = await db.get_config("referral_reward_hours", 24)
-            await db.add_premium_user(referrer_id, reward_hours / 24.0)
-            try:
-                await client.send_message(referrer_id, f"🎉 **Target Reached!**\n\nYou invited {target} users!\n🎁 **Reward:** {reward_hours}h Premium Access granted!")
-            except: pass
-
-@Client.on_callback_query(filters.regex(r"^ref_verify\|"))
-async def ref_verify_callback(client, callback):
+@router.on("ref_verify|", int, int)
+async def ref_verify_callback(client, callback, chat_id, referrer_id):
     # Data: ref_verify|chat_id|referrer_id
     try:
-        parts = callback.data.split("|")
-        chat_id = int(parts[1])
-        referrer_id = int(parts[2])
         user_id = callback.from_user.id
 
         # Verify Membership
         try:
-            member = await client.get_chat_member(chat_id, user_id)
-            if member.status in ["left", "kicked", "banned"]:
+            if not await membership.is_member(client, chat_id, user_id, trust_negative=False):
                 await callback.answer("❌ You haven't joined yet!", show_alert=True)
                 return
         except Exception as e:
@@ -184,23 +174,9 @@ async def ref_verify_callback(client, callback):
         await callback.message.delete()
         await callback.answer("✅ Success! Welcome!")
 
-        # Check Cross-Franchise Bonus
-        try:
-            me = await client.get_me()
-            referrer_origin = await db.get_user_origin(referrer_id)
-            # If referrer is from another bot (and not None)
-            if referrer_origin and referrer_origin != me.id:
-                # Grant Bonus
-                bonus_hours = await db.get_config("cross_ref_bonus", 6)
-                await db.add_premium_user(referrer_id, bonus_hours / 24.0)
-                try:
-                    await client.send_message(referrer_id, f"🌐 **Cross-Franchise Bonus!**\n\n+ {bonus_hours}h Premium for inviting a user from another network node!")
-                except: pass
-        except Exception as e:
-            logger.error(f"Cross-ref check failed: {e}")
-
-        # Reward
-        await process_referral_reward(client, referrer_id)
+        # Count + reward (idempotent per referred user, so double clicks are ignored)
+        me = await bot_identity.get(client)
+        await process_referral(user_id, referrer_id, me.id)
 
         # Send Welcome Msg
         await client.send_message(user_id, "👋 **Welcome to XTV Fileshare Bot!**\n\nYou can now use the bot freely.")
@@ -0,0 +1,50 @@
+from pyrogram import Client, filters
+from config import Config
+from log import get_logger
+from utils.callback_router import router
+from utils.states import conversations
+from utils.plugin_loader import plugin_loader
+
+logger = get_logger(__name__)
+
+# Single entry point for all callback queries (routes registered via @router.on in the plugins).
+# global_ban keeps its own group=-1 handler and runs before this one.
+@Client.on_callback_query()
+async def callback_dispatch(client, callback):
+    if await router.dispatch(client, callback): return
+    # Route may live in a lazily loaded admin plugin
+    if plugin_loader.load_for_callback(callback.data) and await router.dispatch(client, callback): return
+    logger.debug(f"No callback route for '{callback.data}'")
+
+# Single entry point for conversation input (flows registered via @conversations.on_input).
+# Only the user's active flow runs; group=1 keeps command handlers (group 0) first.
+INPUT_EXCLUDED_COMMANDS = ["start", "create_link", "admin", "cancel"]
+
+@Client.on_message(
+    (filters.text | filters.photo | filters.video | filters.sticker)
+    & ~filters.command(INPUT_EXCLUDED_COMMANDS),
+    group=1
+)
+async def conversation_dispatch(client, message):
+    if not message.from_user: return
+    user_id = message.from_user.id
+
+    entry = conversations.input_entry(user_id)
+    if not entry: return
+
+    opts = conversations.flows.get(entry[0], {})
+    handler = opts.get("handler")
+    if not handler: return
+    if opts.get("admin_only") and user_id not in Config.ADMIN_IDS: return
+    if not message.text and not opts.get("media"): return
+
+    await handler(client, message)
+
+# Admin wizards only (like the former panel /cancel); quest sessions are not exclusive and stay
+@Client.on_message(filters.command("cancel") & filters.user(list(Config.ADMIN_IDS)), group=1)
+async def cancel_conversation(client, message):
+    user_id = message.from_user.id
+    entry = conversations.get(user_id)
+    if not entry or not conversations.flows.get(entry[0], {}).get("admin_only", True): return
+    if conversations.end(user_id):
+        await message.reply("❌ Operation cancelled.")
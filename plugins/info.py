@@ -1,14 +1,16 @@
-import os
+import sys
+import html
 import time
 import datetime
-import platform
-import subprocess
-import asyncio
-import psutil
 import pyrogram
 from pyrogram import Client, filters
 from pyrogram.types import InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from config import Config
+from utils.callback_router import router
+from utils.plugin_loader import plugin_loader, rss_mb, peak_rss_mb
+from utils.startup import startup
+from utils.system_stats import system_stats, sparkline
+from utils.watchdog import watchdog
 
 # Helper Functions
 def format_uptime(seconds: float) -> str:
@@ -29,76 +31,51 @@ def get_readable_size(size: int) -> str:
         n += 1
     return f"{size:.2f} {power_labels[n]}"
 
-def get_git_commit() -> str:
-    # Try Environment Variable (Railway)
-    commit = os.getenv("RAILWAY_GIT_COMMIT_SHA")
-    if commit:
-        return commit[:7]
+def fmt_ms(value):
+    return "N/A" if value is None else f"{int(value)}ms"
 
-    # Try Git Command
-    try:
-        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).decode("ascii").strip()
-    except Exception:
-        return "Unknown"
-
-async def get_system_stats(client):
-    # Developer Info
-    try:
-        # Try to fetch user info
-        user = await client.get_users("davdxpx")
-        dev_name = user.first_name
-        if user.last_name:
-            dev_name += f" {user.last_name}"
-        # Use HTML link for user
-        dev_link = f"tg://user?id={user.id}"
-    except Exception:
-        # Fallback
-        dev_name = "𝕏0L0™"
-        dev_link = "https://t.me/davdxpx"
+def get_system_stats():
+    # Rendered from the background sampler only (no RPC, no subprocess, no blocking psutil call)
+    dev_name, dev_link = system_stats.developer
 
-    # System Stats (Wrap in try/except for robustness)
-    try:
-        # Run blocking psutil calls in a thread
-        cpu_percent = await asyncio.to_thread(psutil.cpu_percent, interval=0.5)
-        mem = await asyncio.to_thread(psutil.virtual_memory)
-        ram_used = get_readable_size(mem.used)
-        ram_total = get_readable_size(mem.total)
-    except Exception:
-        cpu_percent = "N/A"
-        ram_used = "N/A"
-        ram_total = "N/A"
-
-    # Tech Stack
-    python_ver = platform.python_version()
-    pyro_ver = pyrogram.__version__
-
-    # Git
-    git_hash = get_git_commit()
+    cpu = system_stats.last("cpu")
+    ram_used = system_stats.last("ram_used")
+    ram_total = system_stats.ram_total
 
     # Uptime
     if Config.START_TIME:
         uptime_seconds = time.time() - Config.START_TIME
     else:
         uptime_seconds = 0
-    uptime_str = format_uptime(uptime_seconds)
-
-    # Date
-    now_utc = datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
 
     return {
         "dev_name": dev_name,
         "dev_link": dev_link,
-        "cpu": cpu_percent,
-        "ram_used": ram_used,
-        "ram_total": ram_total,
-        "python_ver": python_ver,
-        "pyro_ver": pyro_ver,
-        "git_hash": git_hash,
-        "uptime": uptime_str,
-        "date": now_utc
+        "cpu": "N/A" if cpu is None else f"{cpu:.1f}%",
+        "cpu_trend": sparkline(system_stats.series("cpu")),
+        "ram_used": "N/A" if ram_used is None else get_readable_size(ram_used),
+        "ram_total": "N/A" if ram_total is None else get_readable_size(ram_total),
+        "ram_trend": sparkline(system_stats.series("ram_used")),
+        "lag": watchdog.percentiles(),
+        "lag_trend": sparkline(system_stats.series("lag_p95")),
+        "stalls": len(watchdog.stalls),
+        "tg_ms": system_stats.last("tg_ms"),
+        "tg_trend": sparkline(system_stats.series("tg_ms")),
+        "db": fmt_ms(system_stats.last("db_ms")),
+        "db_trend": sparkline(system_stats.series("db_ms")),
+        "python_ver": "{}.{}.{}".format(*sys.version_info[:3]),
+        "pyro_ver": pyrogram.__version__,
+        "git_hash": system_stats.git_hash,
+        "uptime": format_uptime(uptime_seconds),
+        "date": datetime.datetime.now(datetime.timezone.utc).strftime("%Y-%m-%d %H:%M UTC")
     }
 
-def build_info_text(stats, ping_ms):
+def format_lag(lag):
+    if not lag:
+        return "N/A"
+    return f"p50 {lag['p50']:.0f} / p95 {lag['p95']:.0f} / p99 {lag['p99']:.0f}ms"
+
+def build_info_text(stats, ping_ms=None):
     return (
         "🤖 <b>Bot Status Panel</b>\n"
         f"👤 Developer: <a href='{stats['dev_link']}'>{stats['dev_name']}</a>\n"
@@ -106,32 +83,29 @@ def build_info_text(stats, ping_ms):
         f"⏳ Uptime: {stats['uptime']}\n\n"
         "💻 <b>System</b>\n"
         "├ OS: Linux (Railway)\n"
-        f"├ CPU: {stats['cpu']}%\n"
-        f"└ RAM: {stats['ram_used']} / {stats['ram_total']}\n\n"
+        f"├ CPU: {stats['cpu']} {stats['cpu_trend']}\n"
+        f"├ RAM: {stats['ram_used']} / {stats['ram_total']} {stats['ram_trend']}\n"
+        f"├ Loop Lag: {format_lag(stats['lag'])} {stats['lag_trend']}\n"
+        f"└ Loop Stalls: {stats['stalls']}\n\n"
         "🛠 <b>Tech Stack</b>\n"
         f"├ Python: v{stats['python_ver']}\n"
         f"└ Pyrogram: v{stats['pyro_ver']}\n\n"
         "📡 <b>Connection</b>\n"
-        f"├ Ping: {int(ping_ms)}ms\n"
+        f"├ Ping: {fmt_ms(ping_ms if ping_ms is not None else stats['tg_ms'])}\n"
+        f"├ Telegram: {fmt_ms(stats['tg_ms'])} {stats['tg_trend']}\n"
+        f"├ MainDB: {stats['db']} {stats['db_trend']}\n"
         f"└ Version: {stats['git_hash']}\n\n"
         f"📅 {stats['date']}"
     )
 
 @Client.on_message(filters.command("info"))
 async def info_handler(client, message):
-    # Calculate Ping (Time since message received)
-    start_time = time.time()
+    stats = get_system_stats()
 
-    stats = await get_system_stats(client)
-
-    # Use message timestamp if available, otherwise processing time
+    # Ping = time since the message was sent
+    ping_ms = None
     if message.date:
-        ping_ms = (time.time() - message.date.timestamp()) * 1000
-    else:
-        ping_ms = (time.time() - start_time) * 1000
-
-    if ping_ms < 0:
-        ping_ms = 0
+        ping_ms = max(0, (time.time() - message.date.timestamp()) * 1000)
 
     text = build_info_text(stats, ping_ms)
 
@@ -144,30 +118,73 @@ async def info_handler(client, message):
 
     await message.reply_text(text, reply_markup=markup, parse_mode=pyrogram.enums.ParseMode.HTML)
 
-@Client.on_callback_query(filters.regex("^info_refresh$"))
+@router.on("info_refresh")
 async def info_refresh_handler(client, callback: CallbackQuery):
-    start_time = time.time()
-
-    stats = await get_system_stats(client)
-
-    # For refresh, use processing time as ping
-    end_time = time.time()
-    ping_ms = (end_time - start_time) * 1000
-    if ping_ms < 1:
-        ping_ms = 1
-
-    text = build_info_text(stats, ping_ms)
+    # For refresh, Ping shows the sampled Telegram round trip
+    text = build_info_text(get_system_stats())
 
     try:
         await callback.message.edit_text(text, reply_markup=callback.message.reply_markup, parse_mode=pyrogram.enums.ParseMode.HTML)
         await callback.answer("Refreshed!")
     except Exception:
-        # If text didn't change (e.g. extremely fast refresh), ignore error
+        # Nothing new sampled since the last refresh
         await callback.answer("Already updated!", show_alert=False)
 
-@Client.on_callback_query(filters.regex("^info_close$"))
+@router.on("info_close")
 async def info_close_handler(client, callback: CallbackQuery):
     try:
         await callback.message.delete()
     except Exception:
         pass
+
+# --- Boot Report ---
+
+def build_boot_text():
+    lines = ["🚀 <b>Boot Report</b>\n"]
+
+    lines.append("<b>Startup Phases</b>")
+    for name, p in startup.phases.items():
+        if p["duration"] is None:
+            lines.append(f"├ {name}: {p['status']}")
+        else:
+            lines.append(f"├ {name}: {p['status']} – {p['duration'] * 1000:.0f}ms (T+{p['at']:.2f}s)")
+
+    eager = {n: i for n, i in plugin_loader.loaded.items() if not i["lazy"]}
+    lazy = {n: i for n, i in plugin_loader.loaded.items() if i["lazy"]}
+
+    lines.append(f"\n<b>Plugin Imports</b> ({len(eager)} at boot, {plugin_loader.boot_ms or 0:.0f}ms total)")
+    # Slowest first; nested imports are attributed to the plugin that pulled them in
+    for name, info in sorted(eager.items(), key=lambda x: -x[1]["ms"])[:8]:
+        lines.append(f"├ {name}: {info['ms']:.1f}ms")
+
+    lines.append("\n<b>Lazy Plugins</b>")
+    for name, info in lazy.items():
+        lines.append(f"├ {name}: loaded on use in {info['ms']:.1f}ms")
+    for name in plugin_loader.pending:
+        lines.append(f"├ {name}: not loaded")
+
+    lines.append("\n<b>Memory (RSS)</b>")
+    if plugin_loader.rss_before is not None:
+        lines.append(f"├ Before plugins: {plugin_loader.rss_before:.1f} MB")
+        lines.append(f"├ After plugins: {plugin_loader.rss_after:.1f} MB")
+    lines.append(f"├ Now: {rss_mb():.1f} MB")
+    lines.append(f"└ Peak: {peak_rss_mb():.1f} MB")
+
+    lines.append("\n<b>Event Loop</b>")
+    lines.append(f"├ Stalls: {len(watchdog.stalls)}")
+    if watchdog.stalls:
+        s = watchdog.stalls[-1]
+        lines.append(f"├ Last stall: {s['blocked_ms']:.0f}ms at <code>{html.escape(s['where'])}</code>")
+    if not Config.WATCHDOG_ASYNCIO_DEBUG:
+        lines.append("└ Slow callbacks: off (WATCHDOG_ASYNCIO_DEBUG)")
+    else:
+        branch = "├" if watchdog.slow_callbacks else "└"
+        lines.append(f"{branch} Slow callbacks (>{Config.WATCHDOG_SLOW_CALLBACK * 1000:.0f}ms): {len(watchdog.slow_callbacks)}")
+        if watchdog.slow_callbacks:
+            lines.append(f"└ Last: <code>{html.escape(watchdog.slow_callbacks[-1]['message'][:200])}</code>")
+
+    return "\n".join(lines)
+
+@Client.on_message(filters.command("boot") & filters.user(list(Config.ADMIN_IDS)))
+async def boot_handler(client, message):
+    await message.reply_text(build_boot_text(), parse_mode=pyrogram.enums.ParseMode.HTML)
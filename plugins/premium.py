@@ -2,6 +2,7 @@ from pyrogram import Client, filters
 from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton, CallbackQuery
 from db import db
 from config import Config
+from utils.callback_router import router
 from datetime import datetime
 import time
 
@@ -28,9 +29,8 @@ async def premium_command(client, message):
         await message.reply(text, reply_markup=markup)
         return
 
-    # Premium View
-    user = await db.users_col.find_one({"user_id": user_id})
-    expiry = user.get("premium_expiry", 0)
+    # Premium View (expiry is cached from the check above)
+    expiry = await db.get_premium_expiry(user_id)
     try:
         dt = datetime.fromtimestamp(expiry).strftime('%Y-%m-%d %H:%M')
     except:
@@ -51,21 +51,21 @@ async def premium_command(client, message):
 
     await message.reply(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^open_referral_menu$"))
+@router.on("open_referral_menu")
 async def open_referral_jump(client, callback):
     # Trigger existing logic from community plugin
     from plugins.community import show_referral_menu
     await show_referral_menu(client, callback.message.chat.id, callback.from_user.id, callback.message)
 
-@Client.on_callback_query(filters.regex(r"^noop$"))
+@router.on("noop")
 async def noop_cb(client, callback):
     await callback.answer("✅ Active")
 
-@Client.on_callback_query(filters.regex(r"^close_menu$"))
+@router.on("close_menu")
 async def close_menu_cb(client, callback):
     await callback.message.delete()
 
-@Client.on_callback_query(filters.regex(r"^prem_history$"))
+@router.on("prem_history")
 async def prem_history(client, callback):
     user_id = callback.from_user.id
     history = await db.get_user_history(user_id)
@@ -84,12 +84,11 @@ async def prem_history(client, callback):
     markup = InlineKeyboardMarkup([[InlineKeyboardButton("🔙 Back", callback_data="back_to_prem")]])
     await callback.edit_message_text(text, reply_markup=markup, disable_web_page_preview=True)
 
-@Client.on_callback_query(filters.regex(r"^back_to_prem$"))
+@router.on("back_to_prem")
 async def back_to_prem(client, callback):
-    # Re-show premium menu. Need to fetch expiry again.
+    # Re-show premium menu
     user_id = callback.from_user.id
-    user = await db.users_col.find_one({"user_id": user_id})
-    expiry = user.get("premium_expiry", 0)
+    expiry = await db.get_premium_expiry(user_id)
     try:
         dt = datetime.fromtimestamp(expiry).strftime('%Y-%m-%d %H:%M')
     except:
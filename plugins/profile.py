@@ -5,6 +5,7 @@ from pyrogram.types import Message, InlineKeyboardMarkup, InlineKeyboardButton,
 from config import Config
 from db import db
 from utils.ranks import format_progress_bar, BADGE_ICONS
+from utils.callback_router import router
 
 # Helper function
 def generate_profile_text_markup(user, req_info, fs_info, tg_user):
@@ -115,17 +116,17 @@ def generate_profile_text_markup(user, req_info, fs_info, tg_user):
 async def profile_command(client: Client, message: Message):
     user_id = message.from_user.id
 
-    # ensure_full_user_profile calculates ranks and updates DB
-    user, req_info, fs_info = await db.ensure_full_user_profile(user_id)
+    # Single read: ranks and badges are maintained on write
+    user, req_info, fs_info = await db.get_user_profile(user_id)
 
     text, markup = generate_profile_text_markup(user, req_info, fs_info, message.from_user)
 
     await message.reply(text, reply_markup=markup)
 
-@Client.on_callback_query(filters.regex(r"^profile_refresh$"))
+@router.on("profile_refresh")
 async def profile_refresh(client, callback):
     user_id = callback.from_user.id
-    user, req_info, fs_info = await db.ensure_full_user_profile(user_id)
+    user, req_info, fs_info = await db.get_user_profile(user_id)
 
     text, markup = generate_profile_text_markup(user, req_info, fs_info, callback.from_user)
 
@@ -134,6 +135,6 @@ async def profile_refresh(client, callback):
     except Exception:
         pass
 
-@Client.on_callback_query(filters.regex(r"^profile_close$"))
+@router.on("profile_close")
 async def profile_close(client, callback):
     await callback.message.delete()
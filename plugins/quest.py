@@ -2,6 +2,8 @@ import random
 from db import db
 from config import Config
 from log import get_logger
+from utils.task_pool import task_pool
+from utils.membership import membership
 
 logger = get_logger(__name__)
 
@@ -38,12 +40,9 @@ class QuestEngine:
         fs_enabled = await db.get_config("force_sub_enabled", False)
         if fs_enabled and current_points < goal_points:
             # Get missing channels
-            # Log checks split
-            main_fs = await db.channels_col_main.find({"approved": True, "type": "force_sub"}).to_list(length=100)
-            local_fs = await db.channels_col_private.find({"approved": True, "type": "force_sub"}).to_list(length=100)
-            all_fs = main_fs + local_fs
-
-            logger.info(f"Force sub check: global {len(main_fs)}, local {len(local_fs)}")
+            # Refreshed in the background by the membership cache (no MainDB query per quest)
+            all_fs = await membership.force_sub_channels()
+            logger.info(f"Force sub check: {len(all_fs)} channels")
 
             missing = []
 
@@ -51,17 +50,8 @@ class QuestEngine:
             for ch in all_fs:
                 chat_id = ch["chat_id"]
                 try:
-                    # Refresh peer cache to prevent PeerIdInvalid
-                    try:
-                        await client.get_chat(chat_id)
-                    except: pass
-
-                    member = await client.get_chat_member(chat_id, user_id)
-
-                    # Logic: Only add if definitely NOT a member
-                    # Statuses that imply membership: creator, administrator, member, restricted (usually still in chat)
-                    # Statuses that imply NOT member: left, kicked, banned
-                    if member.status in ["left", "kicked", "banned"]:
+                    # Cached (chat member updates), live get_chat_member only on miss / stale entry
+                    if not await membership.is_member(client, chat_id, user_id):
                         missing.append(ch)
                     # Else: User IS member, so SKIP (do not add to missing)
 
@@ -104,15 +94,8 @@ class QuestEngine:
         if remaining > 0:
             # 1 Task = 1 Point
             task_count = remaining
-            # Fetch tasks
-            tasks_db = await db.get_random_tasks(task_count)
-            # If not enough tasks in DB, loop them?
-            if len(tasks_db) < task_count and tasks_db:
-                while len(tasks_db) < task_count:
-                    tasks_db.append(random.choice(tasks_db))
-            elif not tasks_db:
-                # No tasks? Fallback dummy
-                tasks_db = [{"question": "1+1?", "answer": "2", "type": "text"}] * task_count
+            # Sampled in memory (no MainDB round trip), avoids recently seen questions
+            tasks_db = await task_pool.sample(user_id, task_count)
 
             for t in tasks_db:
                 steps.append({"type": "task", "points": 1, "data": t})
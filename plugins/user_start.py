@@ -6,6 +6,12 @@ from config import Config
 from db import db
 from log import get_logger
 from utils.tmdb import get_tmdb_details
+from utils.event_log import event_log
+from utils.callback_router import router
+from utils.referrals import process_referral
+from utils.identity import bot_identity
+from utils.membership import membership
+from utils.states import conversations
 from plugins.quest import QuestEngine
 import asyncio
 import time
@@ -13,7 +19,8 @@ import time
 logger = get_logger(__name__)
 
 # {user_id: {"code": str, "quest": dict}}
-user_sessions = {}
+# Not exclusive: opening an admin wizard (or /cancel) mid-quest keeps the quest session
+user_sessions = conversations.view("quest", ttl=Config.QUEST_SESSION_TTL, exclusive=False)
 
 # --- Delivery ---
 async def deliver_bundle(client, user_id, chat_id, code):
@@ -117,6 +124,8 @@ async def deliver_bundle(client, user_id, chat_id, code):
             logger.error(f"Send error: {e}")
     await status_msg.delete()
 
+    await event_log.emit("deliver", user_id, code=code, files=len(files), sent=len(sent_msgs))
+
     # Auto Delete
     auto_del_mins = await db.get_config("auto_delete_time", 0)
     if auto_del_mins > 0 and sent_msgs:
@@ -247,9 +256,10 @@ async def process_bundle_start_internal(client, user_id, chat_id, code, force_di
          quest = await QuestEngine.generate_quest(user_id, bundle, client)
          await msg.delete()
          user_sessions[user_id] = {"code": code, "quest": quest}
+         await event_log.emit("quest_start", user_id, code=code, steps=quest["total_steps"])
          await process_quest_step(client, user_id, chat_id)
 
-@Client.on_callback_query(filters.regex(r"^start_bund\|"))
+@router.on("start_bund|")
 async def start_bundle_callback(client, callback):
     code = callback.data.split("|")[1]
     await callback.message.delete()
@@ -270,7 +280,7 @@ async def start_handler(client: Client, message: Message):
 
     # Ensure User (Network History & Origin)
     try:
-        me = await client.get_me()
+        me = await bot_identity.get(client)
         await db.ensure_user(user_id, origin_bot_id=me.id)
     except Exception as e:
         logger.error(f"Ensure user failed: {e}")
@@ -304,7 +314,7 @@ async def start_handler(client: Client, message: Message):
                         return # Stop here! User must verify.
                     else:
                         # No FS channels? Just count it.
-                        await process_referral_reward(client, referrer_id)
+                        await process_referral(user_id, referrer_id, bot_identity.id)
                         await message.reply("👋 Welcome! You have been referred to the bot.")
 
         except Exception as e:
@@ -439,69 +449,9 @@ async def delayed_verify_button(message, markup):
     except Exception as e:
         logger.warning(f"Failed to update share markup: {e}")
 
-async def process_referral_reward(client, referrer_id):
-    # Increment count
-    new_count = await db.increment_referral(referrer_id)
-    # Check Target
-    target = await db.get_config("referral_target", 10)
-
-    # Notify Referrer (Optional, maybe not every single one?)
-    # "👤 New User Joined! (1/10)"
-    try:
-        await client.send_message(referrer_id, f"👤 **New User Joined!**\n\nProgress: `{new_count}/{target}`")
-    except: pass
-
-    if new_count >= target:
-        # Check if already rewarded for this cycle?
-        # Ideally we reset count or allow multiple cycles.
-        # Simple Logic: Every multiple of target? Or just once?
-        # User implies "Invite 10 -> Reward". Resetting count is cleaner or tracking cycles.
-        # Let's assume One-Time or Cumulative.
-        # If Cumulative: if new_count % target == 0
-        if new_count % target == 0:
-            reward_hours = await db.get_config("referral_reward_hours", 24)
-            await db.add_premium_user(referrer_id, reward_hours / 24.0)
-            try:
-                await client.send_message(referrer_id, f"🎉 **Target Reached!**\n\nYou invited {target} users!\n🎁 **Reward:** {reward_hours}h Premium Access granted!")
-            except: pass
-
-@Client.on_callback_query(filters.regex(r"^ref_verify\|"))
-async def ref_verify_callback(client, callback):
-    # Data: ref_verify|chat_id|referrer_id
-    try:
-        parts = callback.data.split("|")
-        chat_id = int(parts[1])
-        referrer_id = int(parts[2])
-        user_id = callback.from_user.id
-
-        # Verify Membership
-        try:
-            member = await client.get_chat_member(chat_id, user_id)
-            if member.status in ["left", "kicked", "banned"]:
-                await callback.answer("❌ You haven't joined yet!", show_alert=True)
-                return
-        except Exception as e:
-             # If bot can't see, we might assume success or fail.
-             # Fail is safer.
-             await callback.answer(f"❌ Verification failed. Try again in a moment.", show_alert=True)
-             return
-
-        # Success!
-        await callback.message.delete()
-        await callback.answer("✅ Success! Welcome!")
-
-        # Reward
-        await process_referral_reward(client, referrer_id)
-
-        # Send Welcome Msg
-        await client.send_message(user_id, "👋 **Welcome to XTV Fileshare Bot!**\n\nYou can now use the bot freely.")
-
-    except Exception as e:
-        logger.error(f"Ref verify error: {e}")
-
 # --- Handlers ---
 
-@Client.on_callback_query(filters.regex(r"^q_ans\|"))
+@router.on("q_ans|")
 async def quest_ans(client, callback):
     user_id = callback.from_user.id
     if user_id not in user_sessions:
@@ -520,12 +470,13 @@ async def quest_ans(client, callback):
         await callback.message.delete()
         # XP Reward: Task
         await db.add_xp(user_id, 25)
+        await event_log.emit("quest_step", user_id, type="task")
         session["quest"]["current_index"] += 1
         await process_quest_step(client, user_id, callback.message.chat.id)
     else:
         await callback.answer("❌ Wrong!", show_alert=True)
 
-@Client.on_callback_query(filters.regex(r"^q_skip$"))
+@router.on("q_skip")
 async def quest_skip(client, callback):
     # Check time (mock for now, or rely on client side wait? No, server check)
     msg_date = callback.message.date.timestamp()
@@ -536,10 +487,11 @@ async def quest_skip(client, callback):
     user_id = callback.from_user.id
     if user_id in user_sessions:
         user_sessions[user_id]["quest"]["current_index"] += 1
+        await event_log.emit("quest_skip", user_id)
         await callback.message.delete()
         await process_quest_step(client, user_id, callback.message.chat.id)
 
-@Client.on_message(filters.text & ~filters.command(["start", "create_link", "admin", "cancel"]), group=2)
+@conversations.on_input("quest", admin_only=False)
 async def quest_text_handler(client, message):
     user_id = message.from_user.id
     if user_id not in user_sessions: return
@@ -556,12 +508,13 @@ async def quest_text_handler(client, message):
             await message.reply("✅ Correct!")
             # XP Reward: Task
             await db.add_xp(user_id, 25)
+            await event_log.emit("quest_step", user_id, type="task")
             session["quest"]["current_index"] += 1
             await process_quest_step(client, user_id, message.chat.id)
         else:
             await message.reply("❌ Wrong answer.")
 
-@Client.on_callback_query(filters.regex(r"^sub_check$"))
+@router.on("sub_check")
 async def sub_check_handler(client, callback):
     user_id = callback.from_user.id
     if user_id not in user_sessions: return
@@ -574,17 +527,13 @@ async def sub_check_handler(client, callback):
 
     ch_id = step["channel"]["id"]
     try:
-        # Robust check
-        try: await client.get_chat(ch_id)
-        except: pass
-
-        member = await client.get_chat_member(ch_id, user_id)
-        if member.status not in ["left", "kicked", "banned"]:
+        if await membership.is_member(client, ch_id, user_id, trust_negative=False):
             # Success
             await callback.answer("✅ Verified!")
             await callback.message.delete()
             # XP Reward: Task (Sub)
             await db.add_xp(user_id, 25)
+            await event_log.emit("quest_step", user_id, type="sub", chat_id=ch_id)
             session["quest"]["current_index"] += 1
             await process_quest_step(client, user_id, callback.message.chat.id)
             return
@@ -593,7 +542,7 @@ async def sub_check_handler(client, callback):
 
     await callback.answer("❌ You are not in the channel yet! (Or bot cannot verify)", show_alert=True)
 
-@Client.on_callback_query(filters.regex(r"^share_verify_fake$"))
+@router.on("share_verify_fake")
 async def share_verify_fake(client, callback):
     user_id = callback.from_user.id
     if user_id not in user_sessions: return
@@ -614,6 +563,7 @@ async def share_verify_fake(client, callback):
 
     # XP Reward: Task (Share)
     await db.add_xp(user_id, 25)
+    await event_log.emit("quest_step", user_id, type="share")
 
     await callback.edit_message_text("✅ **Share Verified!**")
     await process_quest_step(client, user_id, callback.message.chat.id)
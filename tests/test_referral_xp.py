@@ -0,0 +1,71 @@
+"""
+Referral XP backfill (record_referral vs. migrate_user_profiles / get_user_profile).
+
+Needs a throwaway MongoDB (4.4+), skipped otherwise:
+    TEST_MONGO_URI=mongodb://localhost:27017 python -m unittest discover tests
+"""
+import os
+import uuid
+import unittest
+from motor.motor_asyncio import AsyncIOMotorClient
+from db import Database
+
+TEST_MONGO_URI = os.getenv("TEST_MONGO_URI")
+
+@unittest.skipUnless(TEST_MONGO_URI, "TEST_MONGO_URI not set")
+class ReferralXpTest(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.client = AsyncIOMotorClient(TEST_MONGO_URI)
+        self.name = f"xtv_test_{uuid.uuid4().hex[:8]}"
+        mdb = self.client[self.name]
+
+        self.db = Database()
+        self.db.users_col = mdb.users
+        self.db.referrals_col = mdb.referrals
+        self.db.leaderboards_col = mdb.leaderboards
+        self.db.counters_col = mdb.counters
+        await self.db.referrals_col.create_index("referee_id", unique=True)
+
+    async def asyncTearDown(self):
+        await self.client.drop_database(self.name)
+        self.client.close()
+
+    async def refer(self, referee_id, referrer_id):
+        return await self.db.record_referral(referee_id, referrer_id, bot_id=1, target=10, reward_hours=24, cross_bonus_hours=6)
+
+    async def test_new_referrer_is_not_backfilled_twice(self):
+        await self.refer(101, 1)
+
+        stored = await self.db.users_col.find_one({"user_id": 1})
+        self.assertEqual(stored["xp_fileshare"], 100)
+        self.assertTrue(stored["xp_backfilled"])
+
+        user, _, fs_info = await self.db.get_user_profile(1)
+        self.assertEqual(user["xp_fileshare"], 100)
+        self.assertEqual(fs_info["current_rank"], stored["rank_fileshare"])
+
+    async def test_legacy_referrer_before_migration(self):
+        # Referred 3 users under the old code (no XP for them yet)
+        await self.db.users_col.insert_one({"user_id": 2, "referral_count": 3, "xp_fileshare": 0})
+
+        result = await self.refer(102, 2)
+        self.assertEqual(result["count"], 4)
+
+        stored = await self.db.users_col.find_one({"user_id": 2})
+        self.assertEqual(stored["xp_fileshare"], 400) # 3 backfilled + 1 new referral
+
+        await self.db.migrate_user_profiles()
+        stored = await self.db.users_col.find_one({"user_id": 2})
+        self.assertEqual(stored["xp_fileshare"], 400)
+
+        user, _, _ = await self.db.get_user_profile(2)
+        self.assertEqual(user["xp_fileshare"], 400)
+
+    async def test_repeated_referral_is_ignored(self):
+        self.assertIsNotNone(await self.refer(103, 3))
+        self.assertIsNone(await self.refer(103, 3))
+        stored = await self.db.users_col.find_one({"user_id": 3})
+        self.assertEqual((stored["referral_count"], stored["xp_fileshare"]), (1, 100))
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,158 @@
+import asyncio
+from datetime import datetime, timezone
+from pymongo.errors import BulkWriteError
+from config import Config
+from log import get_logger
+
+logger = get_logger(__name__)
+
+class EventLog:
+    """
+    Buffered event pipeline (Admin Actions + User Events).
+
+    Producers only enqueue. A single background flusher drains the queue and
+    writes batches with insert_many into the PrivateDB time-series collection,
+    either when a batch is full or when the flush interval has passed.
+
+    If a flush fails, the batch is retried with backoff and NOT dropped.
+    While retrying, the queue fills up and emit() starts waiting for a free
+    slot (backpressure) instead of buffering unbounded memory.
+
+    The flusher holds its first write until mark_ready() (collection created),
+    at most STARTUP_PHASE_TIMEOUT, so a slow setup never stalls emit().
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=Config.EVENT_QUEUE_SIZE)
+        self.collection = None
+        self.task = None
+        self.ready = asyncio.Event()
+        self.idle = False # flusher is waiting for the first event of a batch (holds nothing)
+        self.closing = False
+
+        # Counters (exposed for diagnostics)
+        self.flushed = 0
+        self.dropped = 0
+
+    def start(self, collection):
+        """Attach the target collection and spawn the flusher. Call once from main()."""
+        self.collection = collection
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def mark_ready(self):
+        self.ready.set()
+
+    async def emit(self, action, user_id=None, kind="user", **details):
+        """
+        Enqueue one event.
+        kind: 'user' (deliveries, quests, referrals, coupons) or 'admin' (audit log)
+        """
+        doc = {
+            "ts": datetime.now(timezone.utc),
+            "meta": {"kind": kind, "action": action},
+            "user_id": user_id,
+            "details": details
+        }
+
+        try:
+            self.queue.put_nowait(doc)
+            return
+        except asyncio.QueueFull:
+            pass
+
+        # Queue full -> flusher is behind or DB is failing. Wait (backpressure).
+        try:
+            await asyncio.wait_for(self.queue.put(doc), timeout=Config.EVENT_PUT_TIMEOUT)
+        except asyncio.TimeoutError:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Event queue saturated. Dropped {self.dropped} events so far.")
+
+    async def _next_batch(self):
+        # Block until at least one event exists, then collect until size or time threshold
+        self.idle = True
+        try:
+            batch = [await self.queue.get()]
+        finally:
+            self.idle = False
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + Config.EVENT_FLUSH_INTERVAL
+
+        while len(batch) < Config.EVENT_BATCH_SIZE:
+            try:
+                batch.append(self.queue.get_nowait())
+                continue
+            except asyncio.QueueEmpty:
+                pass
+
+            remaining = deadline - loop.time()
+            if remaining <= 0 or self.closing:
+                break
+            try:
+                batch.append(await asyncio.wait_for(self.queue.get(), timeout=remaining))
+            except asyncio.TimeoutError:
+                break
+
+        return batch
+
+    async def _flush(self, batch):
+        delay = 1
+        while batch:
+            try:
+                await self.collection.insert_many(batch, ordered=False)
+                self.flushed += len(batch)
+                return
+            except BulkWriteError as e:
+                # Individual documents were rejected (invalid). Retrying won't help, keep the rest.
+                errors = e.details.get("writeErrors", [])
+                failed = {err["index"] for err in errors}
+                self.flushed += len(batch) - len(failed)
+                logger.error(f"Event flush rejected {len(failed)} events: {errors[:1]}")
+                return
+            except Exception as e:
+                logger.warning(f"Event flush failed ({len(batch)} events), retrying in {delay}s: {e}")
+                await asyncio.sleep(delay)
+                delay = min(delay * 2, 60)
+
+    async def _run(self):
+        logger.info("Starting Event Log Flusher...")
+        try:
+            await asyncio.wait_for(self.ready.wait(), timeout=Config.STARTUP_PHASE_TIMEOUT)
+        except asyncio.TimeoutError:
+            logger.warning("Event collection setup not finished, flushing anyway.")
+
+        while not self.closing:
+            batch = await self._next_batch()
+            await self._flush(batch)
+
+    async def close(self, timeout=10):
+        """
+        Stops the flusher without losing events (used on shutdown): a batch
+        already taken from the queue is flushed first, then the rest of the queue.
+        """
+        if self.collection is None:
+            return
+        self.closing = True
+        if self.task:
+            if self.idle or not self.ready.is_set():
+                self.task.cancel() # holds no events
+            try:
+                await asyncio.wait_for(self.task, timeout=timeout)
+            except (asyncio.CancelledError, asyncio.TimeoutError):
+                pass
+            except Exception as e:
+                logger.warning(f"Event flusher stopped with error: {e}")
+            self.task = None
+
+        batch = []
+        while not self.queue.empty():
+            batch.append(self.queue.get_nowait())
+        if batch:
+            try:
+                await asyncio.wait_for(self.collection.insert_many(batch, ordered=False), timeout=timeout)
+                self.flushed += len(batch)
+            except Exception as e:
+                logger.warning(f"Final event flush failed: {e}")
+
+event_log = EventLog()
@@ -0,0 +1,117 @@
+import time
+import random
+import asyncio
+from types import SimpleNamespace
+from pyrogram import filters
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.handlers import ChatMemberUpdatedHandler
+from config import Config
+from log import get_logger
+
+logger = get_logger(__name__)
+
+class BotIdentity:
+    """
+    The bot's own User object (get_me), resolved once.
+
+    main() seeds it right after app.start(); handlers read it via get(client)
+    instead of calling client.get_me() per update. It is only fetched again
+    after an explicit invalidate() (e.g. the bot was renamed via BotFather).
+    """
+
+    def __init__(self):
+        self.me = None
+        self.lock = asyncio.Lock()
+
+    def set(self, me):
+        self.me = me
+        Config.BOT_USERNAME = me.username
+
+    def invalidate(self):
+        self.me = None
+
+    async def get(self, client):
+        if self.me is not None:
+            return self.me
+        async with self.lock:
+            if self.me is None:
+                self.set(await client.get_me())
+                logger.info(f"Bot identity resolved: @{self.me.username} ({self.me.id})")
+        return self.me
+
+    @property
+    def id(self):
+        return self.me.id if self.me else None
+
+bot_identity = BotIdentity()
+
+async def _is_self_member(_, __, update):
+    # Async on purpose: Pyrogram runs sync filter functions in its thread pool
+    member = update.new_chat_member or update.old_chat_member
+    user = member.user if member else None
+    return bool(user) and (user.is_self or user.id == bot_identity.id)
+
+# Chat member updates about the bot itself (joins/leaves of other users are dropped
+# before the handler runs, which matters in large force-sub channels)
+is_self_member = filters.create(_is_self_member, "IsSelfMemberFilter")
+
+# --- Micro-Benchmark ---
+
+def _member_update(user_id, is_self=False):
+    user = SimpleNamespace(id=user_id, is_self=is_self)
+    return SimpleNamespace(
+        chat=SimpleNamespace(id=-1001234567890),
+        new_chat_member=SimpleNamespace(user=user, status=ChatMemberStatus.MEMBER),
+        old_chat_member=None
+    )
+
+async def _drive(handler, updates):
+    t0 = time.perf_counter()
+    for update in updates:
+        if await handler.check(None, update):
+            await handler.callback(None, update)
+    return time.perf_counter() - t0
+
+def benchmark(foreign=20000, own=20, bot_id=1):
+    """
+    Feeds `foreign` member updates of other users plus `own` about the bot
+    through ChatMemberUpdatedHandler, with and without is_self_member.
+    """
+    previous = bot_identity.me
+    bot_identity.me = SimpleNamespace(id=bot_id, username="bench_bot")
+    updates = [_member_update(random.randint(2, 10**10)) for _ in range(foreign)]
+    updates += [_member_update(bot_id, is_self=True) for _ in range(own)]
+    random.shuffle(updates)
+
+    calls = {"unfiltered": 0, "filtered": 0}
+    def body(name):
+        async def callback(client, update):
+            calls[name] += 1
+        return callback
+
+    async def run():
+        plain = await _drive(ChatMemberUpdatedHandler(body("unfiltered")), updates)
+        filtered = await _drive(ChatMemberUpdatedHandler(body("filtered"), is_self_member), updates)
+        return plain, filtered
+
+    try:
+        plain_s, filtered_s = asyncio.run(run())
+    finally:
+        bot_identity.me = previous
+
+    n = len(updates)
+    return {
+        "updates": n,
+        "unfiltered_calls": calls["unfiltered"],
+        "filtered_calls": calls["filtered"],
+        "unfiltered_rate": n / plain_s,
+        "filtered_rate": n / filtered_s
+    }
+
+if __name__ == "__main__":
+    # python -m utils.identity
+    res = benchmark()
+    print(f"Updates: {res['updates']}")
+    print(f"Unfiltered:     {res['unfiltered_calls']} handler invocations ({res['unfiltered_rate']:,.0f} updates/s)")
+    print(f"is_self_member: {res['filtered_calls']} handler invocations ({res['filtered_rate']:,.0f} updates/s)")
+    print("Every unfiltered invocation used to include a get_me round trip.")
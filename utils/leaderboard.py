@@ -0,0 +1,49 @@
+import asyncio
+import time
+from config import Config
+from db import db, LEADERBOARD_FIELDS
+from log import get_logger
+
+logger = get_logger(__name__)
+
+class LeaderboardService:
+    """
+    Read side of the precomputed leaderboards.
+
+    The top-N documents live in UserDB (db.leaderboards_col) and are updated
+    incrementally by add_xp / record_referral. Reads are served from a
+    short in-memory cache; a periodic full rebuild corrects drift (deleted
+    users, manual edits, missed offers).
+    """
+
+    def __init__(self):
+        self.cache = {} # {board: (fetched_at, doc)}
+        self.task = None
+
+    async def top(self, board):
+        hit = self.cache.get(board)
+        if hit and time.time() - hit[0] < Config.LEADERBOARD_CACHE_TTL:
+            return hit[1].get("entries", [])
+
+        doc = await db.get_leaderboard(board)
+        self.cache[board] = (time.time(), doc)
+        return doc.get("entries", [])
+
+    async def rank(self, board, user_id):
+        return await db.get_user_rank(board, user_id)
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._recompute_loop())
+
+    async def _recompute_loop(self):
+        while True:
+            await asyncio.sleep(Config.LEADERBOARD_RECOMPUTE)
+            for board in LEADERBOARD_FIELDS:
+                try:
+                    doc = await db.recompute_leaderboard(board)
+                    self.cache[board] = (time.time(), doc)
+                except Exception as e:
+                    logger.warning(f"Leaderboard rebuild '{board}' failed: {e}")
+
+leaderboard = LeaderboardService()
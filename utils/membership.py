@@ -0,0 +1,160 @@
+import asyncio
+import time
+from collections import OrderedDict
+from datetime import timezone
+from pyrogram import filters
+from pyrogram.enums import ChatMemberStatus
+from pyrogram.errors import UserNotParticipant, PeerIdInvalid
+from config import Config
+from db import db
+from log import get_logger
+
+logger = get_logger(__name__)
+
+NOT_MEMBER = (ChatMemberStatus.LEFT, ChatMemberStatus.BANNED)
+
+def is_member_status(member):
+    """True if a ChatMember is in the chat (restricted users only while is_member)."""
+    if member is None or member.status in NOT_MEMBER:
+        return False
+    if member.status == ChatMemberStatus.RESTRICTED:
+        return bool(member.is_member)
+    return True
+
+class MembershipCache:
+    """
+    Force-sub membership cache.
+
+    Entries {(chat_id, user_id): (member, at)} come from ChatMemberUpdated
+    events in force-sub channels (the bot is admin there) and from live
+    get_chat_member lookups. Lookups go memory -> PrivateDB -> RPC; entries
+    older than MEMBERSHIP_TTL count as missing. New entries are written to
+    PrivateDB in batches (TTL index there as well).
+
+    The force-sub channel list is refreshed every MEMBERSHIP_CHATS_REFRESH and
+    served from memory (quests never wait on MainDB retries).
+    """
+
+    def __init__(self):
+        self.entries = OrderedDict()
+        self.dirty = {}
+        self.chats = set()
+        self.channels = [] # force-sub channel docs
+        self.channels_at = None
+        self.loading = None
+        self.task = None
+
+        # Counters (exposed for diagnostics)
+        self.hits = 0
+        self.rpc_calls = 0
+
+    def start(self):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def _put(self, chat_id, user_id, member, at):
+        key = (chat_id, user_id)
+        self.entries[key] = (member, at)
+        self.entries.move_to_end(key)
+        while len(self.entries) > Config.MEMBERSHIP_CACHE_SIZE:
+            self.entries.popitem(last=False)
+
+    def record(self, chat_id, user_id, member):
+        now = time.time()
+        self._put(chat_id, user_id, member, now)
+        self.dirty[(chat_id, user_id)] = (member, now)
+
+    async def _cached(self, chat_id, user_id):
+        hit = self.entries.get((chat_id, user_id))
+        if hit and time.time() - hit[1] < Config.MEMBERSHIP_TTL:
+            return hit[0]
+
+        try:
+            doc = await db.get_membership(chat_id, user_id)
+        except Exception as e:
+            logger.warning(f"Membership lookup failed: {e}")
+            return None
+        if not doc:
+            return None
+        at = doc["at"].replace(tzinfo=timezone.utc).timestamp() # stored as UTC, read back naive
+        if time.time() - at >= Config.MEMBERSHIP_TTL:
+            return None
+        self._put(chat_id, user_id, doc["member"], at)
+        return doc["member"]
+
+    async def _fetch(self, client, chat_id, user_id):
+        self.rpc_calls += 1
+        try:
+            try:
+                member = await client.get_chat_member(chat_id, user_id)
+            except (PeerIdInvalid, KeyError):
+                # Peer not in the session yet: resolve the chat once and retry
+                await client.get_chat(chat_id)
+                member = await client.get_chat_member(chat_id, user_id)
+        except UserNotParticipant:
+            member = None
+
+        result = is_member_status(member)
+        self.record(chat_id, user_id, result)
+        return result
+
+    async def is_member(self, client, chat_id, user_id, trust_negative=True):
+        """
+        Cached membership check. Raises if the live check fails (bot not admin, ...).
+        trust_negative=False re-checks cached "not a member" entries live, for
+        "I joined" buttons where the user has just joined.
+        """
+        cached = await self._cached(chat_id, user_id)
+        if cached or (cached is False and trust_negative):
+            self.hits += 1
+            return cached
+        return await self._fetch(client, chat_id, user_id)
+
+    async def flush(self):
+        if not self.dirty: return
+        batch, self.dirty = self.dirty, {}
+        try:
+            await db.save_memberships(batch)
+        except Exception as e:
+            # Keep newer entries that arrived meanwhile
+            for key, value in batch.items():
+                self.dirty.setdefault(key, value)
+            logger.warning(f"Membership flush failed: {e}")
+
+    async def refresh_chats(self):
+        channels = await db.get_force_sub_channels()
+        self.channels = channels
+        self.chats = {ch["chat_id"] for ch in channels}
+        self.channels_at = time.monotonic()
+
+    async def force_sub_channels(self):
+        """Force-sub channel docs from the last refresh."""
+        if self.channels_at is None:
+            # Cold cache (quest right after start): wait briefly, keep loading in background
+            if self.loading is None or self.loading.done():
+                self.loading = asyncio.create_task(self.refresh_chats())
+            try:
+                await asyncio.wait_for(asyncio.shield(self.loading), timeout=5)
+            except Exception:
+                pass
+        return self.channels
+
+    async def _run(self):
+        last_chats = None
+        while True:
+            if last_chats is None or time.monotonic() - last_chats >= Config.MEMBERSHIP_CHATS_REFRESH:
+                try:
+                    await self.refresh_chats()
+                    last_chats = time.monotonic()
+                except Exception as e:
+                    logger.warning(f"Force-sub chat refresh failed: {e}")
+            await self.flush()
+            await asyncio.sleep(Config.MEMBERSHIP_FLUSH_INTERVAL)
+
+membership = MembershipCache()
+
+async def _is_force_sub_chat(_, __, update):
+    return update.chat is not None and update.chat.id in membership.chats
+
+# Member updates in force-sub channels (feeds the membership cache)
+force_sub_chat = filters.create(_is_force_sub_chat, "ForceSubChatFilter")
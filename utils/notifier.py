@@ -0,0 +1,62 @@
+import asyncio
+from pyrogram.errors import FloodWait
+from config import Config
+from log import get_logger
+
+logger = get_logger(__name__)
+
+class Notifier:
+    """
+    Delivery queue for bot-initiated messages (referral progress, rewards).
+
+    Handlers only enqueue, so a callback answers without waiting for sends.
+    A single worker delivers in order, paced by NOTIFY_INTERVAL, and waits
+    out FloodWait once before retrying. When the queue is full new
+    notifications are dropped (they are informational, the state is in the DB).
+    """
+
+    def __init__(self):
+        self.queue = asyncio.Queue(maxsize=Config.NOTIFY_QUEUE_SIZE)
+        self.app = None
+        self.task = None
+
+        # Counters (exposed for diagnostics)
+        self.sent = 0
+        self.failed = 0
+        self.dropped = 0
+
+    def start(self, app):
+        self.app = app
+        if self.task is None:
+            self.task = asyncio.create_task(self._run())
+
+    def notify(self, chat_id, text, **kwargs):
+        try:
+            self.queue.put_nowait((chat_id, text, kwargs))
+        except asyncio.QueueFull:
+            self.dropped += 1
+            if self.dropped % 100 == 1:
+                logger.warning(f"Notify queue full. Dropped {self.dropped} messages so far.")
+
+    async def _send(self, chat_id, text, kwargs):
+        try:
+            await self.app.send_message(chat_id, text, **kwargs)
+        except FloodWait as e:
+            await asyncio.sleep(e.value)
+            await self.app.send_message(chat_id, text, **kwargs)
+
+    async def _run(self):
+        while True:
+            chat_id, text, kwargs = await self.queue.get()
+            try:
+                await self._send(chat_id, text, kwargs)
+                self.sent += 1
+            except Exception as e:
+                # Blocked bot, deleted account, ...
+                self.failed += 1
+                logger.debug(f"Notify {chat_id} failed: {e}")
+            finally:
+                self.queue.task_done()
+            await asyncio.sleep(Config.NOTIFY_INTERVAL)
+
+notifier = Notifier()
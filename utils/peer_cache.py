@@ -0,0 +1,103 @@
+import asyncio
+import time
+from pyrogram.enums import ChatType
+from config import Config
+from db import db
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# Pyrogram storage peer types
+PEER_TYPES = {
+    ChatType.CHANNEL: "channel",
+    ChatType.SUPERGROUP: "supergroup",
+    ChatType.GROUP: "group",
+    ChatType.PRIVATE: "user",
+    ChatType.BOT: "bot"
+}
+
+async def load_persisted_peers(app):
+    """Feeds peers stored in PrivateDB into the session storage. Returns the known chat_ids."""
+    try:
+        peers = await db.get_cached_peers()
+    except Exception as e:
+        logger.warning(f"Could not load persisted peers: {e}")
+        return set()
+
+    rows = [
+        (p["chat_id"], p["access_hash"], p["type"], p.get("username"), None)
+        for p in peers if p.get("access_hash") is not None and p.get("type")
+    ]
+    if rows:
+        await app.storage.update_peers(rows)
+    return {r[0] for r in rows}
+
+async def resolve_peer_entry(app, sem, chat_id, username=None):
+    """Returns (chat_id, peer dict or None, error or None)."""
+    async with sem:
+        try:
+            chat = await asyncio.wait_for(app.get_chat(username or chat_id), timeout=Config.PEER_WARMUP_TIMEOUT)
+            peer = await app.resolve_peer(chat.id)
+            return chat_id, {
+                "chat_id": chat.id,
+                "access_hash": getattr(peer, "access_hash", 0),
+                "type": PEER_TYPES.get(chat.type, "channel"),
+                "username": chat.username.lower() if chat.username else None
+            }, None
+        except asyncio.TimeoutError:
+            return chat_id, None, "timeout"
+        except Exception as e:
+            return chat_id, None, str(e)
+
+async def warmup_peer_cache(app):
+    """
+    Background peer warmup for approved + force-sub channels.
+    Peers persisted in PrivateDB are restored without any RPC, the rest is
+    resolved concurrently (bounded) and persisted for the next start.
+    """
+    started = time.monotonic()
+    try:
+        channels = await db.get_approved_channels()
+        fs_channels = await db.get_force_sub_channels()
+    except Exception as e:
+        logger.warning(f"Peer cache warmup skipped: {e}")
+        return
+
+    unique_chats = {c["chat_id"]: c for c in channels + fs_channels}
+    known = await load_persisted_peers(app)
+    todo = {cid: c for cid, c in unique_chats.items() if cid not in known}
+
+    sem = asyncio.Semaphore(Config.PEER_WARMUP_CONCURRENCY)
+    results = await asyncio.gather(*[
+        resolve_peer_entry(app, sem, cid, data.get("username"))
+        for cid, data in todo.items()
+    ])
+
+    resolved = [peer for _, peer, _ in results if peer]
+    failed = [(cid, err) for cid, peer, err in results if not peer]
+
+    try:
+        await db.save_peers(resolved)
+    except Exception as e:
+        logger.warning(f"Could not persist peers: {e}")
+
+    elapsed = time.monotonic() - started
+    logger.info(
+        f"Peer cache warm in {elapsed:.1f}s: {len(unique_chats) - len(todo)} restored, "
+        f"{len(resolved)} resolved, {len(failed)} failed."
+    )
+
+    if failed:
+        for cid, err in failed:
+            logger.warning(f"Failed to cache peer {cid}: {err}")
+        if Config.CEO_ID:
+            lines = [f"• `{cid}`: {err[:80]}" for cid, err in failed[:20]]
+            if len(failed) > 20:
+                lines.append(f"…and {len(failed) - 20} more")
+            try:
+                await app.send_message(
+                    Config.CEO_ID,
+                    f"⚠️ **Peer Warmup: {len(failed)} chat(s) unreachable**\n\n" + "\n".join(lines)
+                )
+            except Exception as e:
+                logger.warning(f"Could not report peer failures: {e}")
@@ -0,0 +1,193 @@
+import os
+import sys
+import time
+import resource
+import importlib
+from pathlib import Path
+from pyrogram import filters
+from pyrogram.handlers import MessageHandler
+from pyrogram.handlers.handler import Handler
+from config import Config
+from log import get_logger
+
+logger = get_logger(__name__)
+
+# --- Lazy Plugin Manifest ---
+# Rarely used admin modules are imported on first use instead of at boot.
+#   callbacks: router keys the module registers (a callback for one of them loads it)
+#   commands:  {command: (handler function, admin_only)} served by a stub until loaded
+# Keys missing here still work: an unmatched callback loads all pending modules once.
+LAZY_PLUGINS = {
+    "admin_broadcast": {
+        "callbacks": [
+            "admin_broadcast_menu", "start_broadcast", "toggle_silent", "toggle_pin",
+            "cancel_broadcast", "send_broadcast"
+        ]
+    },
+    "admin_series": {
+        "callbacks": [
+            "admin_series_menu", "list_series_channels", "view_series_ch|", "del_series_ch|",
+            "refresh_series_ch|", "add_series_start", "sel_ser|"
+        ]
+    },
+    "admin_groups": {
+        "callbacks": [
+            "admin_grouped_bundles", "list_groups", "view_group|", "manage_group_bundles|",
+            "rem_bund_from_grp|", "del_group_confirm|", "rename_group|", "add_group_start", "cg|"
+        ]
+    },
+    "admin_panel": {
+        "callbacks": [
+            "admin_main", "admin_close", "admin_franchise_dash", "admin_stats", "admin_channels_menu",
+            "admin_settings_menu", "admin_settings_groups", "toggle_grp_", "admin_settings_general",
+            "toggle_share_panel", "toggle_task_panel", "toggle_fs_panel", "admin_settings_leech",
+            "set_autodel_time", "admin_monetization", "admin_premium_users", "add_prem_user",
+            "rem_prem_user", "list_prem_users", "admin_growth", "admin_coupons", "create_coupon_start",
+            "del_coupon_start", "admin_daily_bonus", "toggle_daily_bonus", "set_daily_reward",
+            "admin_referral_settings", "set_ref_target", "set_ref_reward", "admin_share_channels",
+            "add_share_start", "view_share|", "del_share|", "admin_channels", "admin_force_subs",
+            "view_global_fs|", "view_ch|", "del_ch|", "panel_add_fs_manual", "admin_bundles",
+            "panel_manage_bundles", "manage_bund|", "req_push|", "del_bund_confirm|", "rename_bund|",
+            "start_create_link", "admin_tasks", "panel_list_tasks", "panel_add_task", "panel_bulk_add_task"
+        ],
+        "commands": {"admin": ("admin_panel", True)}
+    },
+    "admin_export": {
+        "commands": {"export": ("export_command", True)}
+    }
+}
+
+def rss_mb():
+    """Current resident set size in MB (falls back to peak RSS off Linux)."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024 / 1024
+    except Exception:
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def peak_rss_mb():
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+class PluginLoader:
+    """
+    Replacement for Client(plugins=dict(root="plugins")).
+
+    Eager plugins are imported at boot (sorted, like Pyrogram) and their
+    decorated handlers registered on the client. Modules in LAZY_PLUGINS are
+    imported on the first matching callback or command. Every import is timed
+    for the /boot report.
+    """
+
+    def __init__(self, root="plugins", manifest=LAZY_PLUGINS):
+        self.root = root
+        self.manifest = manifest
+        self.app = None
+        self.loaded = {} # {name: {"ms": float, "lazy": bool, "handlers": int, "at": float}}
+        self.rss_before = None
+        self.rss_after = None
+        self.boot_ms = None
+
+        # Command handlers served by stubs are not registered again on load
+        self.stubbed = {
+            name: {func for func, _ in m.get("commands", {}).values()}
+            for name, m in manifest.items()
+        }
+        # Router key -> lazy module
+        self.owners = {
+            key: name for name, m in manifest.items() for key in m.get("callbacks", [])
+        }
+
+    @property
+    def pending(self):
+        return [name for name in self.manifest if name not in self.loaded]
+
+    def load_eager(self, app):
+        """Imports all non-lazy plugins and registers command stubs for the lazy ones."""
+        self.app = app
+        self.rss_before = rss_mb()
+        t0 = time.perf_counter()
+
+        for path in sorted(Path(self.root).glob("*.py")):
+            name = path.stem
+            if name.startswith("_") or name in self.manifest: continue
+            self._load(name, lazy=False)
+
+        self._register_stubs()
+
+        self.boot_ms = (time.perf_counter() - t0) * 1000
+        self.rss_after = rss_mb()
+        logger.info(
+            f"Plugins: {len(self.loaded)} loaded in {self.boot_ms:.0f}ms, "
+            f"{len(self.pending)} deferred ({', '.join(self.pending)}). "
+            f"RSS {self.rss_before:.1f} -> {self.rss_after:.1f} MB"
+        )
+
+    def _load(self, name, lazy):
+        if name in self.loaded:
+            return sys.modules.get(f"{self.root}.{name}")
+
+        t0 = time.perf_counter()
+        module = importlib.import_module(f"{self.root}.{name}")
+        ms = (time.perf_counter() - t0) * 1000
+
+        count = self._register_handlers(module, skip=self.stubbed.get(name, ()))
+        self.loaded[name] = {"ms": ms, "lazy": lazy, "handlers": count, "at": time.time()}
+        if lazy:
+            logger.info(f"Lazy-loaded plugin '{name}' in {ms:.1f}ms ({count} handlers)")
+        return module
+
+    def _register_handlers(self, module, skip=()):
+        # Same contract as Pyrogram's plugin loader: functions carry .handlers = [(handler, group)].
+        # Only objects defined in the module itself, so imported handlers are not registered twice.
+        count = 0
+        for attr, obj in vars(module).items():
+            if attr in skip or getattr(obj, "__module__", None) != module.__name__:
+                continue
+            try:
+                for handler, group in getattr(obj, "handlers", []):
+                    if isinstance(handler, Handler) and isinstance(group, int):
+                        self.app.add_handler(handler, group)
+                        count += 1
+            except Exception:
+                logger.exception(f"Failed to register handlers of {module.__name__}.{attr}")
+        return count
+
+    def _register_stubs(self):
+        for name in self.pending:
+            for command, (func_name, admin_only) in self.manifest[name].get("commands", {}).items():
+                flt = filters.command(command)
+                if admin_only:
+                    flt = flt & filters.user(list(Config.ADMIN_IDS))
+                self.app.add_handler(MessageHandler(self._command_stub(name, func_name), flt))
+
+    def _command_stub(self, name, func_name):
+        async def stub(client, message):
+            module = self._load(name, lazy=True)
+            await getattr(module, func_name)(client, message)
+        return stub
+
+    def load_for_callback(self, data):
+        """
+        Imports the lazy module owning `data`, or every pending one if no
+        manifest key matches. Returns True if anything new was loaded.
+        """
+        pending = self.pending
+        if not pending or not isinstance(data, str):
+            return False
+
+        name = self.owners.get(data) or self.owners.get(data.partition("|")[0] + "|")
+        if not name:
+            i = data.rfind("_")
+            while i > 0 and not name:
+                name = self.owners.get(data[:i + 1])
+                i = data.rfind("_", 0, i)
+
+        targets = [name] if name in pending else pending
+        for n in targets:
+            try:
+                self._load(n, lazy=True)
+            except Exception as e:
+                logger.error(f"Failed to load plugin '{n}': {e}")
+        return True
+
+plugin_loader = PluginLoader()
@@ -0,0 +1,105 @@
+import asyncio
+import time
+from config import Config
+from db import db
+from log import get_logger
+
+logger = get_logger(__name__)
+
+CHECKPOINT_KEY = "push_reconcile_checkpoint"
+
+STATUS_LABELS = {
+    "approved": "✅ Approved",
+    "rejected": "❌ Rejected",
+    "missing": "⚠️ Removed from MainDB"
+}
+
+async def reconcile_push_batch(after_id):
+    """
+    Reconciles one batch of pending local pushes against MainDB.
+    Returns (last _id of the batch or None when exhausted, transitions).
+    """
+    batch = await db.get_pending_push_batch(after_id, Config.PUSH_RECONCILE_BATCH)
+    if not batch:
+        return None, []
+
+    main_docs = await db.get_main_push_statuses([p["main_request_id"] for p in batch])
+    if main_docs is None:
+        raise ConnectionError("MainDB unavailable")
+
+    # Requests gone from MainDB: approved if the bundle exists globally, otherwise missing
+    gone = [p for p in batch if p["main_request_id"] not in main_docs]
+    approved_keys = await db.find_main_bundle_keys({(p.get("tmdb_id"), p.get("title")) for p in gone})
+
+    now = time.time()
+    updates, transitions = [], []
+    for p in batch:
+        doc = main_docs.get(p["main_request_id"])
+        if doc:
+            status = doc.get("status", "pending")
+        elif (p.get("tmdb_id"), p.get("title")) in approved_keys:
+            status = "approved"
+        else:
+            status = "missing"
+
+        if status == "pending": continue
+
+        fields = {"status": status, "reconciled_at": now}
+        if doc and doc.get("reason"):
+            fields["reason"] = doc["reason"]
+        updates.append((p["_id"], fields))
+        transitions.append({**p, **fields})
+
+    await db.apply_push_updates(updates)
+    return batch[-1]["_id"], transitions
+
+async def notify_push_transitions(app, transitions):
+    by_user = {}
+    for t in transitions:
+        if t.get("user_id"):
+            by_user.setdefault(t["user_id"], []).append(t)
+
+    for user_id, items in by_user.items():
+        lines = []
+        for t in items[:20]:
+            label = STATUS_LABELS.get(t["status"], t["status"])
+            line = f"• **{t.get('title')}** – {label}"
+            if t.get("reason"):
+                line += f" ({t['reason']})"
+            lines.append(line)
+        if len(items) > 20:
+            lines.append(f"…and {len(items) - 20} more")
+
+        try:
+            await app.send_message(user_id, "**📬 Push Request Update**\n\n" + "\n".join(lines))
+        except Exception as e:
+            logger.warning(f"Push update notify failed for {user_id}: {e}")
+
+async def reconcile_push_requests(app):
+    """One incremental run. Resumes from the stored checkpoint and wraps around at the end."""
+    checkpoint = await db.get_cache_value(CHECKPOINT_KEY)
+    transitions = []
+
+    for _ in range(Config.PUSH_RECONCILE_MAX_BATCHES):
+        last_id, changed = await reconcile_push_batch(checkpoint)
+        transitions += changed
+        checkpoint = last_id
+        if last_id is None: break # all pending checked, start over next run
+
+    await db.set_cache_value(CHECKPOINT_KEY, checkpoint)
+
+    if transitions:
+        logger.info(f"Push reconcile: {len(transitions)} status changes.")
+        await notify_push_transitions(app, transitions)
+
+async def push_reconcile_loop(app):
+    if Config.MAIN_URI == Config.PRIVATE_URI:
+        return # Standalone mode, local history is the MainDB collection
+
+    logger.info("Starting Push Reconcile Loop...")
+    while True:
+        await asyncio.sleep(Config.PUSH_RECONCILE_INTERVAL)
+        try:
+            await reconcile_push_requests(app)
+        except Exception as e:
+            logger.warning(f"Push reconcile failed: {e}")
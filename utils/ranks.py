@@ -1,3 +1,4 @@
+from bisect import bisect_right
 from datetime import datetime, timezone
 
 # Request Ranks (Based on Total Requests)
@@ -22,6 +23,15 @@ FILESHARE_RANKS = [
     (10001, "XTV Legend")
 ]
 
+# Sorted thresholds per rank list (for bisect)
+_THRESHOLDS = {}
+
+def _thresholds(rank_list):
+    key = id(rank_list)
+    if key not in _THRESHOLDS:
+        _THRESHOLDS[key] = [t for t, _ in rank_list]
+    return _THRESHOLDS[key]
+
 def get_rank_info(value, rank_list):
     """
     Returns a dictionary with rank details:
@@ -35,25 +45,13 @@ def get_rank_info(value, rank_list):
         "range_value": int      # next_threshold - current_threshold
     }
     """
-    current_rank_name = rank_list[0][1]
-    current_threshold = rank_list[0][0]
-    next_rank_name = None
-    next_threshold = None
-
-    # Iterate to find the highest threshold <= value
-    for i, (threshold, name) in enumerate(rank_list):
-        if value >= threshold:
-            current_rank_name = name
-            current_threshold = threshold
-            if i + 1 < len(rank_list):
-                next_rank_name = rank_list[i+1][1]
-                next_threshold = rank_list[i+1][0]
-            else:
-                next_rank_name = None
-                next_threshold = None
-        else:
-            # We found a threshold > value, so the previous one was correct.
-            break
+    # Highest threshold <= value (values below the first threshold get the first rank)
+    i = max(bisect_right(_thresholds(rank_list), value) - 1, 0)
+    current_threshold, current_rank_name = rank_list[i]
+    if i + 1 < len(rank_list):
+        next_threshold, next_rank_name = rank_list[i + 1]
+    else:
+        next_threshold, next_rank_name = None, None
 
     # Calculate Progress
     if next_threshold is None:
@@ -75,6 +73,18 @@ def get_rank_info(value, rank_list):
         "range_value": range_value
     }
 
+def rank_switch(field, rank_list):
+    """Same lookup as get_rank_info as a MongoDB $switch expression (for pipeline updates)."""
+    return {"$switch": {
+        "branches": [{"case": {"$gte": [field, t]}, "then": name} for t, name in reversed(rank_list[1:])],
+        "default": rank_list[0][1]
+    }}
+
+# Badge Deadlines
+OG_DEADLINE = datetime(2026, 2, 1, tzinfo=timezone.utc).timestamp()
+PIONEER_DEADLINE = datetime(2026, 3, 1, tzinfo=timezone.utc).timestamp()
+EARLY_ADOPTER_LIMIT = 100
+
 def get_badges(joined_at, user_count_index=None):
     """
     Returns a list of badge names based on join date and user count index.
@@ -86,26 +96,32 @@ def get_badges(joined_at, user_count_index=None):
     if not joined_at:
         return badges
 
-    # Deadlines
-    dt_mar = datetime(2026, 3, 1, tzinfo=timezone.utc).timestamp()
-    dt_feb = datetime(2026, 2, 1, tzinfo=timezone.utc).timestamp()
-
     # Logic: OG (Joined before Feb) implies Pioneer (Joined before Mar),
     # but usually we show the best one.
     # Prompt says: "Pioneer (joined before March 2026)", "OG (joined before Feb 2026)"
     # I will assume they are mutually exclusive tiers for display purposes.
-    if joined_at < dt_feb:
+    if joined_at < OG_DEADLINE:
         badges.append("OG")
-    elif joined_at < dt_mar:
+    elif joined_at < PIONEER_DEADLINE:
         badges.append("Pioneer")
 
     # Early Adopter (First 100 users)
     # user_count_index should be passed if known.
-    if user_count_index is not None and user_count_index <= 100:
+    if user_count_index is not None and user_count_index <= EARLY_ADOPTER_LIMIT:
         badges.append("Early Adopter")
 
     return badges
 
+def date_badges_expr(field):
+    """Join-date part of get_badges as a MongoDB expression."""
+    return {"$switch": {
+        "branches": [
+            {"case": {"$lt": [field, OG_DEADLINE]}, "then": ["OG"]},
+            {"case": {"$lt": [field, PIONEER_DEADLINE]}, "then": ["Pioneer"]}
+        ],
+        "default": []
+    }}
+
 BADGE_ICONS = {
     "Pioneer": "🚀",
     "OG": "👑",
@@ -0,0 +1,39 @@
+import asyncio
+from db import db
+from log import get_logger
+from utils.event_log import event_log
+from utils.notifier import notifier
+
+logger = get_logger(__name__)
+
+async def process_referral(referee_id, referrer_id, bot_id):
+    """
+    Counts a verified referral and rewards the referrer (single referral engine).
+
+    db.record_referral is idempotent per referee, so double clicks and retries
+    are no-ops. Counter, +100 XP, target reward and cross-franchise bonus land
+    in one write; the referrer is notified through the notifier queue.
+    Returns True if the referral was counted now.
+    """
+    target, reward_hours, cross_hours = await asyncio.gather(
+        db.get_config("referral_target", 10),
+        db.get_config("referral_reward_hours", 24),
+        db.get_config("cross_ref_bonus", 6)
+    )
+
+    result = await db.record_referral(referee_id, referrer_id, bot_id, target, reward_hours, cross_hours)
+    if result is None:
+        return False
+
+    count = result["count"]
+    await event_log.emit(
+        "referral", referrer_id, referee=referee_id, count=count,
+        target_reached=result["target_reached"], cross_bonus=result["cross_bonus"]
+    )
+
+    notifier.notify(referrer_id, f"👤 **New User Joined!**\n\nProgress: `{count}/{target}`")
+    if result["cross_bonus"]:
+        notifier.notify(referrer_id, f"🌐 **Cross-Franchise Bonus!**\n\n+ {cross_hours}h Premium for inviting a user from another network node!")
+    if result["target_reached"]:
+        notifier.notify(referrer_id, f"🎉 **Target Reached!**\n\nYou invited {target} users!\n🎁 **Reward:** {reward_hours}h Premium Access granted!")
+    return True
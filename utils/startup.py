@@ -0,0 +1,63 @@
+import asyncio
+import inspect
+import time
+from log import get_logger
+
+logger = get_logger(__name__)
+
+class StartupPhases:
+    """
+    Phased startup with per-phase timings.
+
+    Critical phases are awaited and abort the start on failure.
+    Background phases run concurrently with a timeout; a failing or slow
+    background phase is logged but never blocks update handling.
+    """
+
+    def __init__(self):
+        self.started = time.monotonic()
+        self.phases = {} # {name: {"status": str, "duration": float, "at": float}}
+        self.tasks = []
+
+    async def run(self, name, step, timeout=None, critical=False):
+        """step: zero-arg callable returning a value or an awaitable."""
+        t0 = time.monotonic()
+        self.phases[name] = {"status": "running", "duration": None, "at": None}
+        try:
+            result = step()
+            if inspect.isawaitable(result):
+                result = await asyncio.wait_for(result, timeout) if timeout else await result
+        except Exception as e:
+            if isinstance(e, asyncio.TimeoutError):
+                status = f"timeout ({timeout}s)"
+            else:
+                status = f"failed: {e}"
+            self._record(name, status, t0)
+            if critical: raise
+            return None
+
+        self._record(name, "ok", t0)
+        return result
+
+    def _record(self, name, status, t0):
+        now = time.monotonic()
+        self.phases[name] = {"status": status, "duration": now - t0, "at": now - self.started}
+        log = logger.info if status == "ok" else logger.warning
+        log(f"[Startup] {name}: {status} in {now - t0:.2f}s (T+{now - self.started:.2f}s)")
+
+    def background(self, name, step, timeout=None):
+        task = asyncio.create_task(self.run(name, step, timeout=timeout))
+        self.tasks.append(task)
+        return task
+
+    async def wait_background(self):
+        """Logs a summary once all background phases have settled."""
+        await asyncio.gather(*self.tasks, return_exceptions=True)
+        failed = [n for n, p in self.phases.items() if p["status"] != "ok"]
+        total = time.monotonic() - self.started
+        if failed:
+            logger.warning(f"[Startup] Settled in {total:.2f}s. Degraded phases: {', '.join(failed)}")
+        else:
+            logger.info(f"[Startup] All phases ready in {total:.2f}s.")
+
+startup = StartupPhases()
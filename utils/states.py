@@ -1,3 +1,7 @@
+import time
+from collections import OrderedDict
+from collections.abc import MutableMapping
+from config import Config
 
 # Stores pending series channel setups
 # Key: chat_id (int) or username (str)
@@ -15,4 +19,131 @@ pending_series_setups = {}
 #   "state": str, # e.g., "wait_series_search", "wait_series_select", "wait_channel_id"
 #   "data": dict  # Temporary data like search results, selected tmdb_id
 # }
-series_wizard_states = {}
+# (Defined as a view on the conversation registry below)
+
+# --- Conversation Registry ---
+# One active input flow per user (bundle wizard, panel input, series wizard, ...).
+# Non-exclusive flows (quest sessions) are kept beside it and survive an admin wizard.
+# Text/media input is dispatched straight to that flow's handler (plugins/dispatch.py).
+
+class ConversationRegistry:
+    """
+    {user_id: [flow, state, expires_at]}, non-exclusive flows under (user_id, flow)
+
+    - Starting an exclusive flow replaces whatever exclusive flow the user had before.
+    - Non-exclusive flows (exclusive=False) are independent of it; input goes to the
+      exclusive flow first.
+    - Sliding TTL per flow (refreshed on every access), expired entries are dropped lazily.
+    - Bounded size: least recently used conversations are evicted first.
+    """
+
+    def __init__(self, max_size=None, ttl=None):
+        self.max_size = max_size or Config.CONVERSATION_MAX_USERS
+        self.default_ttl = ttl or Config.CONVERSATION_TTL
+        self.entries = OrderedDict()
+        # {flow: {"handler": func, "ttl": int, "admin_only": bool, "media": bool, "exclusive": bool}}
+        self.flows = {}
+
+    def view(self, flow, ttl=None, exclusive=True):
+        """Dict-like view of one flow's states (drop-in for the old module-level dicts)."""
+        self.flows.setdefault(flow, {"handler": None, "admin_only": True, "media": False})
+        self.flows[flow]["ttl"] = ttl or self.default_ttl
+        self.flows[flow]["exclusive"] = exclusive
+        return FlowView(self, flow)
+
+    def on_input(self, flow, admin_only=True, media=False):
+        """Registers the input handler(client, message) of a flow."""
+        def decorator(func):
+            opts = self.flows.setdefault(flow, {"ttl": self.default_ttl})
+            opts.update(handler=func, admin_only=admin_only, media=media)
+            return func
+        return decorator
+
+    def _ttl(self, flow):
+        return self.flows.get(flow, {}).get("ttl") or self.default_ttl
+
+    def _key(self, user_id, flow):
+        return user_id if self.flows.get(flow, {}).get("exclusive", True) else (user_id, flow)
+
+    def set(self, user_id, flow, state):
+        key = self._key(user_id, flow)
+        self.entries.pop(key, None)
+        self.entries[key] = [flow, state, time.monotonic() + self._ttl(flow)]
+        while len(self.entries) > self.max_size:
+            self.entries.popitem(last=False)
+
+    def get(self, user_id, flow=None):
+        """
+        Returns [flow, state, expires_at] of the user's conversation in `flow`,
+        or of the active exclusive flow when no flow is given. None if absent.
+        """
+        key = self._key(user_id, flow)
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if entry[2] < now:
+            del self.entries[key]
+            return None
+        if flow and entry[0] != flow:
+            return None
+        entry[2] = now + self._ttl(entry[0])
+        self.entries.move_to_end(key)
+        return entry
+
+    def input_entry(self, user_id):
+        """Flow that receives the user's input: the exclusive flow, else a non-exclusive one."""
+        entry = self.get(user_id)
+        if entry:
+            return entry
+        for flow, opts in self.flows.items():
+            if not opts.get("exclusive", True):
+                entry = self.get(user_id, flow)
+                if entry:
+                    return entry
+        return None
+
+    def end(self, user_id, flow=None):
+        """Ends the user's conversation in `flow` (the exclusive one when no flow is given)."""
+        entry = self.get(user_id, flow)
+        if entry is None:
+            return False
+        del self.entries[self._key(user_id, flow)]
+        return True
+
+    def users(self, flow):
+        now = time.monotonic()
+        return [
+            key[0] if isinstance(key, tuple) else key
+            for key, e in self.entries.items() if e[0] == flow and e[2] >= now
+        ]
+
+class FlowView(MutableMapping):
+    def __init__(self, registry, flow):
+        self.registry = registry
+        self.flow = flow
+
+    def __getitem__(self, user_id):
+        entry = self.registry.get(user_id, self.flow)
+        if entry is None:
+            raise KeyError(user_id)
+        return entry[1]
+
+    def __setitem__(self, user_id, state):
+        self.registry.set(user_id, self.flow, state)
+
+    def __delitem__(self, user_id):
+        if not self.registry.end(user_id, self.flow):
+            raise KeyError(user_id)
+
+    def __contains__(self, user_id):
+        return self.registry.get(user_id, self.flow) is not None
+
+    def __iter__(self):
+        return iter(self.registry.users(self.flow))
+
+    def __len__(self):
+        return len(self.registry.users(self.flow))
+
+conversations = ConversationRegistry()
+series_wizard_states = conversations.view("series_wizard")
@@ -1,5 +1,6 @@
 import asyncio
 import time
+from pymongo import UpdateOne
 from db import db
 from config import Config
 from log import get_logger
@@ -15,6 +16,7 @@ async def sync_from_main():
     - Force Sub Channels
     - Shared Bundles (optional, depending on scale)
     - Groups
+    - Quest Tasks
     """
     if Config.MAIN_URI == Config.PRIVATE_URI:
         return # Standalone mode, no sync needed
@@ -60,8 +62,25 @@ async def sync_from_main():
             )
             synced_groups += 1
 
+        # 4. Sync Quest Tasks (fallback for the task pool during outages)
+        main_tasks = await db.tasks_col.find({}).to_list(length=1000)
+        if main_tasks:
+            now = time.time()
+            ops = [
+                UpdateOne(
+                    {"question": t.get("question")},
+                    {"$set": {**{k:v for k,v in t.items() if k != "_id"}, "is_synced": True, "last_synced": now}},
+                    upsert=True
+                )
+                for t in main_tasks
+            ]
+            await db.cache_tasks_col.bulk_write(ops, ordered=False)
+            # Drop tasks removed from Main
+            await db.cache_tasks_col.delete_many({"question": {"$nin": [t.get("question") for t in main_tasks]}})
+        synced_tasks = len(main_tasks)
+
         duration = time.time() - start_time
-        logger.info(f"Sync complete in {duration:.2f}s. Cached: {synced_channels} Channels, {synced_groups} Groups.")
+        logger.info(f"Sync complete in {duration:.2f}s. Cached: {synced_channels} Channels, {synced_groups} Groups, {synced_tasks} Tasks.")
 
     except Exception as e:
         logger.error(f"Sync Job Failed: {e}")
@@ -0,0 +1,133 @@
+import os
+import time
+import random
+import asyncio
+from collections import deque
+from pyrogram.raw import functions
+from config import Config
+from db import db
+from utils.watchdog import watchdog
+from log import get_logger
+
+logger = get_logger(__name__)
+
+DEVELOPER_USERNAME = "davdxpx"
+DEVELOPER_FALLBACK = ("𝕏0L0™", "https://t.me/davdxpx")
+SPARK_CHARS = "▁▂▃▄▅▆▇█"
+
+def sparkline(values, width=12):
+    """Short trend line of the last `width` values (None = not measured, skipped)."""
+    vals = [v for v in values if v is not None][-width:]
+    if not vals:
+        return ""
+    lo, hi = min(vals), max(vals)
+    if hi - lo < 1e-9:
+        return SPARK_CHARS[0] * len(vals)
+    top = len(SPARK_CHARS) - 1
+    return "".join(SPARK_CHARS[round((v - lo) / (hi - lo) * top)] for v in vals)
+
+def resolve_git_commit():
+    # Try Environment Variable (Railway)
+    commit = os.getenv("RAILWAY_GIT_COMMIT_SHA")
+    if commit:
+        return commit[:7]
+
+    # Try Git Command (blocking, run once in a thread)
+    try:
+        import subprocess
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"]).decode("ascii").strip()
+    except Exception:
+        return "Unknown"
+
+class SystemSampler:
+    """
+    Background sampler behind /info.
+
+    Every STATS_SAMPLE_INTERVAL seconds it records CPU, RAM and the p95
+    event-loop lag of the interval (from the watchdog) into a ring buffer;
+    every STATS_NET_EVERY samples it also measures MainDB and Telegram
+    round trips. Git hash and developer info are resolved once. Readers
+    never block: they only look at the buffer.
+    """
+
+    def __init__(self):
+        self.samples = deque(maxlen=Config.STATS_HISTORY)
+        self.git_hash = "Unknown"
+        self.developer = DEVELOPER_FALLBACK
+        self.ram_total = None
+        self.task = None
+
+    def start(self, app):
+        if self.task is None:
+            self.task = asyncio.create_task(self._run(app))
+
+    def last(self, key):
+        """Most recent measured value of `key` (None if never measured)."""
+        for s in reversed(self.samples):
+            if s.get(key) is not None:
+                return s[key]
+        return None
+
+    def series(self, key):
+        return [s.get(key) for s in self.samples]
+
+    async def _resolve_static(self, app):
+        self.git_hash = await asyncio.to_thread(resolve_git_commit)
+        try:
+            user = await app.get_users(DEVELOPER_USERNAME)
+            name = user.first_name
+            if user.last_name:
+                name += f" {user.last_name}"
+            self.developer = (name, f"tg://user?id={user.id}")
+        except Exception:
+            pass
+
+    async def _ping_telegram(self, app):
+        t0 = time.perf_counter()
+        await app.invoke(functions.Ping(ping_id=random.getrandbits(63)))
+        return (time.perf_counter() - t0) * 1000
+
+    async def _measure_network(self, app):
+        timeout = Config.STATS_PING_TIMEOUT
+        db_ms, tg_ms = await asyncio.gather(
+            asyncio.wait_for(db.ping_main(), timeout),
+            asyncio.wait_for(self._ping_telegram(app), timeout),
+            return_exceptions=True
+        )
+        # A failed / timed out ping is recorded as the timeout, so it shows up in the trend
+        db_ms = timeout * 1000 if isinstance(db_ms, BaseException) else db_ms
+        tg_ms = timeout * 1000 if isinstance(tg_ms, BaseException) else tg_ms
+        return db_ms, tg_ms
+
+    async def _run(self, app):
+        await self._resolve_static(app)
+
+        import psutil
+        psutil.cpu_percent(interval=None) # prime: next call returns usage since now
+
+        interval = Config.STATS_SAMPLE_INTERVAL
+        beats = max(1, int(interval / Config.WATCHDOG_INTERVAL))
+        tick = 0
+        while True:
+            await asyncio.sleep(interval)
+
+            try:
+                lag = watchdog.percentiles(last=beats)
+                mem = psutil.virtual_memory()
+                self.ram_total = mem.total
+                sample = {
+                    "at": time.time(),
+                    "cpu": psutil.cpu_percent(interval=None),
+                    "ram_used": mem.used,
+                    "lag_p95": lag["p95"] if lag else None,
+                    "db_ms": None,
+                    "tg_ms": None
+                }
+                if tick % Config.STATS_NET_EVERY == 0:
+                    sample["db_ms"], sample["tg_ms"] = await self._measure_network(app)
+                self.samples.append(sample)
+            except Exception as e:
+                logger.warning(f"Stats sample failed: {e}")
+            tick += 1
+
+system_stats = SystemSampler()
@@ -0,0 +1,99 @@
+import asyncio
+import random
+import time
+from collections import OrderedDict, deque
+from config import Config
+from db import db
+from log import get_logger
+
+logger = get_logger(__name__)
+
+DUMMY_TASK = {"question": "1+1?", "answer": "2", "type": "text"}
+
+class TaskPool:
+    """
+    In-memory quest task pool.
+
+    All tasks are loaded once (get_all_tasks) and refreshed periodically.
+    Quests sample from memory without replacement and avoid questions the
+    user has seen recently. The last good pool is kept if a refresh fails,
+    so quests keep working during MainDB outages.
+    """
+
+    def __init__(self):
+        self.tasks = []
+        self.loaded_at = 0
+        self.lock = asyncio.Lock()
+        self.refresh_task = None
+        self.loading = None
+        # {user_id: deque of recent questions} (LRU, bounded)
+        self.recent = OrderedDict()
+
+    async def refresh(self):
+        """Reloads the pool. Returns the number of tasks loaded (0 = kept old pool)."""
+        async with self.lock:
+            tasks = await db.get_all_tasks()
+            if tasks:
+                self.tasks = tasks
+                self.loaded_at = time.time()
+                logger.info(f"Task pool loaded: {len(tasks)} tasks.")
+            return len(tasks)
+
+    def start(self):
+        if self.refresh_task is None:
+            self.refresh_task = asyncio.create_task(self._refresh_loop())
+
+    async def _refresh_loop(self):
+        while True:
+            await asyncio.sleep(Config.TASK_POOL_REFRESH)
+            try:
+                await self.refresh()
+            except Exception as e:
+                logger.warning(f"Task pool refresh failed: {e}")
+
+    async def _ensure_loaded(self):
+        if self.tasks: return
+        # Cold pool (e.g. first quest right after start): wait briefly, keep loading in background
+        if self.loading is None or self.loading.done():
+            self.loading = asyncio.create_task(self.refresh())
+        try:
+            await asyncio.wait_for(asyncio.shield(self.loading), timeout=5)
+        except Exception:
+            pass
+
+    def _remember(self, user_id, picked):
+        seen = self.recent.get(user_id)
+        if seen is None:
+            seen = self.recent[user_id] = deque(maxlen=Config.TASK_POOL_RECENT)
+        else:
+            self.recent.move_to_end(user_id)
+        seen.extend(t.get("question") for t in picked)
+
+        while len(self.recent) > Config.TASK_POOL_MAX_USERS:
+            self.recent.popitem(last=False)
+
+    async def sample(self, user_id, count):
+        """Returns `count` task dicts for a quest."""
+        if count <= 0: return []
+        await self._ensure_loaded()
+
+        pool = self.tasks
+        if not pool:
+            # No tasks? Fallback dummy
+            return [dict(DUMMY_TASK) for _ in range(count)]
+
+        seen = set(self.recent.get(user_id, ()))
+        fresh = [t for t in pool if t.get("question") not in seen]
+        picked = random.sample(fresh, min(count, len(fresh)))
+
+        # Not enough unseen questions -> fall back to seen ones, then repeat
+        if len(picked) < count:
+            rest = [t for t in pool if t.get("question") in seen]
+            picked += random.sample(rest, min(count - len(picked), len(rest)))
+        while len(picked) < count:
+            picked.append(random.choice(pool))
+
+        self._remember(user_id, picked)
+        return [dict(t) for t in picked]
+
+task_pool = TaskPool()
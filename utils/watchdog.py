@@ -0,0 +1,118 @@
+import os
+import sys
+import time
+import asyncio
+import logging
+import threading
+import traceback
+from collections import deque
+from config import Config
+from log import get_logger
+
+logger = get_logger(__name__)
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+class SlowCallbackFilter(logging.Filter):
+    """Collects asyncio's "Executing <Handle> took Xs" reports (debug mode only)."""
+
+    def __init__(self, watchdog):
+        super().__init__()
+        self.watchdog = watchdog
+
+    def filter(self, record):
+        msg = record.getMessage()
+        if msg.startswith("Executing "):
+            self.watchdog.slow_callbacks.append({"at": time.time(), "message": msg[:300]})
+        return True
+
+class LoopWatchdog:
+    """
+    Event-loop lag and stall watchdog.
+
+    A heartbeat coroutine records how late each WATCHDOG_INTERVAL sleep wakes
+    up (= loop lag). A daemon thread checks the heartbeat; if the loop has not
+    beaten for WATCHDOG_STALL_THRESHOLD it captures the loop thread's stack,
+    i.e. the code that is blocking right now. The stall is logged once the
+    loop is back, with the total blocked time.
+    """
+
+    def __init__(self):
+        self.lags = deque(maxlen=Config.WATCHDOG_WINDOW) # ms
+        self.stalls = deque(maxlen=20)
+        self.slow_callbacks = deque(maxlen=20)
+        self.beat = None
+        self.loop_thread_id = None
+        self.pending_stall = None # set by the thread, completed by the heartbeat
+        self.task = None
+
+    def start(self):
+        """Call once from inside the running loop."""
+        if self.task is not None: return
+        loop = asyncio.get_running_loop()
+        loop.slow_callback_duration = Config.WATCHDOG_SLOW_CALLBACK
+        if Config.WATCHDOG_ASYNCIO_DEBUG:
+            loop.set_debug(True)
+            logging.getLogger("asyncio").addFilter(SlowCallbackFilter(self))
+
+        self.loop_thread_id = threading.get_ident()
+        self.beat = time.monotonic()
+        self.task = asyncio.create_task(self._heartbeat())
+        threading.Thread(target=self._monitor, name="loop-watchdog", daemon=True).start()
+
+    async def _heartbeat(self):
+        interval = Config.WATCHDOG_INTERVAL
+        while True:
+            t0 = time.monotonic()
+            await asyncio.sleep(interval)
+            now = time.monotonic()
+            lag_ms = max(0.0, (now - t0 - interval) * 1000)
+            self.lags.append(lag_ms)
+            self.beat = now
+
+            stall = self.pending_stall
+            if stall:
+                self.pending_stall = None
+                stall["blocked_ms"] = lag_ms
+                logger.warning(f"Event loop blocked for {lag_ms:.0f}ms at {stall['where']}\n{stall['stack']}")
+
+    def _monitor(self):
+        interval = Config.WATCHDOG_INTERVAL
+        while True:
+            time.sleep(interval)
+            blocked = time.monotonic() - self.beat - interval
+            if blocked < Config.WATCHDOG_STALL_THRESHOLD or self.pending_stall is not None:
+                continue
+
+            frame = sys._current_frames().get(self.loop_thread_id)
+            if frame is None: continue
+            stack = traceback.extract_stack(frame)[-12:]
+
+            # Innermost frame in our own code (not stdlib / site-packages)
+            where = "unknown"
+            for fs in reversed(stack):
+                if fs.filename.startswith(ROOT) and "site-packages" not in fs.filename:
+                    where = f"{os.path.relpath(fs.filename, ROOT)}:{fs.lineno} ({fs.name})"
+                    break
+
+            stall = {
+                "at": time.time(),
+                "blocked_ms": blocked * 1000, # updated with the total once the loop resumes
+                "where": where,
+                "stack": "".join(traceback.format_list(stack))
+            }
+            self.stalls.append(stall)
+            self.pending_stall = stall
+
+    def percentiles(self, last=None):
+        """Lag percentiles in ms over the whole window or the `last` N heartbeats."""
+        values = list(self.lags)
+        if last:
+            values = values[-last:]
+        if not values:
+            return None
+        values.sort()
+        pick = lambda q: values[min(len(values) - 1, int(q * len(values)))]
+        return {"p50": pick(0.50), "p95": pick(0.95), "p99": pick(0.99), "max": values[-1]}
+
+watchdog = LoopWatchdog()